@@ -0,0 +1,5 @@
+"""Performance benchmarks for the Ohio birth weight analysis module.
+
+Run each script from the repository root, e.g.:
+    python -m benchmarks.bench_loader
+"""
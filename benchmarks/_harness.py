@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Shared helpers for timing and memory measurement in the benchmarks."""
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+# Data files shipped with the repository, re-exported for the benchmarks.
+from resources.ohio_birth_data import (AGE_PATH, COUNTY_PATH,  # noqa: F401
+                                       RACE_PATH)
+
+
+def _max_rss_mb():
+    """Peak resident set size of this process in MB."""
+    # Prefer the resettable high-water mark on Linux.
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 2 ** 10
+    except OSError:
+        pass
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS reports bytes.
+    if sys.platform == 'darwin':
+        return max_rss / 2 ** 20
+    return max_rss / 2 ** 10
+
+
+def _reset_max_rss():
+    """Reset the peak RSS to the current RSS where the kernel allows it."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        pass
+
+
+def _current_rss_mb():
+    """Current resident set size of this process in MB."""
+    # Only Linux exposes the current RSS cheaply, fall back to the peak.
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+    except OSError:
+        return _max_rss_mb()
+
+    return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def _run_measured(func, args, kwargs, setup=None):
+    """Run func once, returning wall time, CPU time and memory figures.
+
+    When setup is given its result is prepended to args, and building it is
+    excluded from the timings and from the RSS growth.
+    """
+    if setup is not None:
+        args = (setup[0](*setup[1]),) + tuple(args)
+
+    # Peaks reached while building the input do not count.
+    _reset_max_rss()
+    rss_before = _current_rss_mb()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    func(*args, **kwargs)
+
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    rss_after = _max_rss_mb()
+
+    return {'wall_s': wall, 'cpu_s': cpu, 'peak_rss_mb': rss_after,
+            'rss_growth_mb': rss_after - rss_before
+            }
+
+
+def measure(func, *args, repeat=3, setup=None, **kwargs):
+    """Measure func(*args, **kwargs) in fresh processes.
+
+    Every repetition runs in a newly spawned interpreter so that peak RSS
+    reflects that call alone. setup is an optional (callable, args) pair
+    whose result becomes the first argument of func. The fastest
+    repetition is returned.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for _ in range(repeat):
+        with context.Pool(processes=1) as pool:
+            results.append(pool.apply(_run_measured,
+                                      (func, args, kwargs, setup)))
+
+    return min(results, key=lambda result: result['wall_s'])
+
+
+def measure_inline(func, *args, repeat=3, **kwargs):
+    """Best wall time of func(*args, **kwargs) in the current process."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+def print_table(rows, columns):
+    """Print a list of result dictionaries as an aligned text table."""
+    cells = [[_format(row[column]) for column in columns] for row in rows]
+    widths = [max([len(column)] + [len(line[i]) for line in cells])
+              for i, column in enumerate(columns)]
+
+    print('  '.join(column.ljust(width)
+                    for column, width in zip(columns, widths)))
+    print('  '.join('-' * width for width in widths))
+    for line in cells:
+        print('  '.join(cell.ljust(width)
+                        for cell, width in zip(line, widths)))
+
+
+def _format(value):
+    """Format a table cell."""
+    if isinstance(value, float):
+        return '{:.4f}'.format(value)
+    return str(value)
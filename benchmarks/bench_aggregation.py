@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Microbenchmark of the bincount group-sum engine against groupby.
+
+For each marginal, compares groupby + unstack on the cleaned DataFrame with
+BirthAggregator.marginal once every dimension has been encoded, and with a
+repeated (memoized) call to aggregate. The one-off encoding cost is
+reported separately:
+    python -m benchmarks.bench_aggregation
+"""
+from resources import ohio_birth_analysis
+
+from benchmarks._harness import (AGE_PATH, COUNTY_PATH, RACE_PATH,
+                                 measure_inline, print_table)
+
+
+# Marginals to aggregate for each dataset.
+AGE_MARGINALS = [['age', 'weight_indicator'],
+                 ['county', 'weight_indicator'],
+                 ['year', 'age', 'weight_indicator'],
+                 ['year', 'county', 'age', 'weight_indicator']
+                 ]
+RACE_MARGINALS = [['race', 'weight_indicator'],
+                  ['ethnicity', 'weight_indicator'],
+                  ['year', 'race', 'weight_indicator'],
+                  ['year', 'county', 'race', 'ethnicity', 'weight_indicator']
+                  ]
+
+
+def _groupby_marginal(df, dims):
+    """Marginal computed the original way."""
+    return df.groupby(by=dims).birth_count.sum().unstack()
+
+
+def _encode_all(df, county_df, dims):
+    """Build an aggregator and encode every dimension."""
+    aggregator = ohio_birth_analysis.BirthAggregator(df, county_df)
+    for dim in dims:
+        aggregator.encode(dim)
+
+    return aggregator
+
+
+def main():
+    """Run the aggregation microbenchmark and print a results table."""
+    county_df = ohio_birth_analysis.county_data_cleaning(COUNTY_PATH)
+    age_df = ohio_birth_analysis.age_data_cleaning(AGE_PATH)
+    race_df = ohio_birth_analysis.race_data_cleaning(RACE_PATH)
+
+    rows = []
+    for name, df, marginals in [('age', age_df, AGE_MARGINALS),
+                                ('race', race_df, RACE_MARGINALS)]:
+        all_dims = marginals[-1]
+        encode_s = measure_inline(_encode_all, df, county_df, all_dims,
+                                  repeat=10)
+        aggregator = _encode_all(df, county_df, all_dims)
+        rows.append({'data': name, 'marginal': 'encode all dims',
+                     'groupby_s': float('nan'), 'bincount_s': encode_s,
+                     'speedup': float('nan'), 'memoized_s': float('nan')
+                     })
+
+        for dims in marginals:
+            groupby_s = measure_inline(_groupby_marginal, df, dims,
+                                       repeat=10)
+            bincount_s = measure_inline(aggregator.marginal, dims,
+                                        repeat=10)
+            ohio_birth_analysis.aggregate(df, dims)
+            memoized_s = measure_inline(ohio_birth_analysis.aggregate, df,
+                                        dims, repeat=10)
+            rows.append({'data': name, 'marginal': ' x '.join(dims),
+                         'groupby_s': groupby_s, 'bincount_s': bincount_s,
+                         'speedup': groupby_s / bincount_s,
+                         'memoized_s': memoized_s
+                         })
+
+    print_table(rows, ['data', 'marginal', 'groupby_s', 'bincount_s',
+                       'speedup', 'memoized_s'])
+
+
+if __name__ == '__main__':
+    main()
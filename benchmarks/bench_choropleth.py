@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""First and repeated render times of the county choropleth.
+
+Compares plotly.figure_factory.create_choropleth, which reads the US county
+shapefiles on every call, with the cached Ohio geometry path. First renders
+run in a fresh process, repeated renders reuse the same process:
+    python -m benchmarks.bench_choropleth
+"""
+import warnings
+
+from resources import ohio_birth_analysis, ohio_birth_geometry
+
+from benchmarks._harness import (AGE_PATH, COUNTY_PATH, measure,
+                                 measure_inline, print_table)
+
+
+# Arguments shared by both choropleth paths, as in county_breakdown_plot.
+CHOROPLETH_OPTIONS = {'binning_endpoints': list(range(5, 55, 5)),
+                      'colorscale': ohio_birth_analysis._Themes.low_colorscale,
+                      'legend_title': '% of county births', 'asp': 3,
+                      'show_hover': True, 'width': 800, 'height': 400,
+                      'county_outline': {'color': 'rgb(255,255,255)',
+                                         'width': 0.5}
+                      }
+
+
+def _factory_choropleth(fips, values):
+    """Choropleth from the plotly figure factory."""
+    import plotly.figure_factory as ff
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return ff.create_choropleth(fips=fips, values=values, scope=['OH'],
+                                    **CHOROPLETH_OPTIONS)
+
+
+def _cached_choropleth(fips, values):
+    """Choropleth from the cached geometry."""
+    return ohio_birth_geometry.county_choropleth(fips=fips, values=values,
+                                                 **CHOROPLETH_OPTIONS)
+
+
+def _factory_available():
+    """Whether the figure factory's shapefile dependencies are installed."""
+    try:
+        import _plotly_geo  # noqa: F401
+        import geopandas  # noqa: F401
+        import shapefile  # noqa: F401
+    except ImportError:
+        return False
+
+    return True
+
+
+def main():
+    """Run the choropleth benchmark and print a results table."""
+    age_df = ohio_birth_analysis.age_data_cleaning(AGE_PATH)
+    county_df = ohio_birth_analysis.county_data_cleaning(COUNTY_PATH)
+
+    # Percent of low birth weights per county, as the plot computes it.
+    county_sort_df = ohio_birth_analysis._birth_marginal(
+        age_df, ['county', 'weight_indicator'])
+    percent_low = (100 * county_sort_df.low
+                   / (county_sort_df.low + county_sort_df.normal)).tolist()
+    fips = county_df.FIPS.tolist()
+
+    paths = [('cached geometry', _cached_choropleth)]
+    if _factory_available():
+        paths.insert(0, ('figure factory', _factory_choropleth))
+
+    rows = []
+    for label, render in paths:
+        first = measure(render, fips, percent_low, repeat=3)
+        render(fips, percent_low)
+        repeated_s = measure_inline(render, fips, percent_low, repeat=5)
+        rows.append({'choropleth': label, 'first_render_s': first['wall_s'],
+                     'repeated_render_s': repeated_s
+                     })
+
+    print_table(rows, ['choropleth', 'first_render_s', 'repeated_render_s'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Time and memory of the fused cleaning pipeline versus the original.
+
+The original cleaning relabeled values with a frame-wide replace and
+filtered rows with four chained copies. Both implementations clean the same
+raw frames, replicated to 1x, 10x and 100x the shipped row counts:
+    python -m benchmarks.bench_cleaning
+"""
+import os
+import tempfile
+
+import pandas as pd
+
+from resources import ohio_birth_data
+
+from benchmarks._harness import AGE_PATH, RACE_PATH, measure, print_table
+
+
+# Row count multipliers.
+SCALES = (1, 10, 100)
+
+
+def _legacy_age_cleaning(age_df):
+    """Original chained-copy cleaning of a raw mother's age DataFrame."""
+    age_df.fillna(value=0, inplace=True)
+    age_df.drop(labels='sort', axis=1, inplace=True)
+    age_df.rename(columns={'age group desc': 'age',
+                           'birth count': 'birth_count',
+                           'birth count_pct': 'birth_percentage',
+                           'county name': 'county',
+                           'low birth weight ind desc': 'weight_indicator',
+                           'year desc': 'year'
+                           },
+                  inplace=True
+                  )
+    age_df.replace(to_replace=['2017 **', 'Low birth weight (<2500g)',
+                               'Normal birth weight (2500g+)'
+                               ],
+                   value=[2017, 'low', 'normal'],
+                   inplace=True
+                   )
+    age_df = age_df[age_df.weight_indicator != 'Total']
+    age_df = age_df[age_df.year != 'Total']
+    age_df = age_df[age_df.county != 'Unknown']
+    age_df = age_df[age_df.county != 'NonOH']
+    age_df.year = pd.to_numeric(age_df.year)
+
+    return age_df
+
+
+def _legacy_race_cleaning(race_df):
+    """Original chained-copy cleaning of a raw race/ ethnicity DataFrame."""
+    race_df.fillna(value=0, inplace=True)
+    race_df.drop(labels='sort', axis=1, inplace=True)
+    race_df.rename(columns={'birth count': 'birth_count',
+                            'birth count_pct': 'birth_percentage',
+                            'county name': 'county',
+                            'ethnicity desc': 'ethnicity',
+                            'low birth weight ind desc': 'weight_indicator',
+                            'race catg desc': 'race',
+                            'year desc': 'year'
+                            },
+                   inplace=True
+                   )
+    race_df.replace(to_replace=['2017 **',
+                                'Low birth weight (<2500g)',
+                                'Normal birth weight (2500g+)',
+                                'African American  (Black)',
+                                'Pacific Islander/Hawaiian',
+                                'Unknown/Not Reported'
+                                ],
+                    value=[2017, 'low', 'normal',
+                           'African American', 'Pacific Islander',
+                           'Unknown'
+                           ],
+                    inplace=True
+                    )
+    race_df = race_df[race_df.weight_indicator != 'Total']
+    race_df = race_df[race_df.year != 'Total']
+    race_df.year = pd.to_numeric(race_df.year)
+
+    return race_df
+
+
+def _write_raw_frame(path, schema, engine, scale, directory):
+    """Pickle the raw parse of path replicated scale times."""
+    raw_df = ohio_birth_data._read_birth_csv(path, schema, engine)
+    raw_df = pd.concat([raw_df] * scale, ignore_index=True)
+
+    pickle_path = os.path.join(directory, '{}-{}-{}.pkl'.format(
+        os.path.basename(path), engine, scale))
+    raw_df.to_pickle(pickle_path)
+
+    return pickle_path, len(raw_df)
+
+
+def _prepared_frame(pickle_path, cleaning):
+    """Load a pickled raw frame after warming up the cleaning function.
+
+    The warm-up on a small slice triggers pandas' lazy imports so that they
+    do not count towards the measured memory growth.
+    """
+    raw_df = pd.read_pickle(pickle_path)
+    cleaning(raw_df.head(100).copy())
+
+    return raw_df
+
+
+def main():
+    """Run the cleaning benchmark and print a results table."""
+    files = [('age', AGE_PATH, ohio_birth_data._Schemas.age,
+              _legacy_age_cleaning, ohio_birth_data._clean_age_frame),
+             ('race', RACE_PATH, ohio_birth_data._Schemas.race,
+              _legacy_race_cleaning, ohio_birth_data._clean_race_frame)
+             ]
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name, path, schema, legacy, fused in files:
+            for scale in SCALES:
+                untyped_path, row_count = _write_raw_frame(
+                    path, schema, 'python', scale, directory)
+                typed_path, _ = _write_raw_frame(
+                    path, schema, 'c', scale, directory)
+
+                runs = [('original', legacy, untyped_path),
+                        ('fused', fused, untyped_path),
+                        ('fused typed', fused, typed_path)
+                        ]
+                for label, cleaning, pickle_path in runs:
+                    result = measure(cleaning, repeat=1,
+                                     setup=(_prepared_frame,
+                                            (pickle_path, cleaning)))
+                    rows.append({'file': name, 'scale': scale,
+                                 'rows': row_count, 'cleaning': label,
+                                 'wall_s': result['wall_s'],
+                                 'rss_growth_mb': result['rss_growth_mb']
+                                 })
+
+    print_table(rows, ['file', 'scale', 'rows', 'cleaning', 'wall_s',
+                       'rss_growth_mb'])
+
+
+if __name__ == '__main__':
+    main()
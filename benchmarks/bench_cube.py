@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Cost of building the aggregation cubes versus per-plot groupbys.
+
+Compares the groupby + unstack each plot function runs on the cleaned
+DataFrames with one cube build per dataset followed by the same marginals
+taken from the cubes:
+    python -m benchmarks.bench_cube
+"""
+from resources import ohio_birth_analysis
+
+from benchmarks._harness import (AGE_PATH, RACE_PATH, measure_inline,
+                                 print_table)
+
+
+# Marginals requested by the plot functions, one entry per call.
+AGE_MARGINALS = [['age', 'weight_indicator'],
+                 ['age', 'weight_indicator'],
+                 ['county', 'weight_indicator'],
+                 ['year', 'weight_indicator'],
+                 ['year', 'age', 'weight_indicator']
+                 ]
+RACE_MARGINALS = [['race', 'weight_indicator'],
+                  ['race', 'weight_indicator'],
+                  ['ethnicity', 'weight_indicator'],
+                  ['year', 'race', 'weight_indicator']
+                  ]
+
+
+def _per_plot_groupbys(df, marginals):
+    """Run every plot function's groupby on the DataFrame."""
+    for dims in marginals:
+        df.groupby(by=dims).birth_count.sum().unstack()
+
+
+def _cube_marginals(cube, marginals):
+    """Take every plot function's marginal from a cube."""
+    for dims in marginals:
+        cube.marginal(dims)
+
+
+def main():
+    """Run the cube benchmark and print a results table."""
+    age_df = ohio_birth_analysis.age_data_cleaning(AGE_PATH)
+    race_df = ohio_birth_analysis.race_data_cleaning(RACE_PATH)
+
+    datasets = [('age', age_df, ohio_birth_analysis.age_cube,
+                 AGE_MARGINALS),
+                ('race', race_df, ohio_birth_analysis.race_cube,
+                 RACE_MARGINALS)
+                ]
+
+    rows = []
+    for name, df, build_cube, marginals in datasets:
+        cube = build_cube(df)
+        groupby_s = measure_inline(_per_plot_groupbys, df, marginals,
+                                   repeat=10)
+        build_s = measure_inline(build_cube, df, repeat=10)
+        marginal_s = measure_inline(_cube_marginals, cube, marginals,
+                                    repeat=10)
+        rows.append({'data': name, 'plots': len(marginals),
+                     'per_plot_groupby_s': groupby_s,
+                     'cube_build_s': build_s,
+                     'cube_marginals_s': marginal_s,
+                     'cube_total_s': build_s + marginal_s
+                     })
+
+    print_table(rows, ['data', 'plots', 'per_plot_groupby_s',
+                       'cube_build_s', 'cube_marginals_s', 'cube_total_s'])
+
+
+if __name__ == '__main__':
+    main()
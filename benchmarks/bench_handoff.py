@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""Copies made handing cleaned frames and marginals to the plots.
+
+Counts, with ohio_birth_arrow's copy counter, the copies and bytes copied
+by each handoff the figure suite makes, done the original way (frames
+read back whole from the Arrow file, marginals deep-copied out of the
+cache) and through the Arrow buffers. The plot inputs stage counts a
+repeated call of ethnicity_pie and county_breakdown_plot, with show=False:
+the marginals they get from the cache and every array they pass on to
+matplotlib and plotly. Exits non-zero unless the Arrow handoff copies fewer
+bytes at every stage:
+    python -m benchmarks.bench_handoff
+"""
+import contextlib
+import os
+import sys
+import tempfile
+
+import matplotlib.axes
+import numpy as np
+import pyarrow as pa
+
+from resources import (ohio_birth_analysis, ohio_birth_arrow,
+                       ohio_birth_data, ohio_birth_geometry)
+
+from benchmarks._harness import (AGE_PATH, COUNTY_PATH, RACE_PATH,
+                                 measure_inline, print_table)
+
+
+# Marginals the figure suite requests: dataset, dimensions, normalization.
+SUITE_MARGINALS = [('age', ['age', 'weight_indicator'], False),
+                   ('age', ['age', 'weight_indicator'], True),
+                   ('age', ['county', 'weight_indicator'], 'percent'),
+                   ('age', ['year', 'weight_indicator'], True),
+                   ('age', ['year', 'age', 'weight_indicator'], False),
+                   ('race', ['race', 'weight_indicator'], False),
+                   ('race', ['race', 'weight_indicator'], True),
+                   ('race', ['ethnicity', 'weight_indicator'], False),
+                   ('race', ['year', 'race', 'weight_indicator'], False)
+                   ]
+
+# Times each marginal is requested after the first, as by repeated renders.
+HITS = 5
+
+
+def _record_frame(source, result):
+    """Record the handoff of every column of source as result."""
+    for position in range(source.shape[1]):
+        ohio_birth_arrow._copy_counter.record(
+            source.iloc[:, position].to_numpy(),
+            result.iloc[:, position].to_numpy())
+
+
+def _load_copying(path):
+    """Cleaned frame read back whole, as the cache used to."""
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+        df = table.to_pandas()
+    for name in df.columns:
+        ohio_birth_arrow._copy_counter.record(
+            table.column(name).chunk(0),
+            ohio_birth_arrow._column_values(df[name]))
+
+    return df
+
+
+def _load_arrow(path):
+    """Cleaned frame sharing the buffers of the mapped file."""
+    with pa.memory_map(path) as source:
+        return ohio_birth_arrow.frame_from_table(
+            pa.ipc.open_file(source).read_all())
+
+
+def _marginals_copying(frames):
+    """Suite marginals from a cache handing out deep copies."""
+    entries = {}
+    for dataset, dims, normalize in SUITE_MARGINALS:
+        for _ in range(HITS + 1):
+            key = (ohio_birth_data._fingerprint(frames[dataset], tuple(dims)),
+                   tuple(dims), normalize)
+            if key not in entries:
+                marginal = ohio_birth_analysis._birth_marginal(
+                    frames[dataset], dims)
+                if normalize:
+                    marginal = ohio_birth_analysis.birth_weight_rates(
+                        marginal, percent=normalize == 'percent')
+                entries[key] = marginal
+            marginal = entries[key].copy()
+            _record_frame(entries[key], marginal)
+
+
+def _marginals_arrow(frames):
+    """Suite marginals from the Arrow-backed aggregation cache."""
+    cache = ohio_birth_analysis.AggregationCache()
+    for dataset, dims, normalize in SUITE_MARGINALS:
+        for _ in range(HITS + 1):
+            cache.aggregate(frames[dataset], dims, normalize)
+
+
+class _CopyingEntry():
+    """Aggregation cache entry handing out deep copies of its marginal, as
+    the cache did before the Arrow handoff.
+    """
+
+    def __init__(self, df):
+        self.frame = df
+
+    def to_pandas(self):
+        """Deep copy of the marginal, every column recorded as copied."""
+        copied = self.frame.copy()
+        _record_frame(self.frame, copied)
+
+        return copied
+
+
+@contextlib.contextmanager
+def _patched(owner, name, value):
+    """Replace an attribute of owner while the block runs."""
+    original = getattr(owner, name)
+    setattr(owner, name, value)
+    try:
+        yield original
+    finally:
+        setattr(owner, name, original)
+
+
+def _record_input(values, sources):
+    """Record an array handed to matplotlib or plotly, against the source
+    column it is a view of, if any.
+    """
+    values = np.asarray(values)
+    columns = [column for source in sources
+               for column in (source.iloc[:, position].to_numpy()
+                              for position in range(source.shape[1]))]
+    shared = [column for column in columns
+              if np.shares_memory(column, values)]
+    ohio_birth_arrow._copy_counter.record((shared or columns)[0], values)
+
+
+@contextlib.contextmanager
+def _recorded_plot_inputs(sources):
+    """Record the marginals the plot functions get from the cache, and the
+    arrays they pass to Axes.pie and county_choropleth, while the block
+    runs. sources starts with the tables the plots read directly.
+    """
+    def aggregate(*args, **kwargs):
+        marginal = cached_aggregate(*args, **kwargs)
+        sources.append(marginal)
+        return marginal
+
+    def pie(axes, x, *args, **kwargs):
+        _record_input(x, sources)
+        return plot_pie(axes, x, *args, **kwargs)
+
+    def county_choropleth(fips, values, *args, **kwargs):
+        _record_input(fips, sources)
+        _record_input(values, sources)
+        return choropleth(fips, values, *args, **kwargs)
+
+    with _patched(ohio_birth_analysis, 'aggregate', aggregate) \
+            as cached_aggregate, \
+            _patched(matplotlib.axes.Axes, 'pie', pie) as plot_pie, \
+            _patched(ohio_birth_geometry, 'county_choropleth',
+                     county_choropleth) as choropleth:
+        yield
+
+
+def _plot_calls(frames, county_df):
+    """Draw the figures passing marginals to matplotlib and plotly."""
+    import matplotlib.pyplot as plt
+
+    with _recorded_plot_inputs([county_df]):
+        plt.close(ohio_birth_analysis.ethnicity_pie(frames['race'],
+                                                    show=False))
+        ohio_birth_analysis.county_breakdown_plot(frames['age'], county_df,
+                                                  show=False)
+
+
+def _plot_inputs(frames, county_df, entry):
+    """Copy counters of repeated plot calls, with the aggregation cache
+    holding entry(marginal) entries.
+    """
+    ohio_birth_analysis.clear_aggregation_cache()
+    with _patched(ohio_birth_data, '_cache_entry', entry):
+        # The first calls fill the cache, as an earlier render would.
+        _plot_calls(frames, county_df)
+        stats = _counted(_plot_calls, frames, county_df)
+    ohio_birth_analysis.clear_aggregation_cache()
+
+    return stats
+
+
+def _counted(function, *args):
+    """Copy counters and wall time of one call of function."""
+    ohio_birth_arrow.reset_copy_stats()
+    function(*args)
+    stats = ohio_birth_arrow.copy_stats()
+    stats['wall_s'] = measure_inline(function, *args, repeat=5)
+
+    return stats
+
+
+def main():
+    """Run the handoff benchmark, print a results table and fail if the
+    Arrow handoff does not copy fewer bytes.
+    """
+    county_df = ohio_birth_analysis.county_data_cleaning(COUNTY_PATH)
+    frames = {'age': ohio_birth_analysis.age_data_cleaning(AGE_PATH),
+              'race': ohio_birth_analysis.race_data_cleaning(RACE_PATH)}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'age.arrow')
+        table = ohio_birth_arrow.table_from_frame(frames['age'])
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+        stages = [('cleaned frame', _counted(_load_copying, path),
+                   _counted(_load_arrow, path)),
+                  ('marginals', _counted(_marginals_copying, frames),
+                   _counted(_marginals_arrow, frames)),
+                  ('plot inputs',
+                   _plot_inputs(frames, county_df, _CopyingEntry),
+                   _plot_inputs(frames, county_df,
+                                ohio_birth_arrow.ArrowFrame))
+                  ]
+
+    rows = []
+    for stage, copying, arrow in stages:
+        for mode, stats in [('copying', copying), ('arrow', arrow)]:
+            rows.append(dict(stats, stage=stage, mode=mode))
+
+    print_table(rows, ['stage', 'mode', 'handoffs', 'copies', 'bytes_copied',
+                       'wall_s'])
+
+    regressed = [stage for stage, copying, arrow in stages
+                 if arrow['bytes_copied'] >= copying['bytes_copied']]
+    if regressed:
+        print('\nArrow handoff does not copy less in: '
+              + ', '.join(regressed))
+        sys.exit(1)
+    print('\nArrow handoff copies less at every stage.')
+
+
+if __name__ == '__main__':
+    main()
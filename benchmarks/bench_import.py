@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Import-time budget of the data-only path of the analysis module.
+
+Measures `python -X importtime` for pandas + NumPy alone and for
+resources.ohio_birth_analysis, and fails when the module adds more than
+BUDGET_S on top of its data dependencies or pulls in a plotting library:
+    python -m benchmarks.bench_import
+"""
+import subprocess
+import sys
+
+from benchmarks._harness import print_table
+
+
+# Import time the module may add on top of pandas and NumPy, in seconds.
+BUDGET_S = 0.15
+
+# Packages the data-only path must not import.
+PLOTTING_PACKAGES = ('matplotlib', 'plotly', 'kaleido')
+
+# Repetitions per measurement; the fastest is kept.
+REPEAT = 5
+
+
+def _import_time(statement):
+    """Cumulative import time of a statement in a fresh interpreter.
+
+    Returns the time in seconds and the names of the loaded modules.
+    """
+    command = [sys.executable, '-X', 'importtime', '-c',
+               statement + '; import sys; print(" ".join(sys.modules))']
+    result = subprocess.run(command, capture_output=True, text=True,
+                            check=True)
+
+    # Top-level imports are the unindented entries of the report.
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].startswith(' ') \
+                and not fields[2].startswith('  '):
+            if fields[1].strip().isdigit():
+                total_us += int(fields[1])
+
+    return total_us / 1e6, result.stdout.split()
+
+
+def _best_import_time(statement):
+    """Fastest of REPEAT measurements of a statement."""
+    runs = [_import_time(statement) for _ in range(REPEAT)]
+
+    return min(runs, key=lambda run: run[0])
+
+
+def main():
+    """Measure import times and enforce the budget."""
+    baseline_s, _ = _best_import_time('import numpy, pandas')
+    module_s, modules = _best_import_time(
+        'import numpy, pandas, resources.ohio_birth_analysis')
+
+    plotting = sorted(module for module in modules
+                      if module.split('.')[0] in PLOTTING_PACKAGES)
+
+    print_table([{'import': 'numpy, pandas', 'seconds': baseline_s},
+                 {'import': '+ resources.ohio_birth_analysis',
+                  'seconds': module_s},
+                 {'import': 'module overhead',
+                  'seconds': module_s - baseline_s}
+                 ],
+                ['import', 'seconds'])
+
+    if plotting:
+        sys.exit('Data-only import loaded plotting modules: {}'
+                 .format(', '.join(plotting)))
+    if module_s - baseline_s > BUDGET_S:
+        sys.exit('Import overhead {:.3f} s exceeds the {:.3f} s budget'
+                 .format(module_s - baseline_s, BUDGET_S))
+    print('Within the {:.3f} s budget.'.format(BUDGET_S))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""Microbenchmark of the vectorized binomial interval engine.
+
+Computes Wilson and Clopper-Pearson intervals of the low birth weight rate
+of every stratum of the full year x county x age grid of the mother's age
+data and of the year x county x race x ethnicity grid of the race data
+(the two datasets are published separately, so there is no joint age x
+race grid). Compares a per-stratum Python loop with one call of
+binomial_interval, and reports the largest difference between the two:
+    python -m benchmarks.bench_intervals
+"""
+import math
+import statistics
+
+import numpy as np
+
+from resources import ohio_birth_analysis
+
+from benchmarks._harness import (AGE_PATH, RACE_PATH, measure_inline,
+                                 print_table)
+
+
+# Strata of each grid, without the weight indicator.
+GRIDS = [('age', ['year', 'county', 'age']),
+         ('race', ['year', 'county', 'race', 'ethnicity'])
+         ]
+
+# Interval methods compared.
+METHODS = ['wilson', 'clopper-pearson']
+
+
+def _wilson_cell(successes, trials, z):
+    """Wilson interval of one stratum."""
+    if trials == 0:
+        return math.nan, math.nan
+    rate = successes / trials
+    denominator = 1 + z * z / trials
+    center = (rate + z * z / (2 * trials)) / denominator
+    half_width = z * math.sqrt(rate * (1 - rate) / trials
+                               + z * z / (4 * trials * trials)) / denominator
+
+    return center - half_width, center + half_width
+
+
+def _clopper_pearson_cell(successes, trials, alpha):
+    """Clopper-Pearson interval of one stratum."""
+    from scipy.stats import beta
+
+    if trials == 0:
+        return math.nan, math.nan
+    lower = beta.ppf(alpha / 2, successes, trials - successes + 1) \
+        if successes > 0 else 0.0
+    upper = beta.ppf(1 - alpha / 2, successes + 1, trials - successes) \
+        if successes < trials else 1.0
+
+    return lower, upper
+
+
+def _loop_intervals(successes, trials, method, confidence=0.95):
+    """Intervals computed one stratum at a time."""
+    if method == 'wilson':
+        z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+        bounds = [_wilson_cell(x, n, z) for x, n in zip(successes, trials)]
+    else:
+        bounds = [_clopper_pearson_cell(x, n, 1 - confidence)
+                  for x, n in zip(successes, trials)]
+
+    return np.array(bounds).T
+
+
+def main():
+    """Run the interval microbenchmark and print a results table."""
+    frames = {'age': ohio_birth_analysis.age_data_cleaning(AGE_PATH),
+              'race': ohio_birth_analysis.race_data_cleaning(RACE_PATH)}
+
+    rows = []
+    for dataset, dims in GRIDS:
+        marginal = ohio_birth_analysis.aggregate(frames[dataset],
+                                                 dims + ['weight_indicator'])
+        successes = marginal.low.to_numpy(dtype='float64')
+        trials = marginal.to_numpy(dtype='float64').sum(axis=1)
+
+        for method in METHODS:
+            loop_s = measure_inline(_loop_intervals, successes, trials,
+                                    method, repeat=1)
+            vectorized_s = measure_inline(
+                ohio_birth_analysis.binomial_interval, successes, trials,
+                method=method, repeat=10)
+
+            loop = _loop_intervals(successes, trials, method)
+            vectorized = np.array(ohio_birth_analysis.binomial_interval(
+                successes, trials, method=method))
+            rows.append({'grid': ' x '.join(dims), 'method': method,
+                         'strata': len(trials), 'loop_s': loop_s,
+                         'vectorized_s': vectorized_s,
+                         'speedup': loop_s / vectorized_s,
+                         'max_abs_diff': float(np.nanmax(
+                             np.abs(loop - vectorized)))
+                         })
+
+    print_table(rows, ['grid', 'method', 'strata', 'loop_s', 'vectorized_s',
+                       'speedup', 'max_abs_diff'])
+
+
+if __name__ == '__main__':
+    main()
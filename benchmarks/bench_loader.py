@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Parse time and peak RSS of the untyped and typed CSV loaders.
+
+Compares the original python-engine parse with the typed compiled-engine
+parse on both Ohio Department of Health files:
+    python -m benchmarks.bench_loader
+"""
+from resources import ohio_birth_data
+
+from benchmarks._harness import AGE_PATH, RACE_PATH, measure, print_table
+
+
+def _engines():
+    """Parser engines available in this environment."""
+    engines = ['python', 'c']
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return engines
+
+    return engines + ['pyarrow']
+
+
+def main():
+    """Run the loader benchmark and print a results table."""
+    files = [('age', AGE_PATH, ohio_birth_data._Schemas.age,
+              ohio_birth_data.age_data_cleaning),
+             ('race', RACE_PATH, ohio_birth_data._Schemas.race,
+              ohio_birth_data.race_data_cleaning)
+             ]
+
+    rows = []
+    for name, path, schema, cleaning in files:
+        for engine in _engines():
+            parse = measure(ohio_birth_data._read_birth_csv,
+                            path, schema, engine)
+            clean = measure(cleaning, path, engine=engine)
+            rows.append({'file': name, 'engine': engine,
+                         'parse_s': parse['wall_s'],
+                         'parse_rss_growth_mb': parse['rss_growth_mb'],
+                         'clean_s': clean['wall_s'],
+                         'clean_peak_rss_mb': clean['peak_rss_mb'],
+                         'clean_rss_growth_mb': clean['rss_growth_mb']
+                         })
+
+    print_table(rows, ['file', 'engine', 'parse_s', 'parse_rss_growth_mb',
+                       'clean_s', 'clean_peak_rss_mb',
+                       'clean_rss_growth_mb'])
+
+
+if __name__ == '__main__':
+    main()
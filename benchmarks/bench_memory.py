@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Memory of the cleaned frames with string against categorical dimensions.
+
+Reports memory_usage(deep=True) of every column of the cleaned age and
+race frames, with the dimensions held as strings (as before) and as the
+ordered categoricals the cleaners now return, plus the time of a typical
+groupby on each:
+    python -m benchmarks.bench_memory
+"""
+from resources import ohio_birth_data
+
+from benchmarks._harness import (AGE_PATH, COUNTY_PATH, RACE_PATH,
+                                 measure_inline, print_table)
+
+
+def _string_dimensions(df):
+    """Copy of a cleaned frame with its dimensions held as strings."""
+    df = df.copy()
+    for column in ohio_birth_data.DIMENSIONS:
+        if column in df.columns:
+            df[column] = df[column].astype(str)
+
+    return df
+
+
+def _groupby(df, dims):
+    """The groupby + unstack the plot functions run."""
+    df.groupby(by=dims, observed=True).birth_count.sum().unstack()
+
+
+def main():
+    """Print per-column memory before and after, and groupby times."""
+    county_df = ohio_birth_data.county_data_cleaning(COUNTY_PATH)
+    frames = [('age', ohio_birth_data.age_data_cleaning(
+                   AGE_PATH, county_df=county_df),
+               ['year', 'age', 'weight_indicator']),
+              ('race', ohio_birth_data.race_data_cleaning(
+                  RACE_PATH, county_df=county_df),
+               ['year', 'race', 'weight_indicator'])
+              ]
+
+    rows = []
+    timings = []
+    for name, categorical_df, dims in frames:
+        string_df = _string_dimensions(categorical_df)
+        before = string_df.memory_usage(deep=True, index=False)
+        after = categorical_df.memory_usage(deep=True, index=False)
+        for column in categorical_df.columns:
+            rows.append({'data': name, 'column': column,
+                         'string_kb': before[column] / 2 ** 10,
+                         'categorical_kb': after[column] / 2 ** 10,
+                         'ratio': before[column] / after[column]
+                         })
+        rows.append({'data': name, 'column': 'total',
+                     'string_kb': before.sum() / 2 ** 10,
+                     'categorical_kb': after.sum() / 2 ** 10,
+                     'ratio': before.sum() / after.sum()
+                     })
+        timings.append({'data': name, 'groupby': ', '.join(dims),
+                        'string_ms': 1e3 * measure_inline(
+                            _groupby, string_df, dims, repeat=10),
+                        'categorical_ms': 1e3 * measure_inline(
+                            _groupby, categorical_df, dims, repeat=10)
+                        })
+
+    print_table(rows, ['data', 'column', 'string_kb', 'categorical_kb',
+                       'ratio'])
+    print()
+    print_table(timings, ['data', 'groupby', 'string_ms', 'categorical_ms'])
+
+
+if __name__ == '__main__':
+    main()
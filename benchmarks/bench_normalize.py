@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Microbenchmark of the in-place low birth weight rate normalizer.
+
+On the year x county x age marginal of the mother's age data, compares
+the column-by-column pandas division the plot functions used to run with
+birth_weight_rates, as fractions and as percentages:
+    python -m benchmarks.bench_normalize
+"""
+import warnings
+
+from resources import ohio_birth_analysis
+
+from benchmarks._harness import AGE_PATH, measure_inline, print_table
+
+
+# Marginal whose rows are normalized.
+DIMS = ['year', 'county', 'age', 'weight_indicator']
+
+
+def _pandas_rates(marginal, percent=False):
+    """Rates computed the original way, one column at a time."""
+    marginal = marginal.copy()
+    total_births = marginal.low + marginal.normal
+    marginal.low = marginal.low / total_births
+    marginal.normal = marginal.normal / total_births
+    if percent:
+        return [val * 100 for val in marginal.low.tolist()]
+
+    return marginal
+
+
+def main():
+    """Run the normalizer microbenchmark and print a results table."""
+    age_df = ohio_birth_analysis.age_data_cleaning(AGE_PATH)
+    marginal = ohio_birth_analysis.aggregate(age_df, DIMS)
+    empty_rows = int((marginal.sum(axis=1) == 0).sum())
+
+    # The normalizer must not warn on strata without births.
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', RuntimeWarning)
+        ohio_birth_analysis.birth_weight_rates(marginal, percent=True)
+
+    rows = []
+    for percent in [False, True]:
+        pandas_s = measure_inline(_pandas_rates, marginal, percent,
+                                  repeat=20)
+        numpy_s = measure_inline(ohio_birth_analysis.birth_weight_rates,
+                                 marginal, percent, repeat=20)
+        rows.append({'output': 'percent' if percent else 'fraction',
+                     'strata': len(marginal), 'empty_strata': empty_rows,
+                     'pandas_s': pandas_s, 'in_place_s': numpy_s,
+                     'speedup': pandas_s / numpy_s
+                     })
+
+    print_table(rows, ['output', 'strata', 'empty_strata', 'pandas_s',
+                       'in_place_s', 'speedup'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Incremental refresh of a new provisional year versus a full rebuild.
+
+The shipped mother's age file is extended by a provisional year ('2018 **',
+a copy of the 2017 rows), the way the next annual release arrives. A state
+built from the shipped files merges an update file holding only that year,
+and a fresh state is built from the extended file in one go. Reports the
+rows cleaned, figures drawn and wall time of each, and fails unless the
+merged cube matches the rebuilt one:
+    python -m benchmarks.bench_refresh
+"""
+import os
+import tempfile
+
+import numpy as np
+
+from resources import ohio_birth_analysis, ohio_birth_refresh
+
+from benchmarks._harness import AGE_PATH, COUNTY_PATH, RACE_PATH, print_table
+
+
+# Label of the last shipped year and of the provisional year merged.
+SHIPPED_YEAR = '2017 **'
+PROVISIONAL_YEAR = '2018 **'
+
+
+def _write_update_files(directory):
+    """Write the update file of the provisional year and the shipped file
+    extended by it. Returns both paths.
+    """
+    with open(AGE_PATH) as age_file:
+        header, *lines = age_file.read().splitlines()
+    provisional = [line[:-len(SHIPPED_YEAR)] + PROVISIONAL_YEAR
+                   for line in lines if line.endswith(',' + SHIPPED_YEAR)]
+
+    update_path = os.path.join(directory, 'age_update.csv')
+    full_path = os.path.join(directory, 'age_full.csv')
+    for path, rows in [(update_path, provisional),
+                       (full_path, lines + provisional)]:
+        with open(path, 'w') as birth_file:
+            birth_file.write('\n'.join([header] + rows) + '\n')
+
+    return update_path, full_path
+
+
+def _report(run, result):
+    """Table row of a refresh result."""
+    years = result['years'].get('age', [])
+    return {'run': run,
+            'years': '{}-{}'.format(years[0], years[-1]) if len(years) > 1
+            else ', '.join(str(year) for year in years),
+            'rows_cleaned': result['rows_cleaned'],
+            'figures_drawn': result['figures_rendered'],
+            'wall_s': result['seconds']
+            }
+
+
+def main():
+    """Run the refresh benchmark and print a results table."""
+    county_df = ohio_birth_analysis.county_data_cleaning(COUNTY_PATH)
+
+    with tempfile.TemporaryDirectory() as directory:
+        update_path, full_path = _write_update_files(directory)
+        out_dir = os.path.join(directory, 'out')
+        state_dir = os.path.join(directory, 'state')
+        rebuilt_dir = os.path.join(directory, 'rebuilt')
+
+        rows = [_report('initial build', ohio_birth_refresh.refresh(
+                    out_dir, state_dir, AGE_PATH, RACE_PATH,
+                    county_df=county_df)),
+                _report('incremental', ohio_birth_refresh.refresh(
+                    out_dir, state_dir, age_path=update_path,
+                    county_df=county_df)),
+                _report('full rebuild', ohio_birth_refresh.refresh(
+                    os.path.join(directory, 'rebuilt_out'), rebuilt_dir,
+                    full_path, RACE_PATH, county_df=county_df))
+                ]
+
+        merged = ohio_birth_refresh.load_state(state_dir)[0]['age']
+        rebuilt = ohio_birth_refresh.load_state(rebuilt_dir)[0]['age']
+
+    print_table(rows, ['run', 'years', 'rows_cleaned', 'figures_drawn',
+                       'wall_s'])
+
+    if merged.dims != rebuilt.dims \
+            or any(not merged.labels[dim].equals(rebuilt.labels[dim])
+                   for dim in merged.dims) \
+            or not np.array_equal(merged.counts, rebuilt.counts):
+        raise AssertionError('The merged cube differs from the rebuilt one.')
+    print('\nMerged cube matches the full rebuild.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Wall time of serial versus process-pool rendering of the figure suite.
+
+Renders the nine figures to PNG serially and with pools of 1, 2, 4, ...
+processes up to the machine's core count, including pool start-up:
+    python -m benchmarks.bench_render
+"""
+import os
+import tempfile
+import time
+
+from resources import ohio_birth_analysis, ohio_birth_render
+
+from benchmarks._harness import (AGE_PATH, COUNTY_PATH, RACE_PATH,
+                                 print_table)
+
+
+def _process_counts():
+    """Pool sizes from 1 doubling up to the core count."""
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 < cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+
+    return counts
+
+
+def main():
+    """Run the rendering benchmark and print a results table."""
+    age_df = ohio_birth_analysis.age_data_cleaning(AGE_PATH)
+    race_df = ohio_birth_analysis.race_data_cleaning(RACE_PATH)
+    county_df = ohio_birth_analysis.county_data_cleaning(COUNTY_PATH)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        start = time.perf_counter()
+        ohio_birth_render.render_suite(age_df, race_df, county_df, out_dir)
+        serial_s = time.perf_counter() - start
+        rows.append({'mode': 'serial', 'processes': 1, 'wall_s': serial_s,
+                     'speedup': 1.0
+                     })
+
+        for processes in _process_counts():
+            start = time.perf_counter()
+            ohio_birth_render.render_suite_parallel(
+                age_df, race_df, county_df, out_dir, processes=processes)
+            parallel_s = time.perf_counter() - start
+            rows.append({'mode': 'parallel', 'processes': processes,
+                         'wall_s': parallel_s,
+                         'speedup': serial_s / parallel_s
+                         })
+
+    print_table(rows, ['mode', 'processes', 'wall_s', 'speedup'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Microbenchmark of the vectorized risk test battery.
+
+Compares every age group, and every race and ethnicity group, with the
+reference group of each year and county: risk ratio, odds ratio and
+Pearson chi-square test of every 2 x 2 table, and Benjamini-Hochberg
+adjusted p-values over all of them. Compares testing one table at a time
+with scipy.stats.chi2_contingency with one call of risk_tests on the
+aggregation cube, and reports the largest difference between the two:
+    python -m benchmarks.bench_risk
+"""
+import math
+
+import numpy as np
+
+from resources import ohio_birth_analysis
+
+from benchmarks._harness import (AGE_PATH, COUNTY_PATH, RACE_PATH,
+                                 measure_inline, print_table)
+
+
+# Dataset, strata and the groups compared within each stratum.
+BATTERIES = [('age', ['year', 'county'], 'age'),
+             ('race', ['year', 'county'], ['race', 'ethnicity'])
+             ]
+
+
+def _table_tests(a, b, c, d):
+    """Risk ratio, odds ratio, chi-square and p-value of one 2 x 2 table."""
+    from scipy import stats
+
+    if 0 in (a + b, c + d, a + c, b + d):
+        chi_square, p_value = math.nan, math.nan
+    else:
+        chi_square, p_value, _, _ = stats.chi2_contingency(
+            [[a, b], [c, d]], correction=False)
+    if 0 in (a + b, c + d):
+        return math.nan, math.nan, chi_square, p_value
+
+    # Haldane-Anscombe correction of tables with a zero cell.
+    if 0 in (a, b, c, d):
+        a, b, c, d = a + 0.5, b + 0.5, c + 0.5, d + 0.5
+    risk_ratio = (a / (a + b)) / (c / (c + d))
+    odds_ratio = a * d / (b * c)
+
+    return risk_ratio, odds_ratio, chi_square, p_value
+
+
+def _loop_tests(cube, strata, groups):
+    """Every comparison tested one table at a time, then adjusted."""
+    from scipy import stats
+
+    reference = ohio_birth_analysis.risk_tests(cube, strata, groups)
+    results = np.array([_table_tests(a, n - a, c, m - c) for a, n, c, m
+                        in zip(reference.births, reference.total_births,
+                               reference.reference_births,
+                               reference.reference_total_births)]).T
+
+    adjusted = np.full(len(results[3]), np.nan)
+    tested = ~np.isnan(results[3])
+    adjusted[tested] = stats.false_discovery_control(results[3][tested])
+
+    return np.vstack([results, adjusted])
+
+
+def main():
+    """Run the risk test microbenchmark and print a results table."""
+    county_df = ohio_birth_analysis.county_data_cleaning(COUNTY_PATH)
+    cubes = {'age': ohio_birth_analysis.age_cube(
+                 ohio_birth_analysis.age_data_cleaning(AGE_PATH), county_df),
+             'race': ohio_birth_analysis.race_cube(
+                 ohio_birth_analysis.race_data_cleaning(RACE_PATH),
+                 county_df)
+             }
+
+    rows = []
+    for dataset, strata, groups in BATTERIES:
+        loop_s = measure_inline(_loop_tests, cubes[dataset], strata, groups,
+                                repeat=1)
+        vectorized_s = measure_inline(ohio_birth_analysis.risk_tests,
+                                      cubes[dataset], strata, groups,
+                                      repeat=10)
+
+        loop = _loop_tests(cubes[dataset], strata, groups)
+        tests = ohio_birth_analysis.risk_tests(cubes[dataset], strata, groups)
+        vectorized = tests[['risk_ratio', 'odds_ratio', 'chi_square',
+                            'p_value', 'p_adjusted']].to_numpy().T
+        finite = np.isfinite(loop) & np.isfinite(vectorized)
+        if (np.isfinite(loop) != np.isfinite(vectorized)).any():
+            raise AssertionError('The loop and risk_tests disagree on which '
+                                 'statistics are defined.')
+        group_names = groups if isinstance(groups, str) else ' x '.join(groups)
+        rows.append({'groups': group_names, 'comparisons': len(tests),
+                     'tested': int(tests.p_value.notna().sum()),
+                     'loop_s': loop_s, 'vectorized_s': vectorized_s,
+                     'speedup': loop_s / vectorized_s,
+                     'max_rel_diff': float(np.max(
+                         np.abs(loop[finite] - vectorized[finite])
+                         / np.maximum(np.abs(loop[finite]), 1e-300)))
+                     })
+
+    print_table(rows, ['groups', 'comparisons', 'tested', 'loop_s',
+                       'vectorized_s', 'speedup', 'max_rel_diff'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Microbenchmark of the empirical-Bayes smoothing of county rates.
+
+Shrinks the low birth weight rate of every county, county-year and
+county-year stratum toward a beta-binomial prior fitted across the
+counties of each year (and age, or race and ethnicity, group). Compares
+fitting and shrinking one group at a time in a Python loop with one call
+of beta_binomial_smoothing over the whole grid, and reports the largest
+difference between the two:
+    python -m benchmarks.bench_smoothing
+"""
+import math
+
+import numpy as np
+
+from resources import ohio_birth_analysis, ohio_birth_stats
+
+from benchmarks._harness import (AGE_PATH, RACE_PATH, measure_inline,
+                                 print_table)
+
+
+# Dataset, strata and the dimensions of which every level gets a prior.
+GRIDS = [('age', ['county'], []),
+         ('age', ['year', 'county'], ['year']),
+         ('age', ['year', 'county', 'age'], ['year', 'age']),
+         ('race', ['year', 'county', 'race', 'ethnicity'],
+          ['year', 'race', 'ethnicity'])
+         ]
+
+
+def _smooth_group(successes, trials):
+    """Shrunk rates of the strata of one group, one stratum at a time."""
+    total_trials = sum(trials)
+    if total_trials == 0:
+        return [math.nan] * len(trials)
+    prior_mean = sum(successes) / total_trials
+    observed = [(x, n) for x, n in zip(successes, trials) if n > 0]
+    variance = sum(n * (x / n - prior_mean) ** 2
+                   for x, n in observed) / total_trials
+    binomial = prior_mean * (1 - prior_mean)
+    between = variance - binomial / (total_trials / len(observed))
+    strength = max(binomial / between - 1, 0) if between > 0 else math.inf
+
+    smoothed = []
+    for x, n in zip(successes, trials):
+        if n > 0:
+            weight = n / (n + strength)
+            smoothed.append(weight * x / n + (1 - weight) * prior_mean)
+        else:
+            smoothed.append(prior_mean)
+
+    return smoothed
+
+
+def _loop_smoothing(successes, trials, groups):
+    """Rates smoothed group by group."""
+    smoothed = np.empty(len(trials))
+    for group in range(groups.max() + 1):
+        members = np.flatnonzero(groups == group)
+        smoothed[members] = _smooth_group(successes[members].tolist(),
+                                          trials[members].tolist())
+
+    return smoothed
+
+
+def main():
+    """Run the smoothing microbenchmark and print a results table."""
+    frames = {'age': ohio_birth_analysis.age_data_cleaning(AGE_PATH),
+              'race': ohio_birth_analysis.race_data_cleaning(RACE_PATH)}
+
+    rows = []
+    for dataset, dims, by in GRIDS:
+        marginal = ohio_birth_analysis.aggregate(frames[dataset],
+                                                 dims + ['weight_indicator'])
+        successes = marginal.low.to_numpy(dtype='float64')
+        trials = marginal.to_numpy(dtype='float64').sum(axis=1)
+        groups = ohio_birth_stats._group_codes(marginal.index, by) if by \
+            else np.zeros(len(trials), dtype='intp')
+
+        loop_s = measure_inline(_loop_smoothing, successes, trials, groups,
+                                repeat=1)
+        vectorized_s = measure_inline(
+            ohio_birth_analysis.beta_binomial_smoothing, successes, trials,
+            groups, repeat=10)
+
+        loop = _loop_smoothing(successes, trials, groups)
+        vectorized = ohio_birth_analysis.beta_binomial_smoothing(
+            successes, trials, groups)[0]
+        rows.append({'grid': ' x '.join(dims), 'strata': len(trials),
+                     'priors': int(groups.max()) + 1, 'loop_s': loop_s,
+                     'vectorized_s': vectorized_s,
+                     'speedup': loop_s / vectorized_s,
+                     'max_abs_diff': float(np.nanmax(
+                         np.abs(loop - vectorized)))
+                     })
+
+    print_table(rows, ['grid', 'strata', 'priors', 'loop_s', 'vectorized_s',
+                       'speedup', 'max_abs_diff'])
+
+
+if __name__ == '__main__':
+    main()
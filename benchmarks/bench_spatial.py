@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Microbenchmark of the batched permutation tests of spatial clustering.
+
+Tests the county low birth weight rates for global (Moran's I) and local
+(LISA) spatial autocorrelation. Compares drawing the permutations one at a
+time in a Python loop, the global statistic once per permutation and the
+local ones once per county and permutation, with the batched array
+implementations, at several permutation counts. The two draw different
+permutations, so their p-values agree only up to sampling noise:
+    python -m benchmarks.bench_spatial
+"""
+import numpy as np
+
+from resources import ohio_birth_analysis, ohio_birth_spatial
+
+from benchmarks._harness import (AGE_PATH, COUNTY_PATH, measure_inline,
+                                 print_table)
+
+
+# Permutation counts compared.
+PERMUTATIONS = [99, 999]
+
+
+def _loop_morans_i(values, weights, permutations, seed=0):
+    """Pseudo p-value of global Moran's I, one permutation at a time."""
+    rng = np.random.default_rng(seed)
+    deviations = values - values.mean()
+    statistic = deviations @ (weights @ deviations) / (deviations
+                                                       @ deviations)
+    larger = 0
+    for _ in range(permutations):
+        permuted = rng.permutation(deviations)
+        larger += permuted @ (weights @ permuted) / (permuted @ permuted) \
+            >= statistic
+    larger = min(larger, permutations - larger)
+
+    return np.array([(larger + 1) / (permutations + 1)])
+
+
+def _loop_local_morans_i(values, weights, permutations, seed=0):
+    """Pseudo p-values of local Moran's I, one county and permutation at a
+    time.
+    """
+    rng = np.random.default_rng(seed)
+    deviations = values - values.mean()
+    lags = weights @ deviations
+    weights = weights.tocsr()
+
+    p_values = []
+    for county in range(len(deviations)):
+        row = weights[county]
+        others = np.delete(deviations, county)
+        larger = 0
+        for _ in range(permutations):
+            drawn = rng.choice(others, row.nnz, replace=False)
+            larger += drawn @ row.data * deviations[county] \
+                >= lags[county] * deviations[county]
+        larger = min(larger, permutations - larger)
+        p_values.append((larger + 1) / (permutations + 1))
+
+    return np.array(p_values)
+
+
+def _batched_morans_i(values, weights, permutations):
+    """Pseudo p-value of global Moran's I, batched."""
+    return np.array([ohio_birth_spatial.morans_i(values, weights,
+                                                 permutations, 0)['p_sim']])
+
+
+def _batched_local_morans_i(values, weights, permutations):
+    """Pseudo p-values of local Moran's I, batched."""
+    return ohio_birth_spatial.local_morans_i(values, weights, permutations,
+                                             0)['p_sim']
+
+
+def main():
+    """Run the spatial microbenchmark and print a results table."""
+    county_df = ohio_birth_analysis.county_data_cleaning(COUNTY_PATH)
+    age_df = ohio_birth_analysis.age_data_cleaning(AGE_PATH)
+    values = ohio_birth_analysis.aggregate(
+        age_df, ['county', 'weight_indicator'],
+        normalize=True).low.reindex(county_df.index).to_numpy()
+    weights = ohio_birth_spatial.county_weights(county_df.FIPS.to_numpy())
+
+    rows = []
+    for statistic, loop, batched in [
+            ("Moran's I", _loop_morans_i, _batched_morans_i),
+            ('LISA', _loop_local_morans_i, _batched_local_morans_i)]:
+        for permutations in PERMUTATIONS:
+            loop_s = measure_inline(loop, values, weights, permutations,
+                                    repeat=1)
+            batched_s = measure_inline(batched, values, weights,
+                                       permutations, repeat=5)
+            rows.append({'statistic': statistic,
+                         'permutations': permutations, 'loop_s': loop_s,
+                         'batched_s': batched_s,
+                         'speedup': loop_s / batched_s,
+                         'max_p_diff': float(np.max(np.abs(
+                             loop(values, weights, permutations)
+                             - batched(values, weights, permutations))))
+                         })
+
+    # The default permutation count, batched only.
+    for statistic, batched in [("Moran's I", _batched_morans_i),
+                               ('LISA', _batched_local_morans_i)]:
+        rows.append({'statistic': statistic,
+                     'permutations': ohio_birth_spatial.PERMUTATIONS,
+                     'loop_s': float('nan'),
+                     'batched_s': measure_inline(
+                         batched, values, weights,
+                         ohio_birth_spatial.PERMUTATIONS, repeat=5),
+                     'speedup': float('nan'), 'max_p_diff': float('nan')
+                     })
+
+    print_table(rows, ['statistic', 'permutations', 'loop_s', 'batched_s',
+                       'speedup', 'max_p_diff'])
+
+
+if __name__ == '__main__':
+    main()
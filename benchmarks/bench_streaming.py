@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Peak memory of streaming ingestion against loading a whole file.
+
+Writes a synthetic mother's age file with ohio_birth_synthetic, then
+builds the age cube from it in chunks of several sizes. The whole-file
+load is only run up to --full-rows rows, since it holds every row in
+memory:
+    python -m benchmarks.bench_streaming --rows 100000000
+"""
+import argparse
+import os
+import tempfile
+
+from resources import ohio_birth_data, ohio_birth_synthetic
+
+from benchmarks._harness import measure, print_table
+
+
+# Chunk sizes of the streaming runs.
+CHUNK_SIZES = [100000, 1000000]
+
+
+def _stream_cube(path, chunksize):
+    """Build the age cube from a file, chunk by chunk."""
+    ohio_birth_data.age_cube(
+        ohio_birth_data.age_data_cleaning(path, chunksize=chunksize))
+
+
+def _full_cube(path):
+    """Build the age cube from a file loaded whole."""
+    ohio_birth_data.age_cube(ohio_birth_data.age_data_cleaning(path))
+
+
+def main():
+    """Run the streaming benchmark and print a results table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000000,
+                        help='data rows of the synthetic file')
+    parser.add_argument('--full-rows', type=int, default=5000000,
+                        help='largest file to also load whole')
+    parser.add_argument('--dir', default=tempfile.gettempdir(),
+                        help='directory to write the synthetic file to')
+    args = parser.parse_args()
+
+    path = os.path.join(args.dir, 'synthetic_age_{}.csv'.format(args.rows))
+    try:
+        file_rows = ohio_birth_synthetic.write_birth_file(path, 'age',
+                                                          rows=args.rows)
+        size_mb = os.path.getsize(path) / 2 ** 20
+
+        runs = [('stream', chunksize, measure(_stream_cube, path, chunksize,
+                                              repeat=1))
+                for chunksize in CHUNK_SIZES]
+        if args.rows <= args.full_rows:
+            runs.append(('whole file', '-', measure(_full_cube, path,
+                                                    repeat=1)))
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+    rows = [{'mode': mode, 'rows': file_rows, 'file_mb': size_mb,
+             'chunk_rows': chunksize, 'wall_s': result['wall_s'],
+             'rows_per_s': file_rows / result['wall_s'],
+             'peak_rss_mb': result['peak_rss_mb']
+             }
+            for mode, chunksize, result in runs]
+
+    print_table(rows, ['mode', 'rows', 'file_mb', 'chunk_rows', 'wall_s',
+                       'rows_per_s', 'peak_rss_mb'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""Benchmark suite of every public data, statistics and plot function, with
+regression reports between commits.
+
+Each function is measured in fresh processes on the shipped data (scale 1)
+and on synthetic files 10 and 100 times larger, recording wall time, CPU
+time and peak memory to a JSON file:
+    python -m benchmarks.bench_suite run --output results.json
+
+Two result files are compared with a relative threshold, exiting non-zero
+when anything regressed:
+    python -m benchmarks.bench_suite compare base.json results.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+from resources import (ohio_birth_analysis, ohio_birth_spatial,
+                       ohio_birth_synthetic)
+
+from benchmarks._harness import (AGE_PATH, COUNTY_PATH, RACE_PATH, measure,
+                                 print_table)
+
+
+# Input scales: 1 is the shipped data, larger scales are synthetic files
+# with that many times as many counties.
+SCALES = [1, 10, 100]
+
+# Measured quantities and the smallest change of each worth reporting, so
+# that timer noise on fast functions does not read as a regression.
+METRICS = {'wall_s': 0.01, 'cpu_s': 0.01, 'peak_rss_mb': 5.0}
+
+# Groups of the category time series benchmark.
+TEEN_GROUPS = {'teen': ['Less than 15', '15 to 17'],
+               'older': ['45 and older']}
+
+
+# Every public function: benchmark name, function, dataset, input and
+# extra arguments. Inputs are 'path' (the raw CSV), 'frame' (the cleaned
+# DataFrame), 'marginal' (its county, year and weight counts), 'county'
+# (the county table only, not scaled) or one of the array inputs of
+# ARRAY_INPUTS, passed as positional arguments.
+BENCHMARKS = [
+    ('age_data_cleaning', ohio_birth_analysis.age_data_cleaning, 'age',
+     'path', (), {}),
+    ('race_data_cleaning', ohio_birth_analysis.race_data_cleaning, 'race',
+     'path', (), {}),
+    ('county_data_cleaning', ohio_birth_analysis.county_data_cleaning,
+     None, 'county', (), {}),
+    ('age_pivot_table', ohio_birth_analysis.age_pivot_table, 'age',
+     'frame', (), {}),
+    ('race_pivot_table', ohio_birth_analysis.race_pivot_table, 'race',
+     'frame', (), {}),
+    ('age_cube', ohio_birth_analysis.age_cube, 'age', 'frame', (), {}),
+    ('race_cube', ohio_birth_analysis.race_cube, 'race', 'frame', (), {}),
+    ('category_time_series', ohio_birth_analysis.category_time_series,
+     'age', 'frame', ('age', TEEN_GROUPS), {}),
+    ('aggregate', ohio_birth_analysis.aggregate, 'age', 'frame',
+     (['county', 'weight_indicator'],), {'normalize': True}),
+    ('birth_weight_rates', ohio_birth_analysis.birth_weight_rates, 'age',
+     'marginal', (), {}),
+    ('binomial_interval', ohio_birth_analysis.binomial_interval, 'age',
+     'rates', (), {'method': 'clopper-pearson'}),
+    ('rate_intervals', ohio_birth_analysis.rate_intervals, 'age',
+     'marginal', (), {}),
+    ('low_rate_intervals', ohio_birth_analysis.low_rate_intervals, 'age',
+     'frame', (['county', 'age'],), {}),
+    ('beta_binomial_smoothing', ohio_birth_analysis.beta_binomial_smoothing,
+     'age', 'rates', (), {}),
+    ('smoothed_low_rates', ohio_birth_analysis.smoothed_low_rates, 'age',
+     'frame', (['county', 'age'],), {'by': ['age']}),
+    ('fit_trends', ohio_birth_analysis.fit_trends, 'age', 'series', (),
+     {'method': 'logistic'}),
+    ('low_rate_trends', ohio_birth_analysis.low_rate_trends, 'age',
+     'frame', (['county', 'age'],), {'method': 'logistic'}),
+    ('adjust_p_values', ohio_birth_analysis.adjust_p_values, 'age',
+     'p_values', (), {}),
+    ('risk_tests', ohio_birth_analysis.risk_tests, 'age', 'frame',
+     (['year', 'county'], 'age'), {}),
+    ('low_rate_clusters', ohio_birth_spatial.low_rate_clusters, 'age',
+     'frame', ('county_df',), {'seed': 0}),
+    ('total_age_bar', ohio_birth_analysis.total_age_bar, 'age', 'frame',
+     (), {'show': False}),
+    ('relative_age_bar', ohio_birth_analysis.relative_age_bar, 'age',
+     'frame', (), {'show': False}),
+    ('total_race_bar', ohio_birth_analysis.total_race_bar, 'race',
+     'frame', (), {'show': False}),
+    ('relative_race_bar', ohio_birth_analysis.relative_race_bar, 'race',
+     'frame', (), {'show': False}),
+    ('ethnicity_pie', ohio_birth_analysis.ethnicity_pie, 'race', 'frame',
+     (), {'show': False}),
+    ('county_breakdown_plot', ohio_birth_analysis.county_breakdown_plot,
+     'age', 'frame', ('county_df',), {'show': False}),
+    ('annual_low_births_line', ohio_birth_analysis.annual_low_births_line,
+     'age', 'frame', (), {'show': False}),
+    ('high_risk_ages_stacked', ohio_birth_analysis.high_risk_ages_stacked,
+     'age', 'frame', (), {'show': False}),
+    ('race_breakdown_plot_stacked',
+     ohio_birth_analysis.race_breakdown_plot_stacked, 'race', 'frame', (),
+     {'show': False})
+    ]
+
+# Cleaning function of each dataset, building the 'frame' inputs.
+CLEANING = {'age': ohio_birth_analysis.age_data_cleaning,
+            'race': ohio_birth_analysis.race_data_cleaning
+            }
+
+
+def _cleaned_frame(dataset, path, plot=False):
+    """Cleaned input frame, with the plotting libraries already imported
+    for plot benchmarks so that their one-off import is not timed.
+    """
+    if plot:
+        import matplotlib.pyplot  # noqa: F401
+        from resources import ohio_birth_geometry  # noqa: F401
+
+    return CLEANING[dataset](path)
+
+
+def _birth_marginal(dataset, path):
+    """County, year and weight indicator counts of the cleaned frame."""
+    return ohio_birth_analysis.aggregate(
+        CLEANING[dataset](path), ['county', 'year', 'weight_indicator'])
+
+
+def _rate_arrays(dataset, path):
+    """Low and total births of every year, county and age stratum.
+
+    SciPy is imported here, so that its one-off import is not timed.
+    """
+    from scipy import special  # noqa: F401
+
+    marginal = ohio_birth_analysis.aggregate(
+        CLEANING[dataset](path), ['year', 'county', 'age',
+                                  'weight_indicator'])
+
+    return marginal.low.to_numpy(), marginal.sum(axis=1).to_numpy()
+
+
+def _series_arrays(dataset, path):
+    """Low and total births of every county and age series by year, and
+    the years, with SciPy imported as for _rate_arrays.
+    """
+    from scipy import special  # noqa: F401
+
+    marginal = ohio_birth_analysis.aggregate(
+        CLEANING[dataset](path), ['county', 'age', 'year',
+                                  'weight_indicator'])
+    successes = marginal.low.unstack('year')
+    trials = marginal.sum(axis=1).unstack('year')
+
+    return (successes.to_numpy(), trials.to_numpy(),
+            successes.columns.to_numpy())
+
+
+def _trend_p_values(dataset, path):
+    """Logistic trend p-values of every county and age series."""
+    return (ohio_birth_analysis.fit_trends(*_series_arrays(dataset, path),
+                                           method='logistic')['p_value'],)
+
+
+# Array inputs: the function building the positional arrays of each.
+ARRAY_INPUTS = {'rates': _rate_arrays, 'series': _series_arrays,
+                'p_values': _trend_p_values}
+
+
+def _call_unpacked(arrays, function, *args, **kwargs):
+    """Call function with the prepared arrays as positional arguments."""
+    return function(*arrays, *args, **kwargs)
+
+
+def _write_inputs(scales, data_dir):
+    """Paths and row counts of the input files of every dataset and scale.
+
+    Scale 1 uses the shipped files, larger scales are written once.
+    """
+    inputs = {(1, 'age'): AGE_PATH, (1, 'race'): RACE_PATH}
+    for dataset in CLEANING:
+        model = ohio_birth_synthetic.fit_birth_model(dataset)
+        for scale in scales:
+            if scale == 1:
+                continue
+            path = os.path.join(data_dir,
+                                '{}_{}x.csv'.format(dataset, scale))
+            ohio_birth_synthetic.write_birth_file(
+                path, dataset, counties=scale * len(model['counties']),
+                model=model)
+            inputs[(scale, dataset)] = path
+
+    rows = {}
+    for key, path in inputs.items():
+        with open(path) as birth_file:
+            rows[key] = sum(1 for _ in birth_file) - 1
+
+    return inputs, rows
+
+
+def _git_commit():
+    """Current commit of the repository, if it is a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'],
+                              capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))
+                              ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(scales=SCALES, repeat=3, only=None, data_dir=None):
+    """Measure every benchmark at every scale.
+
+    Returns the result document written by the run command: metadata and
+    one entry per benchmark and scale with the fastest repetition.
+    """
+    county_df = ohio_birth_analysis.county_data_cleaning(COUNTY_PATH)
+    benchmarks = [benchmark for benchmark in BENCHMARKS
+                  if only is None or benchmark[0] in only]
+
+    with tempfile.TemporaryDirectory(dir=data_dir) as temp_dir:
+        inputs, rows = _write_inputs(scales, temp_dir)
+
+        results = []
+        for name, function, dataset, kind, args, kwargs in benchmarks:
+            args = tuple(county_df if arg == 'county_df' else arg
+                         for arg in args)
+            for scale in scales:
+                if kind == 'county':
+                    if scale != 1:
+                        continue
+                    result = measure(function, COUNTY_PATH, repeat=repeat)
+                elif kind == 'path':
+                    result = measure(function, inputs[(scale, dataset)],
+                                     *args, repeat=repeat, **kwargs)
+                elif kind == 'marginal':
+                    setup = (_birth_marginal, (dataset,
+                                               inputs[(scale, dataset)]))
+                    result = measure(function, *args, repeat=repeat,
+                                     setup=setup, **kwargs)
+                elif kind in ARRAY_INPUTS:
+                    setup = (ARRAY_INPUTS[kind], (dataset,
+                                                  inputs[(scale, dataset)]))
+                    result = measure(_call_unpacked, function, *args,
+                                     repeat=repeat, setup=setup, **kwargs)
+                else:
+                    setup = (_cleaned_frame, (dataset,
+                                              inputs[(scale, dataset)],
+                                              'show' in kwargs))
+                    result = measure(function, *args, repeat=repeat,
+                                     setup=setup, **kwargs)
+                result.update({'benchmark': name, 'scale': scale,
+                               'rows': rows.get((scale, dataset))})
+                results.append(result)
+                print('{:<30}{:>5}x{:>10.4f} s'
+                      .format(name, scale, result['wall_s']),
+                      file=sys.stderr)
+
+    metadata = {'commit': _git_commit(),
+                'time': datetime.datetime.now(datetime.timezone.utc)
+                .isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'repeat': repeat, 'scales': list(scales)
+                }
+
+    return {'metadata': metadata, 'results': results}
+
+
+def compare_results(baseline, current, threshold=0.1):
+    """Compare two result documents metric by metric.
+
+    A metric regressed when it grew by more than threshold (relative) and
+    by more than its noise floor in METRICS. Returns one row per benchmark,
+    scale and metric present in both documents.
+    """
+    baseline_results = {(result['benchmark'], result['scale']): result
+                        for result in baseline['results']}
+
+    rows = []
+    for result in current['results']:
+        key = (result['benchmark'], result['scale'])
+        if key not in baseline_results:
+            continue
+        for metric, floor in METRICS.items():
+            before = baseline_results[key][metric]
+            after = result[metric]
+            change = (after - before) / before if before else 0.0
+            if change > threshold and after - before > floor:
+                status = 'REGRESSED'
+            elif change < -threshold and before - after > floor:
+                status = 'improved'
+            else:
+                status = 'ok'
+            rows.append({'benchmark': key[0], 'scale': key[1],
+                         'metric': metric, 'baseline': before,
+                         'current': after,
+                         'change': '{:+.1%}'.format(change),
+                         'status': status
+                         })
+
+    return rows
+
+
+def main():
+    """Command line entry point: run the suite or compare two runs."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the benchmark suite')
+    run_parser.add_argument('--output', default='benchmark_results.json',
+                            help='JSON file to write results to')
+    run_parser.add_argument('--scales', nargs='+', type=int, default=SCALES)
+    run_parser.add_argument('--repeat', type=int, default=3)
+    run_parser.add_argument('--only', nargs='+',
+                            choices=[benchmark[0]
+                                     for benchmark in BENCHMARKS],
+                            help='run only these benchmarks')
+    run_parser.add_argument('--data-dir', default=None,
+                            help='directory for the synthetic input files')
+
+    compare_parser = commands.add_parser('compare',
+                                         help='compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='relative growth counted as a '
+                                     'regression')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        # Plot functions render off screen in the measuring processes.
+        os.environ.setdefault('MPLBACKEND', 'agg')
+        document = run_suite(args.scales, args.repeat, args.only,
+                             args.data_dir)
+        with open(args.output, 'w') as output_file:
+            json.dump(document, output_file, indent=1)
+
+        print_table(document['results'], ['benchmark', 'scale', 'rows',
+                                          'wall_s', 'cpu_s', 'peak_rss_mb',
+                                          'rss_growth_mb'])
+        return
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(args.current) as current_file:
+        current = json.load(current_file)
+
+    rows = compare_results(baseline, current, args.threshold)
+    print_table(rows, ['benchmark', 'scale', 'metric', 'baseline',
+                       'current', 'change', 'status'])
+
+    regressions = [row for row in rows if row['status'] == 'REGRESSED']
+    print('\n{} regression(s) above {:.0%}'
+          .format(len(regressions), args.threshold))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""Microbenchmark of the batched trend fits.
+
+Fits the 2006-2017 trend of the low birth weight rate of every county,
+county and age group, and county, race and ethnicity group, by weighted
+least squares and by logistic regression. Compares a per-series loop, a
+NumPy reimplementation of the same formulas, with one call of fit_trends
+over all series, and reports the largest difference of the slopes and
+p-values between the two. When statsmodels is installed, the batched
+estimates are also checked against sm.WLS and sm.GLM fits of every series
+(the sm_ columns), independently of these formulas:
+    python -m benchmarks.bench_trends
+"""
+import math
+import warnings
+
+import numpy as np
+
+from resources import ohio_birth_analysis
+
+from benchmarks._harness import (AGE_PATH, RACE_PATH, measure_inline,
+                                 print_table)
+
+
+# Dataset and the dimensions identifying every series.
+GRIDS = [('age', ['county']),
+         ('age', ['county', 'age']),
+         ('race', ['county', 'race', 'ethnicity'])
+         ]
+
+# Trend models compared.
+METHODS = ['wls', 'logistic']
+
+# Largest difference from the statsmodels estimates accepted; the logistic
+# fits stop iterating at different tolerances.
+STATSMODELS_TOLERANCE = 1e-4
+
+
+def _wls_series(successes, trials, years):
+    """Slope and p-value of the WLS trend of one series."""
+    from scipy import stats
+
+    observed = trials > 0
+    if observed.sum() < 3 or successes.sum() in (0, trials.sum()):
+        return math.nan, math.nan
+    rates = successes[observed] / trials[observed]
+    design = np.column_stack([np.ones(observed.sum()), years[observed]])
+    root_weights = np.sqrt(trials[observed])
+    coefficients, residual, _, _ = np.linalg.lstsq(
+        design * root_weights[:, None], rates * root_weights, rcond=None)
+
+    dof = observed.sum() - 2
+    covariance = np.linalg.inv(design.T @ (design * trials[observed, None]))
+    se = math.sqrt(residual[0] / dof * covariance[1, 1])
+
+    return coefficients[1], 2 * stats.t.sf(abs(coefficients[1] / se), dof)
+
+
+def _logistic_series(successes, trials, years):
+    """Slope and p-value of the logistic trend of one series."""
+    from scipy import stats
+
+    observed = trials > 0
+    if observed.sum() < 3 or successes.sum() in (0, trials.sum()):
+        return math.nan, math.nan
+    design = np.column_stack([np.ones(len(years)), years])
+    coefficients = np.zeros(2)
+    for _ in range(50):
+        fitted = 1 / (1 + np.exp(-np.clip(design @ coefficients, -30, 30)))
+        information = design.T @ (design
+                                  * (trials * fitted * (1 - fitted))[:, None])
+        step = np.linalg.solve(information, design.T
+                               @ (successes - trials * fitted))
+        coefficients += step
+        if abs(step[1]) < 1e-10:
+            break
+    else:
+        return math.nan, math.nan
+    fitted = 1 / (1 + np.exp(-np.clip(design @ coefficients, -30, 30)))
+    information = design.T @ (design
+                              * (trials * fitted * (1 - fitted))[:, None])
+    se = math.sqrt(np.linalg.inv(information)[1, 1])
+
+    return coefficients[1], 2 * stats.norm.sf(abs(coefficients[1] / se))
+
+
+def _statsmodels_available():
+    """Whether statsmodels is installed."""
+    try:
+        import statsmodels.api  # noqa: F401
+    except ImportError:
+        return False
+
+    return True
+
+
+def _statsmodels_series(successes, trials, years, method):
+    """Slope and p-value of the trend of one series fitted by statsmodels:
+    WLS of the rates weighted by births, or a binomial GLM (logit link).
+    """
+    import statsmodels.api as sm
+
+    observed = trials > 0
+    if observed.sum() < 3 or successes.sum() in (0, trials.sum()):
+        return math.nan, math.nan
+    design = sm.add_constant(years[observed])
+    if method == 'wls':
+        fit = sm.WLS(successes[observed] / trials[observed], design,
+                     weights=trials[observed]).fit()
+    else:
+        # Separated series are left unfitted by fit_trends and skipped in
+        # the comparison, so their warnings are noise here.
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            fit = sm.GLM(np.column_stack([successes[observed],
+                                          trials[observed]
+                                          - successes[observed]]),
+                         design, family=sm.families.Binomial()).fit()
+
+    return fit.params[1], fit.pvalues[1]
+
+
+def _max_difference(expected, batched):
+    """Largest absolute difference where both are defined."""
+    return float(np.nanmax(np.abs(expected - batched)))
+
+
+def _loop_trends(successes, trials, years, method, statsmodels=False):
+    """Slopes and p-values fitted one series at a time, by the NumPy
+    formulas or, with statsmodels, by statsmodels.
+    """
+    centered = years - years.mean()
+    if statsmodels:
+        return np.array([_statsmodels_series(x, n, centered, method)
+                         for x, n in zip(successes, trials)]).T
+
+    fit = _wls_series if method == 'wls' else _logistic_series
+    return np.array([fit(x, n, centered)
+                     for x, n in zip(successes, trials)]).T
+
+
+def main():
+    """Run the trend microbenchmark and print a results table."""
+    frames = {'age': ohio_birth_analysis.age_data_cleaning(AGE_PATH),
+              'race': ohio_birth_analysis.race_data_cleaning(RACE_PATH)}
+    statsmodels = _statsmodels_available()
+
+    rows = []
+    for dataset, by in GRIDS:
+        marginal = ohio_birth_analysis.aggregate(
+            frames[dataset], by + ['year', 'weight_indicator'])
+        successes = marginal.low.unstack('year', fill_value=0)
+        years = successes.columns.to_numpy(dtype='float64')
+        successes = successes.to_numpy(dtype='float64')
+        trials = marginal.sum(axis=1).unstack('year', fill_value=0) \
+            .to_numpy(dtype='float64')
+
+        for method in METHODS:
+            # The first fit imports SciPy, which is not timed.
+            _loop_trends(successes[:1], trials[:1], years, method)
+            loop_s = measure_inline(_loop_trends, successes, trials, years,
+                                    method, repeat=1)
+            batched_s = measure_inline(ohio_birth_analysis.fit_trends,
+                                       successes, trials, years, method,
+                                       repeat=10)
+
+            loop = _loop_trends(successes, trials, years, method)
+            batched = ohio_birth_analysis.fit_trends(successes, trials,
+                                                     years, method)
+            row = {'series': ' x '.join(by), 'method': method,
+                   'fitted': int(np.isfinite(batched['slope']).sum()),
+                   'loop_s': loop_s, 'batched_s': batched_s,
+                   'speedup': loop_s / batched_s,
+                   'slope_diff': _max_difference(loop[0], batched['slope']),
+                   'p_diff': _max_difference(loop[1], batched['p_value'])
+                   }
+            if statsmodels:
+                reference = _loop_trends(successes, trials, years, method,
+                                         statsmodels=True)
+                row['sm_slope_diff'] = _max_difference(reference[0],
+                                                       batched['slope'])
+                row['sm_p_diff'] = _max_difference(reference[1],
+                                                   batched['p_value'])
+            rows.append(row)
+
+    columns = ['series', 'method', 'fitted', 'loop_s', 'batched_s',
+               'speedup', 'slope_diff', 'p_diff']
+    if statsmodels:
+        columns += ['sm_slope_diff', 'sm_p_diff']
+    else:
+        print('statsmodels is not installed; the batched fits are compared '
+              'with the NumPy loop only.\n')
+    print_table(rows, columns)
+
+    if statsmodels and max(max(row['sm_slope_diff'], row['sm_p_diff'])
+                           for row in rows) > STATSMODELS_TOLERANCE:
+        raise AssertionError('fit_trends disagrees with statsmodels.')
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,10 @@ The contents of this module define functions and classes for data cleaning
 and visualization of Ohio Health Department data on low birth weights in
 Ohio from 2006-2017.
 
+Cleaning and aggregation are implemented in ohio_birth_data and re-exported
+here. Matplotlib and Plotly are only imported when a plot function is first
+called, so importing this module for data work needs just pandas/ NumPy.
+
 Explore this repository at:
     https://github.com/chance-alvarado/exploring-ohio-birth-weights
 
@@ -13,10 +17,23 @@ Author:
         LinkedIn: https://www.linkedin.com/in/chance-alvarado/
         GitHub: https://github.com/chance-alvarado/
 """
-import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
-import plotly.figure_factory as ff
+
+from resources.ohio_birth_data import (  # noqa: F401
+    CLEANING_VERSION, AggregationCache, BirthAggregator, BirthCube, _Lists,
+    _birth_marginal, age_cube, age_data_cleaning, age_pivot_table,
+    aggregate, aggregation_stats, birth_weight_rates, category_time_series,
+    clear_aggregation_cache, county_data_cleaning, race_cube,
+    race_data_cleaning, race_pivot_table
+    )
+from resources.ohio_birth_stats import (  # noqa: F401
+    adjust_p_values, beta_binomial_smoothing, binomial_interval,
+    low_rate_intervals, rate_intervals, risk_tests, smoothed_low_rates
+    )
+from resources.ohio_birth_trace import traced
+from resources.ohio_birth_trends import (  # noqa: F401
+    fit_trends, low_rate_trends
+    )
 
 
 class _Themes():
@@ -28,6 +45,9 @@ class _Themes():
     low_color = '#2A037D'
     color_list = [low_color, normal_color]
 
+    hot_spot_color = '#ef331a'
+    cold_spot_color = '#14ee11'
+
     low_colorscale = ['#B3E9FF', '#A5D2F2', '#97BBE5',
                       '#89A4D8', '#7C8DCB', '#6E76BE',
                       '#605FB2', '#5348A4', '#453197',
@@ -39,158 +59,29 @@ class _Themes():
                        ]
 
 
-class _Lists():
-    """Relevant lists necessary for plot creation."""
-
-    # List of all years from 2006-2017.
-    all_years = list(range(2006, 2018))
-
-    # List of all age ranges represented in data.
-    all_ages = ['Less than 15', '15 to 17', '18 to 19', '20 to 24',
-                '25 to 29', '30 to 34', '35 to 39', '40 to 44',
-                '45 and older', 'Unknown']
-
-    # List of all races represented in data.
-    all_races = ['White', 'African American', 'Asian', 'Native American',
-                 'Pacific Islander', 'Unknown'
-                 ]
-
-
-def age_data_cleaning(age_path):
-    """Clean and relabel birth data based on mother's age."""
-    # Read in CSV.
-    age_df = pd.read_csv(age_path, na_values='*', engine='python')
-
-    # Fill na values with 0.
-    age_df.fillna(value=0, inplace=True)
-
-    # Drop default sort column.
-    age_df.drop(labels='sort', axis=1, inplace=True)
-
-    # Rename columns for ease of access.
-    age_df.rename(columns={'age group desc': 'age',
-                           'birth count': 'birth_count',
-                           'birth count_pct': 'birth_percentage',
-                           'county name': 'county',
-                           'low birth weight ind desc': 'weight_indicator',
-                           'year desc': 'year'
-                           },
-                  inplace=True
-                  )
-
-    # Rename specific values for ease of access.
-    age_df.replace(to_replace=['2017 **', 'Low birth weight (<2500g)',
-                               'Normal birth weight (2500g+)'
-                               ],
-                   value=[2017, 'low', 'normal'],
-                   inplace=True
-                   )
-
-    # Clear irrelevant rows.
-    age_df = age_df[age_df.weight_indicator != 'Total']
-    age_df = age_df[age_df.year != 'Total']
-    age_df = age_df[age_df.county != 'Unknown']
-    age_df = age_df[age_df.county != 'NonOH']
-
-    # Convert years to numbers for ease of access.
-    age_df.year = pd.to_numeric(age_df.year)
-
-    return age_df
-
-
-def race_data_cleaning(race_ethnicity_path):
-    """Clean and relabel birth data based on race/ ethnicity."""
-    # Read in CSV.
-    race_df = pd.read_csv(race_ethnicity_path, na_values='*', engine='python')
-
-    # Fill na values with 0.
-    race_df.fillna(value=0, inplace=True)
-
-    # Drop default sort column.
-    race_df.drop(labels='sort', axis=1, inplace=True)
-
-    # Rename columns for ease of access.
-    race_df.rename(columns={'birth count': 'birth_count',
-                            'birth count_pct': 'birth_percentage',
-                            'county name': 'county',
-                            'ethnicity desc': 'ethnicity',
-                            'low birth weight ind desc': 'weight_indicator',
-                            'race catg desc': 'race',
-                            'year desc': 'year'
-                            },
-                   inplace=True
-                   )
+def _draw_intervals(ax, bounds, positions=None, horizontal=False):
+    """Error bars of low rate intervals at the ends of plotted rates.
 
-    # Rename specific values for ease of access.
-    race_df.replace(to_replace=['2017 **',
-                                'Low birth weight (<2500g)',
-                                'Normal birth weight (2500g+)',
-                                'African American  (Black)',
-                                'Pacific Islander/Hawaiian',
-                                'Unknown/Not Reported'
-                                ],
-                    value=[2017, 'low', 'normal',
-                           'African American', 'Pacific Islander',
-                           'Unknown'
-                           ],
-                    inplace=True
-                    )
+    positions defaults to the bar positions of a pandas bar plot.
+    """
+    if positions is None:
+        positions = np.arange(len(bounds))
+    errors = [bounds.rate - bounds.lower, bounds.upper - bounds.rate]
+    error_key = 'xerr' if horizontal else 'yerr'
+    point = (bounds.rate, positions) if horizontal \
+        else (positions, bounds.rate)
 
-    # Clear irrelevant rows.
-    race_df = race_df[race_df.weight_indicator != 'Total']
-    race_df = race_df[race_df.year != 'Total']
-
-    # Convert years to numbers for ease of access.
-    race_df.year = pd.to_numeric(race_df.year)
-
-    return race_df
+    ax.errorbar(*point, fmt='none', ecolor='k', elinewidth=1, capsize=3,
+                **{error_key: errors})
 
 
-def county_data_cleaning(county_path):
-    """Clean and relabel county data."""
-    county_df = pd.read_csv(county_path, index_col='county')
-
-    return county_df
-
-
-def age_pivot_table(age_df):
-    """Construct example pivot table for mother's age data."""
-    # Group by heiarchical sorting.
-    age_pivot_ser = age_df.groupby(by=['year', 'county', 'age',
-                                       'weight_indicator'
-                                       ]
-                                   ).birth_count.sum()
-
-    # Unstack Series to create DataFrame.
-    age_pivot_df = age_pivot_ser.unstack()
-
-    return age_pivot_df
-
-
-def race_pivot_table(race_df):
-    """Construct example pivot table for race/ ethnicity data."""
-    # Group by heiarchical sorting.
-    race_pivot_ser = race_df.groupby(by=['year', 'county', 'race',
-                                         'ethnicity', 'weight_indicator'
-                                         ]
-                                     ).birth_count.sum()
-
-    # Unstack Series to create DataFrame.
-    race_pivot_df = race_pivot_ser.unstack()
-
-    return race_pivot_df
-
-    # Unstack Series to create DataFrame.
-    race_pivot_df = race_pivot_ser.unstack()
-
-    return race_pivot_df
-
-
-def total_age_bar(age_df):
+@traced
+def total_age_bar(age_df, show=True):
     """Bar graph of birth weights per age range relative to total births."""
+    import matplotlib.pyplot as plt
+
     # Group births by age.
-    age_ser = age_df.groupby(by=['age', 'weight_indicator']).birth_count.sum()
-    age_sort_df = age_ser.unstack()
+    age_sort_df = aggregate(age_df, ['age', 'weight_indicator'])
 
     # Reindex for readability.
     age_sort_df = age_sort_df.reindex(_Lists.all_ages)
@@ -208,24 +99,28 @@ def total_age_bar(age_df):
     ax.set_xlabel('Age of Mother', fontsize=12)
     ax.set_ylabel('Births (in 100,000s)', fontsize=12)
 
-    # Show plot.
+    # Show plot, or return the figure for rendering.
+    if not show:
+        return ax.figure
     plt.show()
 
 
-def relative_age_bar(age_df):
-    """Bar graph of birth weights relative to total births per age range."""
-    # Group births by age.
-    age_ser = age_df.groupby(by=['age', 'weight_indicator']).birth_count.sum()
-    age_sort_df = age_ser.unstack()
+@traced
+def relative_age_bar(age_df, show=True, intervals=None):
+    """Bar graph of birth weights relative to total births per age range.
+
+    With intervals ('wilson' or 'clopper-pearson'), the low birth weight
+    fractions get 95% confidence intervals as error bars.
+    """
+    import matplotlib.pyplot as plt
+
+    # Group births by age, relative to total births in that category.
+    age_sort_df = aggregate(age_df, ['age', 'weight_indicator'],
+                            normalize=True)
 
     # Reindex for readability.
     age_sort_df = age_sort_df.reindex(_Lists.all_ages)
 
-    # Reformat so numbers are relative to total births in that category.
-    total_births = (age_sort_df.low + age_sort_df.normal)
-    age_sort_df.low = age_sort_df.low / total_births
-    age_sort_df.normal = age_sort_df.normal / total_births
-
     # Plot creation.
     ax = age_sort_df.plot.bar(stacked=True,
                               title='Birth Weight Relative to Age of Mother',
@@ -240,16 +135,24 @@ def relative_age_bar(age_df):
     ax.set_xlabel('Age of Mother', fontsize=12)
     ax.set_ylabel('Fraction of Total Births in Age Range', fontsize=12)
 
-    # Show plot.
+    if intervals:
+        _draw_intervals(ax, low_rate_intervals(age_df, ['age'],
+                                               method=intervals)
+                        .reindex(_Lists.all_ages))
+
+    # Show plot, or return the figure for rendering.
+    if not show:
+        return ax.figure
     plt.show()
 
 
-def total_race_bar(race_df):
+@traced
+def total_race_bar(race_df, show=True):
     """Bar graph of birth weights per race relative to total births."""
+    import matplotlib.pyplot as plt
+
     # Group births by race.
-    race_ser = race_df.groupby(by=['race', 'weight_indicator']
-                               ).birth_count.sum()
-    race_sort_df = race_ser.unstack()
+    race_sort_df = aggregate(race_df, ['race', 'weight_indicator'])
 
     # Reindex for readability.
     race_sort_df = race_sort_df.reindex(_Lists.all_races[::-1])
@@ -267,27 +170,30 @@ def total_race_bar(race_df):
     ax.set_ylabel('Race', fontsize=12)
     ax.legend(loc='lower right')
 
-    # Show plot.
+    # Show plot, or return the figure for rendering.
+    if not show:
+        return ax.figure
     plt.show()
 
 
-def relative_race_bar(race_df):
-    """Bar graph of birth weights relative to total births per race."""
-    # Group births by race.
-    race_ser = race_df.groupby(by=['race', 'weight_indicator']
-                               ).birth_count.sum()
-    race_sort_df = race_ser.unstack()
+@traced
+def relative_race_bar(race_df, show=True, intervals=None):
+    """Bar graph of birth weights relative to total births per race.
+
+    intervals ('wilson' or 'clopper-pearson') adds error bars of 95%
+    confidence intervals to the low birth weight fractions.
+    """
+    import matplotlib.pyplot as plt
+
+    # Group births by race, relative to total births in that category.
+    race_sort_df = aggregate(race_df, ['race', 'weight_indicator'],
+                             normalize=True)
 
     # Reindex for readability.
     all_races_2 = _Lists.all_races.copy()
     all_races_2.append(all_races_2.pop(-2))
     race_sort_df = race_sort_df.reindex(all_races_2[::-1])
 
-    # Reformat so numbers are relative to total births in that category.
-    total_births = race_sort_df.low + race_sort_df.normal
-    race_sort_df.low = race_sort_df.low / total_births
-    race_sort_df.normal = race_sort_df.normal / total_births
-
     # Plot creation.
     ax = race_sort_df.plot.barh(stacked=True,
                                 title='Birth Weight Relative to Race',
@@ -302,22 +208,30 @@ def relative_race_bar(race_df):
     ax.set_ylabel('Race', fontsize=12)
     ax.legend(loc='lower right')
 
-    # Show plot.
+    if intervals:
+        _draw_intervals(ax, low_rate_intervals(race_df, ['race'],
+                                               method=intervals)
+                        .reindex(all_races_2[::-1]), horizontal=True)
+
+    # Show plot, or return the figure for rendering.
+    if not show:
+        return ax.figure
     plt.show()
 
 
-def ethnicity_pie(race_df):
+@traced
+def ethnicity_pie(race_df, show=True):
     """Pie chart of relative number of low birth weights by ethnicity."""
+    import matplotlib.pyplot as plt
+
     # Group births by ethnicity.
-    race_ser = race_df.groupby(by=['ethnicity', 'weight_indicator']
-                               ).birth_count.sum()
-    race_sort_df = race_ser.unstack()
+    race_sort_df = aggregate(race_df, ['ethnicity', 'weight_indicator'])
 
     # Plot creation.
     fig, axs = plt.subplots(nrows=1, ncols=2, figsize=(8, 4))
     fig.suptitle('Percentage of Low Birth Weights per Ethnicity', fontsize=16)
 
-    axs[0].pie(race_sort_df.loc['Hispanic'].tolist(),
+    axs[0].pie(race_sort_df.loc['Hispanic'].to_numpy(),
                colors=_Themes.color_list, explode=(0, 0.25),
                shadow=True, autopct='%1.1f%%', pctdistance=1.25,
                )
@@ -325,7 +239,7 @@ def ethnicity_pie(race_df):
     ttl_0 = axs[0].set_title('Hispanic', fontsize=14)
     ttl_0.set_position([.45, .95])
 
-    axs[1].pie(race_sort_df.loc['Non-Hispanic'].tolist(),
+    axs[1].pie(race_sort_df.loc['Non-Hispanic'].to_numpy(),
                colors=_Themes.color_list, explode=(0, 0.25),
                shadow=True, autopct='%1.1f%%', pctdistance=1.25
                )
@@ -335,65 +249,113 @@ def ethnicity_pie(race_df):
 
     axs[1].legend(['low ', 'normal'], loc=4)
 
-    # Show plot.
+    # Show plot, or return the figure for rendering.
+    if not show:
+        return fig
     plt.show()
 
 
-def county_breakdown_plot(age_df, county_df):
-    """Geographical plot of county average of low birth weights."""
-    # County FIPS codes.
-    county_fips = county_df.FIPS.tolist()
-
-    # Sort birth weights by county.
-    age_sort_df = age_df.groupby(by=['county', 'weight_indicator']
-                                 ).birth_count.sum()
-    age_sort_df = age_sort_df.unstack()
+@traced
+def county_breakdown_plot(age_df, county_df, show=True, intervals=None,
+                          smoothed=False, hot_spots=False):
+    """Geographical plot of county average of low birth weights.
 
-    # Reformat so numbers are relative to total births in that category.
-    total_births = age_sort_df.low + age_sort_df.normal
-    age_sort_df.low = age_sort_df.low / total_births
-    age_sort_df.normal = age_sort_df.normal / total_births
+    With intervals ('wilson' or 'clopper-pearson'), the hover text of each
+    county shows the 95% confidence interval of its percentage. smoothed
+    maps empirical-Bayes rates shrunk toward the statewide rate (see
+    smoothed_low_rates), with the raw percentage in the hover text.
+    hot_spots outlines the significant LISA hot and cold spots of the
+    mapped rates (see ohio_birth_spatial) and gives the global Moran's I.
+    """
+    from resources import ohio_birth_geometry
 
-    # Convert to percent out of 100.
-    percent_low = [val * 100 for val in age_sort_df.low.tolist()]
+    # County FIPS codes.
+    county_fips = county_df.FIPS.to_numpy()
+
+    # Percent of low birth weights by county, in the order of the county
+    # table.
+    age_sort_df = aggregate(age_df, ['county', 'weight_indicator'],
+                            normalize='percent')
+    percent_low = age_sort_df.low.reindex(county_df.index).to_numpy()
+
+    # Confidence intervals and raw rates for the hover text.
+    notes = []
+    if intervals:
+        bounds = low_rate_intervals(age_df, ['county'], method=intervals,
+                                    percent=True).reindex(county_df.index)
+        notes.append(['95% CI: {:.1f}% to {:.1f}%'.format(lower, upper)
+                      for lower, upper in zip(bounds.lower, bounds.upper)])
+    if smoothed:
+        notes.append(['Unsmoothed: {:.1f}%'.format(percent)
+                      for percent in percent_low])
+        percent_low = smoothed_low_rates(age_df, ['county'], percent=True) \
+            .smoothed.reindex(county_df.index).to_numpy()
+
+    # Spatial clusters of the mapped rates, with a fixed seed so that
+    # renders are reproducible.
+    overlays = None
+    if hot_spots:
+        from resources import ohio_birth_spatial
+
+        moran, clusters = ohio_birth_spatial.low_rate_clusters(
+            age_df, county_df, seed=0, rates=percent_low)
+        notes.append(['LISA: {} (p = {:.3f})'.format(cluster, p_sim)
+                      if isinstance(cluster, str) else ''
+                      for cluster, p_sim in zip(clusters.cluster,
+                                                clusters.p_sim)])
+        overlays = [(clusters.FIPS[clusters.cluster == cluster], name,
+                     {'color': color, 'width': 2.5})
+                    for cluster, name, color
+                    in [('High-High', 'Hot spot', _Themes.hot_spot_color),
+                        ('Low-Low', 'Cold spot', _Themes.cold_spot_color)]]
+    hover_notes = ['<br>'.join(note for note in county_notes if note)
+                   for county_notes in zip(*notes)] if notes else None
 
     # Create bins.
     low_bins = list(range(5, 55, 5))
 
-    # Plot creation.
-    fig = ff.create_choropleth(fips=county_fips, values=percent_low,
-                               scope=['OH'], binning_endpoints=low_bins,
-                               colorscale=_Themes.low_colorscale,
-                               legend_title='% of county births', asp=3,
-                               show_hover=True, width=800, height=400,
-                               county_outline={'color': 'rgb(255,255,255)',
-                                               'width': 0.5
-                                               }
-                               )
+    # Plot creation from the cached county geometry.
+    fig = ohio_birth_geometry.county_choropleth(
+        fips=county_fips, values=percent_low, binning_endpoints=low_bins,
+        colorscale=_Themes.low_colorscale,
+        legend_title='% of county births', asp=3, show_hover=True,
+        width=800, height=400,
+        county_outline={'color': 'rgb(255,255,255)', 'width': 0.5},
+        hover_notes=hover_notes, overlays=overlays
+        )
 
     # Plot enhancement.
-    fig.update_layout(title={'text': 'Ohio Low Birth Weights by County',
+    title = 'Ohio Low Birth Weights by County'
+    if smoothed:
+        title += ' (Smoothed)'
+    if hot_spots:
+        title += "<br><sup>Moran's I {:.3f}, p = {:.4f}</sup>".format(
+            moran['I'], moran['p_sim'])
+    fig.update_layout(title={'text': title,
                              'y': .96, 'x': 0.5, 'xanchor': 'center',
                              'yanchor': 'top'
                              }
                       )
     fig.layout.plot_bgcolor = '#FFFFFF'
 
-    # Show plot.
+    # Show plot, or return the figure for rendering.
+    if not show:
+        return fig
     fig.show()
 
 
-def annual_low_births_line(age_df):
-    """Line plot of annual low birth weights."""
-    # Group data by year.
-    age_ser = age_df.groupby(by=['year', 'weight_indicator']
-                             ).birth_count.sum()
-    age_sort_df = age_ser.unstack()
+@traced
+def annual_low_births_line(age_df, show=True, intervals=None):
+    """Line plot of annual low birth weights.
+
+    intervals ('wilson' or 'clopper-pearson') draws 95% confidence
+    intervals of every year's fraction as error bars.
+    """
+    import matplotlib.pyplot as plt
 
-    # Reformat so numbers are relative to total births in that category.
-    total_births = age_sort_df.low + age_sort_df.normal
-    age_sort_df.low = age_sort_df.low / total_births
-    age_sort_df.normal = age_sort_df.normal / total_births
+    # Group data by year, relative to total births in that year.
+    age_sort_df = aggregate(age_df, ['year', 'weight_indicator'],
+                            normalize=True)
 
     # Plot creation.
     ax = age_sort_df.low.plot(title='Percentage of Low Birth Weights per Year',
@@ -403,46 +365,37 @@ def annual_low_births_line(age_df):
     # Plot enhancement.
     ax.title.set_size(14)
     ax.set_yticks([round(val, 2) for val in np.linspace(0.1, 0.18, 9)])
-    ax.set_xticks(_Lists.all_years)
+    ax.set_xticks(age_sort_df.index)
     ax.set_ylabel('Fraction of Annual Births', fontsize=12)
     ax.set_xlabel('Year', fontsize=12)
     ax.grid(color='k', alpha=0.05)
     ax.margins(x=0)
 
-    # Show plot.
+    if intervals:
+        bounds = low_rate_intervals(age_df, ['year'], method=intervals)
+        _draw_intervals(ax, bounds, positions=bounds.index)
+
+    # Show plot, or return the figure for rendering.
+    if not show:
+        return ax.figure
     plt.show()
 
 
-def high_risk_ages_stacked(age_df):
+@traced
+def high_risk_ages_stacked(age_df, show=True):
     """Stacked bar plot of annual change in births for high-risk mothers."""
-    # Group data by year and age range.
-    age_ser = age_df.groupby(by=['year', 'age', 'weight_indicator']
-                             ).birth_count.sum()
-    age_sort_df = age_ser.unstack()
-
-    # Data list construction for plotting.
-    teen_low = []
-    teen_normal = []
-    teen_total = []
-
-    older_low = []
-    older_normal = []
-    older_total = []
-
-    # Populate lists.
-    for year in _Lists.all_years:
-        teen_ser = age_sort_df.loc[year].loc['15 to 17'] \
-                 + age_sort_df.loc[year].loc['Less than 15']
-
-        older_ser = age_sort_df.loc[year].loc['45 and older']
-
-        teen_low.append(teen_ser.low)
-        teen_normal.append(teen_ser.normal)
-        teen_total.append(teen_ser.low + teen_ser.normal)
-
-        older_low.append(older_ser.low)
-        older_normal.append(older_ser.normal)
-        older_total.append(older_ser.low + older_ser.normal)
+    import matplotlib.pyplot as plt
+
+    # Annual births of teen and older mothers.
+    age_series_df = category_time_series(age_df, 'age',
+                                         {'teen': ['15 to 17',
+                                                   'Less than 15'],
+                                          'older': ['45 and older']
+                                          }
+                                         )
+    teen_df = age_series_df['teen']
+    older_df = age_series_df['older']
+    years = age_series_df.index.tolist()
 
     # Plot creation
     fig, axs = plt.subplots(nrows=1, ncols=2, figsize=(12, 4))
@@ -451,11 +404,11 @@ def high_risk_ages_stacked(age_df):
                  )
     fig.subplots_adjust(top=0.85)
 
-    axs[0].stackplot(_Lists.all_years, [teen_low, teen_normal],
+    axs[0].stackplot(years, [teen_df.low, teen_df.normal],
                      colors=_Themes.color_list
                      )
 
-    axs[1].stackplot(_Lists.all_years, [older_low, older_normal],
+    axs[1].stackplot(years, [older_df.low, older_df.normal],
                      colors=_Themes.color_list)
 
     # Plot enhancement.
@@ -464,55 +417,35 @@ def high_risk_ages_stacked(age_df):
     axs[1].legend(['low', 'normal'])
 
     for i in (0, 1):
-        axs[i].set_xticks(_Lists.all_years)
-        axs[i].set_xticklabels(_Lists.all_years, rotation=45)
+        axs[i].set_xticks(years)
+        axs[i].set_xticklabels(years, rotation=45)
         axs[i].set_xlabel('Year', fontsize=12)
         axs[i].set_ylabel('Births', fontsize=12)
         axs[i].grid(color='k', alpha=0.05)
         axs[i].margins(x=0)
 
-    # Show plot.
+    # Show plot, or return the figure for rendering.
+    if not show:
+        return fig
     plt.show()
 
 
-def race_breakdown_plot_stacked(race_df):
+@traced
+def race_breakdown_plot_stacked(race_df, show=True):
     """Stacked bar plot of annual change in race breakdown for all births."""
-    # Group data by year and race.
-    race_ser = race_df.groupby(by=['year', 'race', 'weight_indicator']
-                               ).birth_count.sum()
-    race_sort_df = race_ser.unstack()
-
-    # Create total column for each race.
-    race_sort_df['total'] = race_sort_df.low + race_sort_df.normal
-
-    # Data list construction for plotting.
-    asian_total = []
-    african_american_total = []
-    native_american_total = []
-    pacific_islander_total = []
-    white_total = []
-    unknown_total = []
-
-    # Populate lists.
-    for year in _Lists.all_years:
-        asian_total.append(race_sort_df.loc[year].loc['Asian']['total'])
-        african_american_total.append(race_sort_df.loc[year]
-                                      .loc['African American']['total'])
-        native_american_total.append(race_sort_df.loc[year]
-                                     .loc['Native American']['total'])
-        pacific_islander_total.append(race_sort_df.loc[year]
-                                      .loc['Pacific Islander']['total'])
-        white_total.append(race_sort_df.loc[year]
-                           .loc['White']['total'])
-        unknown_total.append(race_sort_df.loc[year]
-                             .loc['Unknown']['total'])
+    import matplotlib.pyplot as plt
+
+    # Annual births of every race.
+    race_series_df = category_time_series(race_df, 'race', _Lists.all_races)
+
+    # Create total for each race.
+    race_total_df = race_series_df.xs('low', axis=1, level=1) \
+        + race_series_df.xs('normal', axis=1, level=1)
+    years = race_total_df.index.tolist()
 
     # Plot creation.
     fig, ax = plt.subplots(figsize=(10, 4))
-    ax.stackplot(_Lists.all_years, [white_total, african_american_total,
-                                    asian_total, native_american_total,
-                                    pacific_islander_total, unknown_total,
-                                    ],
+    ax.stackplot(years, race_total_df[_Lists.all_races].T,
                  colors=_Themes.race_colorscale,
                  alpha=0.9
                  )
@@ -520,8 +453,8 @@ def race_breakdown_plot_stacked(race_df):
     # Plot enhancement.
     ax.set_title('Change in Race of all Births', fontsize=14)
     ax.set_xlabel('Year', fontsize=12)
-    ax.set_xticks(_Lists.all_years)
-    ax.set_xticklabels(_Lists.all_years, rotation=45)
+    ax.set_xticks(years)
+    ax.set_xticklabels(years, rotation=45)
     ax.ticklabel_format(axis="y", style="sci", scilimits=(0, 0))
     ax.set_ylabel('Births (in 10,000s)', fontsize=12)
     ax.grid(color='k', alpha=0.05)
@@ -529,5 +462,7 @@ def race_breakdown_plot_stacked(race_df):
 
     ax.margins(x=0)
 
-    # Show plot.
+    # Show plot, or return the figure for rendering.
+    if not show:
+        return fig
     plt.show()
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""Arrow-backed handoff of cleaned tables and marginals to the plots.
+
+Marginals held by the aggregation cache and cleaned frames read back from
+the on-disk cache live in Arrow buffers. Consumers get DataFrames and NumPy
+arrays that are read-only views of those buffers instead of copies.
+
+The buffers cannot be written to, so the caches keep one frame over them
+and hand out shallow copies of it: pandas Copy-on-Write (always on from
+pandas 3) then copies a column before the caller first modifies it in
+place. Without Copy-on-Write, the frames handed out are deep copies.
+
+Every handoff between Arrow and NumPy is counted, along with the copies it
+had to make and their size:
+    from resources import ohio_birth_arrow
+
+    ohio_birth_arrow.reset_copy_stats()
+    ohio_birth_analysis.relative_age_bar(age_df, show=False)
+    ohio_birth_arrow.copy_stats()
+
+Requires pyarrow. ohio_birth_data imports this module only when pyarrow
+is installed, and holds its marginals as plain frames otherwise.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from resources.ohio_birth_data import _copy_on_write
+
+
+def _memory(values):
+    """NumPy view of the data of a NumPy or Arrow array."""
+    if isinstance(values, np.ndarray):
+        return values
+
+    # Arrow arrays: the values buffer (the indices of a dictionary array).
+    return np.frombuffer(values.buffers()[1], dtype='uint8')
+
+
+class CopyCounter():
+    """Counts of handoffs between buffers and of the copies they made."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.handoffs = 0
+        self.copies = 0
+        self.bytes_copied = 0
+
+    def record(self, source, result):
+        """Record that source was handed off as result, either being a
+        NumPy or Arrow array, counting a copy when they share no memory.
+        """
+        copied = not np.shares_memory(_memory(source), _memory(result))
+
+        with self.lock:
+            self.handoffs += 1
+            if copied:
+                self.copies += 1
+                self.bytes_copied += result.nbytes
+
+        return result
+
+    def record_shared(self, handoffs):
+        """Record handoffs known to share their source's memory."""
+        with self.lock:
+            self.handoffs += handoffs
+
+    def reset(self):
+        """Zero every counter."""
+        with self.lock:
+            self.handoffs = self.copies = self.bytes_copied = 0
+
+    def stats(self):
+        """Handoff, copy and bytes copied counters."""
+        with self.lock:
+            return {'handoffs': self.handoffs, 'copies': self.copies,
+                    'bytes_copied': self.bytes_copied}
+
+
+# Counter shared by every handoff in the package.
+_copy_counter = CopyCounter()
+
+
+def _column_values(series):
+    """NumPy values of a column: the codes of a categorical."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.array.codes
+
+    return series.to_numpy()
+
+
+def numpy_view(column):
+    """NumPy view of an Arrow column, copied only when it cannot be shared.
+
+    Columns without nulls in a single chunk are returned as read-only
+    views; dictionary columns return their indices.
+    """
+    if isinstance(column, pa.ChunkedArray):
+        column = column.chunk(0) if column.num_chunks == 1 \
+            else column.combine_chunks()
+    if pa.types.is_dictionary(column.type):
+        column = column.indices
+
+    try:
+        values = column.to_numpy(zero_copy_only=True)
+    except pa.ArrowInvalid:
+        values = column.to_numpy(zero_copy_only=False)
+
+    return _copy_counter.record(column, values)
+
+
+class ArrowFrame():
+    """Numeric DataFrame held as Arrow buffers, one array per column.
+
+    The index and column labels are kept as the (immutable) pandas indexes
+    of the original frame, and frame is a DataFrame of views of the
+    buffers, shared by every frame to_pandas hands out.
+    """
+
+    def __init__(self, df):
+        self.index = df.index
+        self.columns = df.columns
+
+        arrays = []
+        for position in range(df.shape[1]):
+            values = df.iloc[:, position].to_numpy()
+            arrays.append(_copy_counter.record(values, pa.array(values)))
+        self.table = pa.table(arrays, names=[str(position) for position
+                                             in range(len(arrays))])
+
+        self.frame = pd.DataFrame({position: numpy_view(column)
+                                   for position, column
+                                   in enumerate(self.table.columns)},
+                                  copy=False)
+        self.frame.index = self.index
+        self.frame.columns = self.columns
+
+    @property
+    def nbytes(self):
+        """Size of the Arrow buffers."""
+        return self.table.nbytes
+
+    def to_pandas(self):
+        """DataFrame sharing the buffers, copied column by column only
+        when it is modified (see share_frame).
+        """
+        return share_frame(self.frame)
+
+
+def share_frame(df):
+    """Frame to hand out from a cache keeping df over read-only buffers.
+
+    Under Copy-on-Write this is a shallow copy, which pandas copies column
+    by column as it is modified. Otherwise in-place writes would fail on
+    the read-only views, so the frame is copied whole.
+    """
+    if _copy_on_write():
+        _copy_counter.record_shared(df.shape[1])
+        return df.copy(deep=False)
+
+    copied = df.copy()
+    for position in range(df.shape[1]):
+        _copy_counter.record(_column_values(df.iloc[:, position]),
+                             _column_values(copied.iloc[:, position]))
+
+    return copied
+
+
+def table_from_frame(df):
+    """Arrow table of a cleaned DataFrame, index included."""
+    table = pa.Table.from_pandas(df)
+    for name in df.columns:
+        _copy_counter.record(_column_values(df[name]),
+                             table.column(name).chunk(0))
+
+    return table
+
+
+def frame_from_table(table):
+    """Cleaned DataFrame of an Arrow table, sharing its column buffers.
+
+    Numeric columns without nulls come back as read-only views of the
+    table. Keep the frame and hand out share_frame(df).
+    """
+    df = table.to_pandas(split_blocks=True)
+    for name in df.columns:
+        _copy_counter.record(table.column(name).chunk(0),
+                             _column_values(df[name]))
+
+    return df
+
+
+def copy_stats():
+    """Counters of the shared copy counter."""
+    return _copy_counter.stats()
+
+
+def reset_copy_stats():
+    """Zero the shared copy counter."""
+    _copy_counter.reset()
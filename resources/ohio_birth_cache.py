@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""Columnar on-disk cache of cleaned Ohio birth weight data.
+
+Cleaned DataFrames are persisted as Arrow IPC files keyed by a checksum of
+the source CSV and the version of the cleaning code, and are read back
+memory-mapped on subsequent runs. Frames read in this process are kept,
+their numeric columns views of the mapped buffers, and handed out as
+copy-on-write shallow copies (see ohio_birth_arrow.share_frame). Editing
+a CSV changes its checksum, so stale entries are never served and are
+removed when the file is re-cleaned with the same keyword arguments.
+
+Requires pyarrow.
+
+Usage:
+    from resources import ohio_birth_data, ohio_birth_cache
+
+    age_df = ohio_birth_cache.cached_cleaning(
+        ohio_birth_data.age_data_cleaning, age_path)
+"""
+import hashlib
+import inspect
+import os
+
+import pandas as pd
+import pyarrow as pa
+
+from resources import ohio_birth_arrow, ohio_birth_data
+
+
+# Default location of cache files.
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 '.cache'
+                                 )
+
+
+def _file_checksum(path):
+    """BLAKE2 checksum of a file's contents."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(2 ** 20), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def _kwargs_digest(kwargs):
+    """Digest of cleaning keyword arguments, hashing the contents of
+    DataFrame and Series arguments rather than their (truncated) repr.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for name, value in sorted(kwargs.items()):
+        digest.update(name.encode('utf-8'))
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            columns = value.columns if isinstance(value, pd.DataFrame) \
+                else [value.name]
+            digest.update(repr((list(columns), value.index.name))
+                          .encode('utf-8'))
+            digest.update(pd.util.hash_pandas_object(value).to_numpy()
+                          .tobytes())
+        else:
+            digest.update(repr(value).encode('utf-8'))
+
+    return digest.hexdigest()
+
+
+def _code_version(cleaning):
+    """Identifier of the cleaning code that produced an entry."""
+    # Digest the whole defining module, cleaning helpers included.
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(inspect.getsource(inspect.getmodule(cleaning))
+                  .encode('utf-8'))
+
+    return 'v{}-{}'.format(ohio_birth_data.CLEANING_VERSION,
+                           digest.hexdigest()
+                           )
+
+
+class CleanedFrameCache():
+    """Arrow IPC cache of cleaned DataFrames with hit/miss counters."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.frames = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_prefix(self, cleaning, path, kwargs):
+        """File name prefix shared by all entries for one source file
+        cleaned with the same keyword arguments.
+        """
+        source_name = os.path.splitext(os.path.basename(path))[0]
+
+        return '{}-{}-{}-'.format(cleaning.__name__, source_name,
+                                  _kwargs_digest(kwargs))
+
+    def _entry_path(self, cleaning, path, kwargs):
+        """Location of the entry for the current file and code version."""
+        key = hashlib.blake2b(digest_size=16)
+        key.update(_file_checksum(path).encode('utf-8'))
+        key.update(_code_version(cleaning).encode('utf-8'))
+
+        return os.path.join(self.cache_dir,
+                            self._entry_prefix(cleaning, path, kwargs)
+                            + key.hexdigest() + '.arrow'
+                            )
+
+    def _write(self, df, entry_path):
+        """Atomically write a DataFrame as an Arrow IPC file."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        table = ohio_birth_arrow.table_from_frame(df)
+
+        # Write beside the entry, then move into place.
+        temp_path = entry_path + '.tmp'
+        with pa.OSFile(temp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(temp_path, entry_path)
+
+    def _remove_stale(self, cleaning, path, kwargs, entry_path):
+        """Delete entries for the same source and keyword arguments built
+        from other contents or code versions. Entries cleaned with other
+        keyword arguments are kept.
+        """
+        prefix = self._entry_prefix(cleaning, path, kwargs)
+        for name in os.listdir(self.cache_dir):
+            stale_path = os.path.join(self.cache_dir, name)
+            if name.startswith(prefix) and stale_path != entry_path:
+                os.remove(stale_path)
+                self.frames.pop(stale_path, None)
+
+    def load(self, cleaning, path, **kwargs):
+        """Return cleaning(path, **kwargs), reusing a cached result.
+
+        Only whole frames are cached: a chunksize, which makes the cleaning
+        functions return an iterator of chunks, raises ValueError.
+        """
+        if kwargs.get('chunksize') is not None:
+            raise ValueError('The cleaned frame cache stores whole frames; '
+                             'call {} directly to read in chunks.'
+                             .format(cleaning.__name__))
+        entry_path = self._entry_path(cleaning, path, kwargs)
+
+        # Serve hits straight from the memory-mapped file; the mapping lives
+        # on as long as the frame's buffers do.
+        if entry_path not in self.frames and os.path.exists(entry_path):
+            with pa.memory_map(entry_path) as source:
+                self.frames[entry_path] = ohio_birth_arrow.frame_from_table(
+                    pa.ipc.open_file(source).read_all())
+        if entry_path in self.frames:
+            self.hits += 1
+            return ohio_birth_arrow.share_frame(self.frames[entry_path])
+
+        # Clean, persist, and drop entries for earlier versions of the file.
+        self.misses += 1
+        df = cleaning(path, **kwargs)
+        self._write(df, entry_path)
+        self._remove_stale(cleaning, path, kwargs, entry_path)
+
+        return df
+
+    def purge(self):
+        """Delete every cache entry, returning the number removed."""
+        self.frames.clear()
+        if not os.path.isdir(self.cache_dir):
+            return 0
+
+        removed = 0
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(('.arrow', '.arrow.tmp')):
+                os.remove(os.path.join(self.cache_dir, name))
+                removed += 1
+
+        return removed
+
+    def stats(self):
+        """Hit/miss counters and number of entries on disk."""
+        entries = 0
+        if os.path.isdir(self.cache_dir):
+            entries = sum(name.endswith('.arrow')
+                          for name in os.listdir(self.cache_dir))
+
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
+
+
+# Cache shared by the module-level helpers.
+_default_cache = CleanedFrameCache()
+
+
+def cached_cleaning(cleaning, path, **kwargs):
+    """Cleaned DataFrame for path, served from the default cache."""
+    return _default_cache.load(cleaning, path, **kwargs)
+
+
+def purge_cache():
+    """Delete every entry in the default cache."""
+    return _default_cache.purge()
+
+
+def cache_stats():
+    """Hit/miss counters of the default cache."""
+    return _default_cache.stats()
@@ -0,0 +1,941 @@
+# -*- coding: utf-8 -*-
+"""Data cleaning and aggregation for analysis on Ohio birth weights.
+
+The contents of this module read, clean and aggregate Ohio Health
+Department data on low birth weights in Ohio from 2006-2017. It depends on
+pandas and NumPy only, so data jobs can import it without any plotting
+libraries. When pyarrow is installed, the memoized marginals are held as
+Arrow buffers (see ohio_birth_arrow) and shared with the callers instead
+of copied. The plot functions live in ohio_birth_analysis.
+
+Explore this repository at:
+    https://github.com/chance-alvarado/exploring-ohio-birth-weights
+
+Author:
+    Chance Alvarado
+        LinkedIn: https://www.linkedin.com/in/chance-alvarado/
+        GitHub: https://github.com/chance-alvarado/
+"""
+import collections
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from resources.ohio_birth_trace import span, traced
+
+
+# Version of the cleaned output. Bump whenever the cleaning functions change
+# what they return so that on-disk caches of cleaned frames are rebuilt.
+CLEANING_VERSION = 2
+
+# Data files shipped with the repository.
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+AGE_PATH = os.path.join(DATA_DIR, 'ohio_department_of_health__'
+                        '0e4c79bc-1ac0-4c88-a85f-425400be5d0d.csv')
+RACE_PATH = os.path.join(DATA_DIR, 'ohio_department_of_health__'
+                         'e870fd77-dee8-4109-b62d-054843fa3bd5.csv')
+COUNTY_PATH = os.path.join(DATA_DIR, 'ohio_county_data.csv')
+
+
+class _Lists():
+    """Relevant lists necessary for plot creation."""
+
+    # List of all years from 2006-2017.
+    all_years = list(range(2006, 2018))
+
+    # List of all age ranges represented in data.
+    all_ages = ['Less than 15', '15 to 17', '18 to 19', '20 to 24',
+                '25 to 29', '30 to 34', '35 to 39', '40 to 44',
+                '45 and older', 'Unknown']
+
+    # List of all races represented in data.
+    all_races = ['White', 'African American', 'Asian', 'Native American',
+                 'Pacific Islander', 'Unknown'
+                 ]
+
+    # List of all ethnicities represented in data.
+    all_ethnicities = ['Hispanic', 'Non-Hispanic', 'Unknown']
+
+    # List of both birth weight classes.
+    all_weights = ['low', 'normal']
+
+
+# String dimensions of the cleaned frames, stored as ordered categoricals.
+DIMENSIONS = ['county', 'age', 'race', 'ethnicity', 'weight_indicator']
+
+
+class _Schemas():
+    """Column dtypes for the typed parse of Department of Health CSVs."""
+
+    # Mother's age data. Years stay categorical until the provisional
+    # ('2017 **') and 'Total' labels have been dealt with.
+    age = {'age group desc': 'category',
+           'birth count': 'Int32',
+           'birth count_pct': 'float64',
+           'county name': 'category',
+           'low birth weight ind desc': 'category',
+           'year desc': 'category'
+           }
+
+    # Race/ ethnicity data.
+    race = {'birth count': 'Int32',
+            'birth count_pct': 'float64',
+            'county name': 'category',
+            'ethnicity desc': 'category',
+            'low birth weight ind desc': 'category',
+            'race catg desc': 'category',
+            'year desc': 'category'
+            }
+
+
+def _read_birth_csv(path, schema, engine, chunksize=None):
+    """Read a Department of Health CSV with the requested parser engine.
+
+    With chunksize, returns an iterator of DataFrames of that many rows.
+    """
+    with span('read_csv', engine=engine) as read_span:
+        # The python engine keeps the original untyped parse.
+        if engine == 'python':
+            raw_df = pd.read_csv(path, na_values='*', engine='python',
+                                 chunksize=chunksize)
+
+        # Compiled engines parse straight into the typed schema, skipping
+        # sort.
+        else:
+            raw_df = pd.read_csv(path, na_values='*', engine=engine,
+                                 usecols=list(schema), dtype=schema,
+                                 chunksize=chunksize
+                                 )
+        read_span.set(rows_out=raw_df)
+
+    return raw_df
+
+
+def _clean_chunks(reader, clean, county_df=None):
+    """Clean each raw chunk of a reader as it is parsed."""
+    with reader:
+        while True:
+            with span('read_csv_chunk') as read_span:
+                raw_df = next(reader, None)
+                read_span.set(rows_out=raw_df)
+            if raw_df is None:
+                return
+
+            yield clean(raw_df, county_df)
+
+
+def _categorize(df):
+    """Make the string columns of an untyped parse categorical in place.
+
+    The python engine parses labels as strings, which relabeling, filtering
+    and finalizing would each scan in full. As categoricals, like the typed
+    parse returns them, those steps work on a few categories and codes.
+    """
+    with span('categorize', rows_in=df):
+        for column in df.columns:
+            if pd.api.types.is_string_dtype(df[column].dtype):
+                df[column] = df[column].astype('category')
+
+
+def _replace_values(df, column_values):
+    """Relabel values in place, only in the columns they occur in.
+
+    column_values maps each column to a {old: new} dictionary. Typed
+    (categorical) columns are relabeled by renaming their few categories.
+    """
+    for column, values in column_values.items():
+        with span('replace', rows_in=df, column=column):
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                categories = df[column].cat.categories
+                if categories.isin(list(values)).any():
+                    df[column] = df[column].cat.rename_categories(
+                        [values.get(label, label) for label in categories]
+                        )
+            else:
+                df.replace({column: values}, inplace=True)
+
+
+def _keep_mask(df, column_exclusions):
+    """Single boolean mask of rows holding none of the excluded values."""
+    keep = np.ones(len(df), dtype=bool)
+    for column, labels in column_exclusions.items():
+        keep &= ~df[column].isin(labels).to_numpy()
+
+    return keep
+
+
+def _numeric_years(year):
+    """Year labels as numbers, converting each distinct label once.
+
+    Provisional years, marked with a trailing ' **' (e.g. '2017 **' in the
+    shipped files), count as their year.
+    """
+    if not isinstance(year.dtype, pd.CategoricalDtype):
+        year = year.astype('category')
+
+    year = year.cat.remove_unused_categories()
+    numbers = pd.to_numeric(pd.Index(
+        [label.removesuffix(' **') if isinstance(label, str) else label
+         for label in year.cat.categories], dtype=object))
+
+    return pd.Series(numbers.to_numpy()[year.cat.codes.to_numpy()],
+                     index=year.index, name=year.name)
+
+
+def _dimension_dtype(column, vocabulary):
+    """Ordered categorical dtype of a dimension column.
+
+    Categories are the vocabulary, in order, followed by any other labels
+    present in the column, sorted.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        present = column.cat.remove_unused_categories().cat.categories
+    else:
+        present = pd.Index(column.unique())
+    unseen = present.difference(vocabulary)
+
+    return pd.CategoricalDtype(list(vocabulary) + sorted(unseen),
+                               ordered=True)
+
+
+def _finalize_dtypes(df, county_df=None):
+    """Give every dimension an ordered categorical dtype and counts floats.
+
+    Categories come from _Lists and the county table, when given, so
+    dimensions sort in their natural order and reindexing by the lists in
+    _Lists never reorders data.
+    """
+    with span('finalize_dtypes', rows_in=df):
+        vocabularies = _vocabularies(county_df)
+        for column in df.columns:
+            dtype = df[column].dtype
+            if column in DIMENSIONS:
+                df[column] = df[column].astype(_dimension_dtype(
+                    df[column], vocabularies.get(column, [])))
+            elif isinstance(dtype, pd.api.extensions.ExtensionDtype) \
+                    and pd.api.types.is_integer_dtype(dtype):
+                df[column] = df[column].astype('float64')
+
+    return df
+
+
+def _clean_age_frame(age_df, county_df=None):
+    """Clean a raw mother's age DataFrame as parsed from CSV."""
+    # Fill na values with 0.
+    with span('fillna', rows_in=age_df):
+        age_df.fillna(value=0, inplace=True)
+
+    # Drop default sort column if it was parsed.
+    age_df.drop(labels='sort', axis=1, inplace=True, errors='ignore')
+
+    # Rename columns for ease of access.
+    age_df.rename(columns={'age group desc': 'age',
+                           'birth count': 'birth_count',
+                           'birth count_pct': 'birth_percentage',
+                           'county name': 'county',
+                           'low birth weight ind desc': 'weight_indicator',
+                           'year desc': 'year'
+                           },
+                  inplace=True
+                  )
+
+    # Relabel categories rather than strings, as the typed parse does.
+    _categorize(age_df)
+
+    # Rename specific values for ease of access.
+    _replace_values(age_df,
+                    {'weight_indicator': {
+                         'Low birth weight (<2500g)': 'low',
+                         'Normal birth weight (2500g+)': 'normal'
+                         }
+                     }
+                    )
+
+    # Clear irrelevant rows in a single pass.
+    with span('filter', rows_in=age_df) as filter_span:
+        age_df = age_df[_keep_mask(age_df, {'weight_indicator': ['Total'],
+                                            'year': ['Total'],
+                                            'county': ['Unknown', 'NonOH']
+                                            }
+                                   )]
+        filter_span.set(rows_out=age_df)
+
+    # Convert years, provisional ones included, to numbers.
+    with span('to_numeric', rows_in=age_df):
+        age_df.year = _numeric_years(age_df.year)
+
+    return _finalize_dtypes(age_df, county_df)
+
+
+def _clean_race_frame(race_df, county_df=None):
+    """Clean a raw race/ ethnicity DataFrame as parsed from CSV."""
+    # Fill na values with 0.
+    with span('fillna', rows_in=race_df):
+        race_df.fillna(value=0, inplace=True)
+
+    # Drop default sort column if it was parsed.
+    race_df.drop(labels='sort', axis=1, inplace=True, errors='ignore')
+
+    # Rename columns for ease of access.
+    race_df.rename(columns={'birth count': 'birth_count',
+                            'birth count_pct': 'birth_percentage',
+                            'county name': 'county',
+                            'ethnicity desc': 'ethnicity',
+                            'low birth weight ind desc': 'weight_indicator',
+                            'race catg desc': 'race',
+                            'year desc': 'year'
+                            },
+                   inplace=True
+                   )
+
+    # Relabel categories rather than strings, as the typed parse does.
+    _categorize(race_df)
+
+    # Rename specific values for ease of access.
+    _replace_values(race_df,
+                    {'weight_indicator': {
+                         'Low birth weight (<2500g)': 'low',
+                         'Normal birth weight (2500g+)': 'normal'
+                         },
+                     'race': {
+                         'African American  (Black)': 'African American',
+                         'Pacific Islander/Hawaiian': 'Pacific Islander',
+                         'Unknown/Not Reported': 'Unknown'
+                         }
+                     }
+                    )
+
+    # Clear irrelevant rows in a single pass.
+    with span('filter', rows_in=race_df) as filter_span:
+        race_df = race_df[_keep_mask(race_df, {'weight_indicator': ['Total'],
+                                               'year': ['Total']
+                                               }
+                                     )]
+        filter_span.set(rows_out=race_df)
+
+    # Convert years, provisional ones included, to numbers.
+    with span('to_numeric', rows_in=race_df):
+        race_df.year = _numeric_years(race_df.year)
+
+    return _finalize_dtypes(race_df, county_df)
+
+
+@traced
+def age_data_cleaning(age_path, engine='c', chunksize=None, county_df=None):
+    """Clean and relabel birth data based on mother's age.
+
+    The compiled parsers ('c' or 'pyarrow') read with the typed schema in
+    _Schemas, engine='python' keeps the original untyped parse. Both return
+    the same cleaned DataFrame.
+
+    County, age and weight indicator are ordered categoricals, with the
+    categories of _Lists and of county_df (when given, otherwise the
+    counties found, sorted).
+
+    With chunksize (not supported by the pyarrow engine), the file is read
+    and cleaned in chunks of that many rows and an iterator of cleaned
+    chunks is returned instead, for files too large to hold in memory. Pass
+    it to age_cube to aggregate it chunk by chunk.
+    """
+    # Read in CSV.
+    age_df = _read_birth_csv(age_path, _Schemas.age, engine, chunksize)
+
+    if chunksize is not None:
+        return _clean_chunks(age_df, _clean_age_frame, county_df)
+
+    return _clean_age_frame(age_df, county_df)
+
+
+@traced
+def race_data_cleaning(race_ethnicity_path, engine='c', chunksize=None,
+                       county_df=None):
+    """Clean and relabel birth data based on race/ ethnicity.
+
+    Accepts the same parser engines, chunksize and county_df as
+    age_data_cleaning. County, race, ethnicity and weight indicator are
+    ordered categoricals.
+    """
+    # Read in CSV.
+    race_df = _read_birth_csv(race_ethnicity_path, _Schemas.race, engine,
+                              chunksize)
+
+    if chunksize is not None:
+        return _clean_chunks(race_df, _clean_race_frame, county_df)
+
+    return _clean_race_frame(race_df, county_df)
+
+
+@traced
+def county_data_cleaning(county_path):
+    """Clean and relabel county data."""
+    county_df = pd.read_csv(county_path, index_col='county')
+
+    return county_df
+
+
+@traced
+def age_pivot_table(age_df):
+    """Construct example pivot table for mother's age data.
+
+    Every combination of year, county and age range is a row, with zero
+    births where the data has none.
+    """
+    return _birth_marginal(age_df, ['year', 'county', 'age',
+                                    'weight_indicator'])
+
+
+@traced
+def race_pivot_table(race_df):
+    """Construct example pivot table for race/ ethnicity data.
+
+    Every combination of year, county, race and ethnicity is a row, as in
+    age_pivot_table.
+    """
+    return _birth_marginal(race_df, ['year', 'county', 'race', 'ethnicity',
+                                     'weight_indicator'])
+
+
+class BirthCube():
+    """Dense array of birth counts over every combination of dimensions.
+
+    Built once from a cleaned DataFrame by BirthAggregator, a cube answers
+    any marginal that the plot functions need by summing array axes instead
+    of re-running groupby on the full frame. Every plot function accepts a
+    cube in place of its DataFrame.
+    """
+
+    def __init__(self, counts, dims, labels):
+        self.counts = counts
+        self.dims = tuple(dims)
+        self.labels = {dim: pd.Index(labels[dim], name=dim) for dim in dims}
+
+    @classmethod
+    def from_frame(cls, df, dims, county_df=None):
+        """Build a cube of birth counts from a cleaned DataFrame."""
+        return BirthAggregator(df, county_df).cube(dims)
+
+    def sum(self, dims):
+        """Cube of the given dimensions, summed over all others."""
+        # Sum away the other dimensions, then order axes as requested.
+        dropped = tuple(axis for axis, dim in enumerate(self.dims)
+                        if dim not in dims)
+        counts = self.counts.sum(axis=dropped)
+        kept = [dim for dim in self.dims if dim in dims]
+        counts = counts.transpose([kept.index(dim) for dim in dims])
+
+        return BirthCube(counts, dims, self.labels)
+
+    def select(self, dim, label):
+        """Cube of a single label of dim, e.g. one county, without dim."""
+        axis = self.dims.index(dim)
+        counts = np.take(self.counts, self.labels[dim].get_loc(label),
+                         axis=axis)
+
+        return BirthCube(counts, self.dims[:axis] + self.dims[axis + 1:],
+                         self.labels)
+
+    def marginal(self, dims):
+        """Birth counts grouped by dims with the last dimension unstacked.
+
+        Matches df.groupby(by=dims).birth_count.sum().unstack().
+        """
+        counts = self.sum(dims).counts
+        columns = self.labels[dims[-1]]
+
+        # Single remaining dimensions index rows directly.
+        if len(dims) == 2:
+            index = self.labels[dims[0]]
+        else:
+            index = pd.MultiIndex.from_product(
+                [self.labels[dim] for dim in dims[:-1]], names=dims[:-1])
+
+        return pd.DataFrame(counts.reshape(-1, len(columns)), index=index,
+                            columns=columns
+                            )
+
+    def replace(self, other, dim='year', labels=None):
+        """Cube with slices of dim replaced by those of other.
+
+        Merges a new or revised year into an existing cube: every label of
+        dim in labels (by default, all of other's) is dropped here and
+        filled from other. Labels of other missing from this cube (a new
+        year, say) are appended, sorted. Raises KeyError if other lacks any
+        of labels.
+        """
+        if set(other.dims) != set(self.dims):
+            raise ValueError('Cannot replace slices of a cube over {} with '
+                             'one over {}.'.format(self.dims, other.dims))
+        other = other.sum(self.dims)
+        if labels is not None:
+            positions = other.labels[dim].get_indexer(labels)
+            if (positions < 0).any():
+                raise KeyError('No {} {} in the replacing cube.'.format(
+                    dim, ', '.join(str(label) for label
+                                   in np.asarray(labels)[positions < 0])))
+            other = BirthCube(
+                np.take(other.counts, positions, axis=self.dims.index(dim)),
+                self.dims, dict(other.labels, **{dim: labels}))
+
+        # Grow the cube by labels it has not seen.
+        counts = self.counts.copy()
+        merged = dict(self.labels)
+        for axis, name in enumerate(self.dims):
+            unseen = other.labels[name].difference(merged[name], sort=False)
+            if len(unseen):
+                padding = [(0, 0)] * len(self.dims)
+                padding[axis] = (0, len(unseen))
+                counts = np.pad(counts, padding)
+                merged[name] = merged[name].append(pd.Index(sorted(unseen)))
+
+        # Empty the replaced slices whole, then write the new counts.
+        positions = [merged[name].get_indexer(other.labels[name])
+                     for name in self.dims]
+        replaced = [slice(None)] * len(self.dims)
+        replaced[self.dims.index(dim)] = positions[self.dims.index(dim)]
+        counts[tuple(replaced)] = 0
+        counts[np.ix_(*positions)] = other.counts
+
+        return BirthCube(counts, self.dims, merged)
+
+    def save(self, path):
+        """Write the cube to a NumPy .npz file, replacing it atomically."""
+        arrays = {'counts': self.counts, 'dims': np.array(self.dims)}
+        for dim in self.dims:
+            arrays['labels_' + dim] = np.array(self.labels[dim].tolist())
+
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as cube_file:
+            np.savez(cube_file, **arrays)
+        os.replace(temp_path, path)
+
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Read a cube written by save."""
+        with np.load(path, allow_pickle=False) as arrays:
+            dims = arrays['dims'].tolist()
+            return cls(arrays['counts'], dims,
+                       {dim: arrays['labels_' + dim].tolist()
+                        for dim in dims})
+
+
+def _vocabularies(county_df=None):
+    """Fixed label orders of each dimension."""
+    vocabularies = {'year': _Lists.all_years,
+                    'age': _Lists.all_ages,
+                    'race': _Lists.all_races,
+                    'ethnicity': _Lists.all_ethnicities,
+                    'weight_indicator': _Lists.all_weights
+                    }
+    if county_df is not None:
+        vocabularies['county'] = county_df.index.tolist()
+
+    return vocabularies
+
+
+class BirthAggregator():
+    """Group-sum engine for birth counts over integer-coded dimensions.
+
+    Each dimension of a cleaned DataFrame is encoded to integer codes once,
+    against the fixed label orders in _Lists (and the county table, when
+    given). Any marginal is then a single np.bincount over a flattened
+    index. Labels missing from the fixed orders are appended, sorted.
+    """
+
+    def __init__(self, df, county_df=None):
+        self.df = df
+        self.weights = df.birth_count.to_numpy(dtype='float64')
+        self.vocabularies = _vocabularies(county_df)
+
+        self.codes = {}
+        self.labels = {}
+
+    def encode(self, dim):
+        """Integer codes and labels of one dimension, computed once."""
+        if dim not in self.codes:
+            # Factorize rows (categoricals already are), then place the few
+            # uniques in the vocabulary.
+            column = self.df[dim]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                codes = column.cat.codes.to_numpy()
+                uniques = column.cat.categories
+            else:
+                codes, uniques = pd.factorize(column)
+            labels = pd.Index(self.vocabularies.get(dim, []))
+            unseen = uniques[labels.get_indexer(uniques) == -1]
+            if len(unseen):
+                labels = pd.Index(labels.tolist() + sorted(unseen))
+
+            self.codes[dim] = labels.get_indexer(uniques)[codes]
+            self.labels[dim] = labels.rename(dim)
+
+        return self.codes[dim], self.labels[dim]
+
+    def counts(self, dims):
+        """Dense array of birth counts over dims."""
+        codes, labels = zip(*[self.encode(dim) for dim in dims])
+        shape = [len(dim_labels) for dim_labels in labels]
+
+        # Sum birth counts into a flattened index of every combination.
+        with span('bincount', rows_in=len(self.weights)):
+            flat_index = np.ravel_multi_index(codes, shape)
+            counts = np.bincount(flat_index, weights=self.weights,
+                                 minlength=int(np.prod(shape))
+                                 )
+
+        return counts.reshape(shape)
+
+    def cube(self, dims):
+        """BirthCube over dims."""
+        counts = self.counts(dims)
+
+        return BirthCube(counts, dims, {dim: self.labels[dim] for dim in dims})
+
+    def marginal(self, dims):
+        """Birth counts grouped by dims with the last dimension unstacked.
+
+        Shaped like df.groupby(by=dims).birth_count.sum().unstack(), with
+        labels in vocabulary order. Over every dimension this is the
+        layout of age_pivot_table and race_pivot_table.
+        """
+        return self.cube(dims).marginal(dims)
+
+
+class BirthCubeBuilder():
+    """Folds cleaned chunks of rows into a BirthCube, one chunk at a time.
+
+    Only the cube is kept between chunks, so memory use is bounded by the
+    chunk size. Labels first seen in a later chunk grow the cube, and the
+    finished cube orders them as a single pass over all rows would.
+    """
+
+    def __init__(self, dims, county_df=None):
+        self.dims = tuple(dims)
+        self.county_df = county_df
+        self.counts = None
+        self.labels = None
+        self.rows = 0
+
+    def add(self, df):
+        """Aggregate one cleaned chunk into the cube."""
+        chunk = BirthAggregator(df, self.county_df).cube(self.dims)
+        self.rows += len(df)
+
+        if self.counts is None:
+            self.counts = chunk.counts
+            self.labels = dict(chunk.labels)
+            return self
+
+        # Grow the cube by labels missing from earlier chunks.
+        for axis, dim in enumerate(self.dims):
+            unseen = chunk.labels[dim].difference(self.labels[dim],
+                                                  sort=False)
+            if len(unseen):
+                padding = [(0, 0)] * len(self.dims)
+                padding[axis] = (0, len(unseen))
+                self.counts = np.pad(self.counts, padding)
+                self.labels[dim] = self.labels[dim].append(unseen)
+
+        # Labels are unique along each axis, so a plain += is safe.
+        positions = np.ix_(*[self.labels[dim].get_indexer(chunk.labels[dim])
+                             for dim in self.dims])
+        self.counts[positions] += chunk.counts
+
+        return self
+
+    def cube(self):
+        """The BirthCube of every chunk added so far."""
+        if self.counts is None:
+            raise ValueError('No chunks have been added.')
+
+        # Vocabulary labels first, then every unseen label sorted.
+        vocabularies = _vocabularies(self.county_df)
+        counts = self.counts
+        labels = {}
+        for axis, dim in enumerate(self.dims):
+            known = len(vocabularies.get(dim, []))
+            order = np.argsort(self.labels[dim][known:].to_numpy(),
+                               kind='stable') + known
+            order = np.concatenate([np.arange(known), order])
+            counts = np.take(counts, order, axis=axis)
+            labels[dim] = self.labels[dim][order]
+
+        return BirthCube(counts, self.dims, labels)
+
+
+def _fold_cube(data, dims, county_df=None):
+    """BirthCube of a cleaned DataFrame or an iterable of cleaned chunks."""
+    if isinstance(data, pd.DataFrame):
+        return BirthCube.from_frame(data, dims, county_df)
+
+    builder = BirthCubeBuilder(dims, county_df)
+    for df in data:
+        builder.add(df)
+
+    return builder.cube()
+
+
+@traced
+def age_cube(age_df, county_df=None):
+    """Cube of births by year, county, age range and weight indicator.
+
+    age_df may also be the iterator of cleaned chunks returned by
+    age_data_cleaning with a chunksize, which is folded in chunk by chunk.
+    """
+    return _fold_cube(age_df, ['year', 'county', 'age', 'weight_indicator'],
+                      county_df
+                      )
+
+
+@traced
+def race_cube(race_df, county_df=None):
+    """Cube of births by year, county, race, ethnicity and weight.
+
+    race_df may also be an iterator of cleaned chunks, as for age_cube.
+    """
+    return _fold_cube(race_df, ['year', 'county', 'race', 'ethnicity',
+                                'weight_indicator'
+                                ],
+                      county_df
+                      )
+
+
+def _birth_marginal(data, dims):
+    """Birth counts by dims, last dimension unstacked, from frame or cube."""
+    if isinstance(data, BirthCube):
+        with span('cube_marginal', dims=','.join(dims)):
+            return data.marginal(dims)
+
+    # The bincount engine, rather than groupby(...).sum().unstack().
+    with span('frame_marginal', rows_in=data, dims=','.join(dims)):
+        return BirthAggregator(data).marginal(dims)
+
+
+def _data_years(data):
+    """Years 2006-2017, followed by any later years in a frame or cube."""
+    if isinstance(data, BirthCube):
+        observed = data.labels['year']
+    else:
+        observed = data.year.unique()
+
+    return _Lists.all_years + sorted(set(observed.tolist())
+                                     - set(_Lists.all_years))
+
+
+@traced
+def category_time_series(data, dim, groups, years=None):
+    """Annual birth counts of category groups, split by weight indicator.
+
+    groups maps each group name to the labels of dim it combines, e.g.
+    {'teen': ['Less than 15', '15 to 17']}; a plain list of labels makes one
+    group per label. All years and groups are extracted with one reindex
+    and one matrix product, and missing combinations count as zero births.
+    Returns a DataFrame indexed by year, by default 2006-2017 and any later
+    year in data, with (group, weight_indicator) columns.
+    """
+    if years is None:
+        years = _data_years(data)
+    if not isinstance(groups, dict):
+        groups = {label: [label] for label in groups}
+
+    # Dense year x label x weight array of the labels in any group.
+    labels = list(dict.fromkeys(label for members in groups.values()
+                                for label in members))
+    marginal = aggregate(data, ['year', dim, 'weight_indicator'])
+    marginal = marginal.reindex(pd.MultiIndex.from_product([years, labels]),
+                                fill_value=0
+                                )
+    counts = marginal.to_numpy(dtype='float64').reshape(
+        len(years), len(labels), marginal.shape[1])
+
+    # Label-to-group membership matrix sums every group at once.
+    membership = np.zeros((len(labels), len(groups)))
+    for column, members in enumerate(groups.values()):
+        membership[[labels.index(label) for label in members], column] = 1
+    series = np.einsum('ylw,lg->ygw', counts, membership)
+
+    columns = pd.MultiIndex.from_product([list(groups), marginal.columns],
+                                         names=[dim, 'weight_indicator'])
+
+    return pd.DataFrame(series.reshape(len(years), -1),
+                        index=pd.Index(years, name='year'), columns=columns
+                        )
+
+
+def birth_weight_rates(marginal, percent=False):
+    """Share of each row's births in every weight class, e.g. low rates.
+
+    marginal holds counts with the weight indicator (or any split of the
+    births) as columns. The rates are computed in place on a single float
+    buffer, as fractions or, with percent, out of 100. Rows without births
+    get NaN rates, without a division warning.
+    """
+    # Column-major, so every column is contiguous for the Arrow handoff.
+    rates = np.array(marginal.to_numpy(), dtype='float64', order='F')
+    totals = rates.sum(axis=1, keepdims=True)
+
+    np.divide(rates, totals, out=rates, where=totals > 0)
+    rates[(totals == 0).ravel()] = np.nan
+    if percent:
+        rates *= 100
+
+    return pd.DataFrame(rates, index=marginal.index,
+                        columns=marginal.columns, copy=False)
+
+
+def _fingerprint(data, dims):
+    """Digest of the contents an aggregation of data over dims reads.
+
+    Hashes the raw buffers of the dimension and birth count columns (codes
+    and categories for categoricals), or of a cube's counts and labels, so
+    it is cheap next to the aggregation and changes with any in-place edit.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+
+    if isinstance(data, BirthCube):
+        digest.update(repr((data.dims, [data.labels[dim].tolist()
+                                        for dim in data.dims])).encode())
+        digest.update(np.ascontiguousarray(data.counts).tobytes())
+        return 'cube-' + digest.hexdigest()
+
+    for column in list(dims) + ['birth_count']:
+        values = data[column]
+        digest.update('{}:{}:{}'.format(column, values.dtype,
+                                        len(values)).encode())
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            digest.update(repr(values.cat.categories.tolist()).encode())
+            values = values.cat.codes
+        elif not isinstance(values.dtype, np.dtype) \
+                or values.dtype == object:
+            values = pd.util.hash_pandas_object(values, index=False)
+        digest.update(np.ascontiguousarray(values.to_numpy()).tobytes())
+
+    return 'frame-' + digest.hexdigest()
+
+
+def _copy_on_write():
+    """Whether pandas copies a shared column before writing to it: always
+    from pandas 3, when opted into on pandas 2.
+    """
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+
+    return pd.options.mode.copy_on_write is True
+
+
+class _FrameEntry():
+    """Aggregation cache entry holding the marginal itself, used when
+    pyarrow is not installed.
+    """
+
+    def __init__(self, df):
+        self.frame = df
+
+    def to_pandas(self):
+        """Copy of the marginal, shallow under Copy-on-Write."""
+        return self.frame.copy(deep=not _copy_on_write())
+
+
+def _cache_entry(marginal):
+    """Aggregation cache entry of a marginal: Arrow buffers when pyarrow is
+    installed, the frame itself otherwise.
+    """
+    try:
+        from resources.ohio_birth_arrow import ArrowFrame
+    except ImportError:
+        return _FrameEntry(marginal)
+
+    return ArrowFrame(marginal)
+
+
+class AggregationCache():
+    """Bounded LRU of birth count marginals with hit/miss counters.
+
+    Entries are keyed by a content fingerprint of the frame or cube, the
+    dimensions and the normalization, so a frame mutated in place misses
+    and is aggregated afresh. With pyarrow, entries are held as Arrow
+    buffers and returned as DataFrames of read-only views of them, which
+    the caller may still modify freely under Copy-on-Write: pandas copies a
+    column on its first write. Without Copy-on-Write, callers get copies.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def aggregate(self, data, dims, normalize=False):
+        """Birth counts of data by dims, last dimension unstacked.
+
+        With normalize, counts become fractions of each row's total, or
+        percentages with normalize='percent'.
+        """
+        dims = tuple(dims)
+        key = (_fingerprint(data, dims), dims, normalize)
+
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key].to_pandas()
+
+        with span('aggregate', dims=','.join(dims)):
+            marginal = _birth_marginal(data, list(dims))
+            if normalize:
+                marginal = birth_weight_rates(marginal,
+                                              percent=normalize == 'percent')
+            entry = _cache_entry(marginal)
+
+        with self.lock:
+            self.misses += 1
+            self.entries[key] = entry
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+        return entry.to_pandas()
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Hit/miss/eviction counters and the number of entries held."""
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'entries': len(self.entries), 'maxsize': self.maxsize}
+
+
+# Cache shared by the module-level helpers and the plot functions.
+_aggregation_cache = AggregationCache()
+
+
+def aggregate(data, dims, normalize=False):
+    """Birth counts by dims with the last dimension unstacked, memoized.
+
+    data is a cleaned DataFrame or a BirthCube. Repeated calls on unchanged
+    data are served from an LRU cache. With normalize, counts become
+    fractions of each row's total (see birth_weight_rates), or percentages
+    with normalize='percent'.
+    """
+    return _aggregation_cache.aggregate(data, dims, normalize)
+
+
+def aggregation_stats():
+    """Counters of the aggregation cache."""
+    return _aggregation_cache.stats()
+
+
+def clear_aggregation_cache():
+    """Empty the aggregation cache."""
+    _aggregation_cache.clear()
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""Cached, offline Ohio county geometry for choropleth plots.
+
+plotly.figure_factory.create_choropleth reads and simplifies the shapefiles
+of every US county on each call. This module extracts the Ohio county
+polygons once, pre-simplified, into a compact JSON file shipped in
+resources/data, and draws choropleths from that file without touching the
+shapefiles or the network.
+
+Regenerate the cache (requires geopandas and plotly-geo) with:
+    python -m resources.ohio_birth_geometry
+"""
+import functools
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from resources.ohio_birth_data import COUNTY_PATH, DATA_DIR
+
+
+# Location of the shipped geometry cache, next to the county table it
+# covers.
+GEOMETRY_PATH = os.path.join(DATA_DIR, 'ohio_county_geometry.json')
+
+# Simplification tolerance (degrees), as used by create_choropleth.
+SIMPLIFY_TOLERANCE = 0.02
+
+# Coordinate precision kept in the cache.
+DECIMALS = 5
+
+
+def _exterior_rings(geometry, tolerance):
+    """Simplified exterior rings of a Polygon or MultiPolygon."""
+    polygons = getattr(geometry, 'geoms', [geometry])
+
+    return [polygon.simplify(tolerance).exterior for polygon in polygons]
+
+
+def _ring_lists(ring):
+    """Rounded [x, y] coordinate lists of a ring."""
+    x, y = ring.xy
+
+    return [np.round(x, DECIMALS).tolist(), np.round(y, DECIMALS).tolist()]
+
+
+def _county_neighbors(shapes):
+    """FIPS codes of the counties sharing a border or corner with each
+    county, from the full resolution shapes (a GeoSeries by FIPS).
+    """
+    county, other = shapes.sindex.query(shapes, predicate='intersects')
+    neighbors = {code: [] for code in shapes.index}
+    for i, j in zip(county, other):
+        if i != j:
+            neighbors[shapes.index[i]].append(int(shapes.index[j]))
+
+    return {code: sorted(codes) for code, codes in neighbors.items()}
+
+
+def extract_county_geometry(county_df, path=GEOMETRY_PATH,
+                            tolerance=SIMPLIFY_TOLERANCE):
+    """Extract simplified Ohio county polygons from the plotly-geo shapefiles.
+
+    Only the counties in county_df (indexed by name, with a FIPS column)
+    are kept, along with the Ohio state outline. The neighbors of every
+    county are recorded from the unsimplified shapes.
+    """
+    import _plotly_geo
+    import geopandas as gp
+
+    shape_dir = os.path.join(os.path.dirname(_plotly_geo.__file__),
+                             'package_data'
+                             )
+
+    # Read county and state shapes.
+    county_shapes = gp.read_file(os.path.join(shape_dir,
+                                              'cb_2016_us_county_500k.shp'))
+    county_shapes['FIPS'] = pd.to_numeric(county_shapes.STATEFP
+                                          + county_shapes.COUNTYFP)
+    county_shapes = county_shapes.set_index('FIPS')
+
+    state_shapes = gp.read_file(os.path.join(shape_dir,
+                                             'cb_2016_us_state_500k.shp'))
+    state_geometry = state_shapes[state_shapes.NAME == 'Ohio'] \
+        .geometry.iloc[0]
+
+    neighbors = _county_neighbors(
+        county_shapes.loc[county_df.FIPS.tolist()].geometry)
+
+    # Simplify every county once and record per-polygon centroids.
+    counties = {}
+    for name, fips in county_df.FIPS.items():
+        geometry = county_shapes.loc[fips].geometry
+        polygons = getattr(geometry, 'geoms', [geometry])
+        counties[str(fips)] = {
+            'name': name,
+            'rings': [_ring_lists(ring)
+                      for ring in _exterior_rings(geometry, tolerance)],
+            'centroids': [[round(polygon.centroid.x, DECIMALS),
+                           round(polygon.centroid.y, DECIMALS)]
+                          for polygon in polygons],
+            'neighbors': neighbors[fips]
+            }
+
+    geometry_cache = {'tolerance': tolerance,
+                      'counties': counties,
+                      'state': [_ring_lists(ring) for ring
+                                in _exterior_rings(state_geometry, tolerance)]
+                      }
+
+    with open(path, 'w') as cache_file:
+        json.dump(geometry_cache, cache_file, separators=(',', ':'))
+
+    return path
+
+
+def _ring_array(rings):
+    """Concatenate rings into x and y arrays separated by NaN."""
+    x = np.concatenate([np.append(ring[0], np.nan) for ring in rings])
+    y = np.concatenate([np.append(ring[1], np.nan) for ring in rings])
+
+    return x, y
+
+
+@functools.lru_cache(maxsize=None)
+def load_county_geometry(path=GEOMETRY_PATH):
+    """Parsed geometry cache, read from disk once per process.
+
+    Returns a dictionary with per-FIPS outline arrays, centroids, names
+    and neighbor FIPS codes, the state outline arrays and the bounds of the
+    whole map.
+    """
+    with open(path) as cache_file:
+        geometry_cache = json.load(cache_file)
+
+    outlines = {}
+    centroids = {}
+    names = {}
+    neighbors = {}
+    for fips, county in geometry_cache['counties'].items():
+        outlines[int(fips)] = _ring_array(county['rings'])
+        centroids[int(fips)] = np.array(county['centroids'])
+        names[int(fips)] = county['name']
+        neighbors[int(fips)] = county.get('neighbors', [])
+
+    state_x, state_y = _ring_array(geometry_cache['state'])
+    all_x = np.concatenate([state_x] + [x for x, _ in outlines.values()])
+    all_y = np.concatenate([state_y] + [y for _, y in outlines.values()])
+
+    return {'outlines': outlines, 'centroids': centroids, 'names': names,
+            'neighbors': neighbors, 'state': (state_x, state_y),
+            'bounds': (np.nanmin(all_x), np.nanmax(all_x),
+                       np.nanmin(all_y), np.nanmax(all_y))
+            }
+
+
+def _bin_labels(binning_endpoints):
+    """Legend labels of the bins, as create_choropleth writes them."""
+    labels = ['< {:,}'.format(binning_endpoints[0])]
+    labels += ['{:,} - {:,}'.format(low, high) for low, high
+               in zip(binning_endpoints[:-1], binning_endpoints[1:])]
+    labels.append('> {:,}'.format(binning_endpoints[-1]))
+
+    return labels
+
+
+def _fit_aspect(x_range, y_range, asp):
+    """Widen the x or y range about its center to the aspect ratio."""
+    width = x_range[1] - x_range[0]
+    height = y_range[1] - y_range[0]
+    center = (sum(x_range) / 2.0, sum(y_range) / 2.0)
+
+    if height / width > 1 / asp:
+        new_width = asp * height
+        x_range = [center[0] - new_width * 0.5, center[0] + new_width * 0.5]
+    else:
+        new_height = width / asp
+        y_range = [center[1] - new_height * 0.5, center[1] + new_height * 0.5]
+
+    return x_range, y_range
+
+
+def county_choropleth(fips, values, binning_endpoints, colorscale,
+                      legend_title='', asp=3, show_hover=True,
+                      county_outline=None, state_outline=None,
+                      geometry_path=GEOMETRY_PATH, hover_notes=None,
+                      overlays=None, **layout_options):
+    """Ohio county choropleth drawn from the cached geometry.
+
+    Takes the arguments of create_choropleth that county_breakdown_plot
+    uses and produces the same figure. hover_notes adds a line to the hover
+    text of each county, in the order of fips. overlays is a list of
+    (fips, name, line) outlines drawn over the counties, each a legend
+    entry. Extra keyword arguments update the layout (e.g. width and
+    height).
+    """
+    geometry = load_county_geometry(geometry_path)
+    labels = _bin_labels(binning_endpoints)
+
+    if county_outline is None:
+        county_outline = {'color': 'rgb(0, 0, 0)', 'width': 0}
+    if state_outline is None:
+        state_outline = {'color': 'rgb(240, 240, 240)', 'width': 1}
+
+    # Bin every county in one call: endpoints[j - 1] < value <= endpoints[j].
+    fips = np.asarray(fips, dtype='int64')
+    values = np.asarray(values, dtype='float64')
+    levels = np.searchsorted(binning_endpoints, values, side='left')
+
+    # One filled trace per bin, built from the cached outlines.
+    data = []
+    for level, label in enumerate(labels):
+        outlines = [geometry['outlines'][code]
+                    for code in fips[levels == level]]
+        if outlines:
+            x = np.concatenate([outline[0] for outline in outlines])
+            y = np.concatenate([outline[1] for outline in outlines])
+        else:
+            x, y = np.array([]), np.array([])
+        data.append(go.Scatter(x=x, y=y, mode='lines', line=county_outline,
+                               fill='toself', fillcolor=colorscale[level],
+                               name=label, hoverinfo='none'
+                               ))
+
+    # Unfilled outlines over groups of counties.
+    for overlay_fips, name, line in overlays or []:
+        outlines = [geometry['outlines'][code] for code in overlay_fips]
+        if outlines:
+            data.append(go.Scatter(
+                x=np.concatenate([outline[0] for outline in outlines]),
+                y=np.concatenate([outline[1] for outline in outlines]),
+                mode='lines', line=line, name=name, hoverinfo='none'))
+
+    # Invisible centroid markers carry the hover text.
+    if show_hover:
+        centroid_x, centroid_y, text = [], [], []
+        if hover_notes is None:
+            hover_notes = [None] * len(fips)
+        for code, value, note in zip(fips, values, hover_notes):
+            hover = ('County: {}<br>State: Ohio<br>FIPS: {}<br>Value: {}'
+                     .format(geometry['names'][code], str(code).zfill(5),
+                             value))
+            if note:
+                hover += '<br>' + note
+            for centroid in geometry['centroids'][code]:
+                centroid_x.append(centroid[0])
+                centroid_y.append(centroid[1])
+                text.append(hover)
+        data.append(go.Scatter(x=centroid_x, y=centroid_y, text=text,
+                               mode='markers', name='US Counties',
+                               marker={'color': 'white', 'opacity': 0},
+                               hoverinfo='text', showlegend=False,
+                               legendgroup='centroids'
+                               ))
+
+    data.append(go.Scatter(x=geometry['state'][0], y=geometry['state'][1],
+                           mode='lines', line=state_outline,
+                           hoverinfo='text', showlegend=False,
+                           legendgroup='States'
+                           ))
+
+    # Zoom to Ohio at the requested aspect ratio.
+    x_min, x_max, y_min, y_max = geometry['bounds']
+    x_range, y_range = _fit_aspect([x_min, x_max], [y_min, y_max], asp)
+    axis = {'autorange': False, 'showgrid': False, 'zeroline': False,
+            'fixedrange': True, 'showticklabels': False
+            }
+
+    layout = go.Layout(
+        hovermode='closest', xaxis=dict(axis, range=x_range),
+        yaxis=dict(axis, range=y_range),
+        margin={'t': 40, 'b': 20, 'r': 20, 'l': 20},
+        width=900, height=450, dragmode='select',
+        legend={'traceorder': 'reversed', 'xanchor': 'right',
+                'yanchor': 'top', 'x': 1, 'y': 1},
+        annotations=[{'x': 1, 'y': 1.05, 'xref': 'paper', 'yref': 'paper',
+                      'xanchor': 'right', 'showarrow': False,
+                      'text': '<b>' + legend_title + '</b>'}]
+        )
+    layout.update(layout_options)
+
+    return go.Figure(data=data, layout=layout)
+
+
+def main():
+    """Regenerate the shipped geometry cache from the plotly-geo shapes."""
+    county_df = pd.read_csv(COUNTY_PATH, index_col='county')
+    print(extract_county_geometry(county_df))
+
+
+if __name__ == '__main__':
+    main()
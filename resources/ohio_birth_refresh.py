@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""Incremental refresh of the rendered figures when a year is published.
+
+The Ohio data is released a year at a time, and the latest year ('2017 **')
+is provisional until revised. Rather than re-reading and re-aggregating
+every year, the refresh keeps the aggregation cubes in a state directory.
+An update file holding only the new (or revised) year is cleaned, and its
+year slices replace those of the persisted cubes. Every figure is keyed by
+a digest of the marginal it plots, and only figures whose marginal changed
+are rendered again.
+
+Build the state from the shipped files with a full render:
+    python -m resources.ohio_birth_refresh reports --per-county
+
+then merge a new year and re-render what it changed:
+    python -m resources.ohio_birth_refresh reports --age-path age_2018.csv
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import matplotlib.pyplot as plt
+
+from resources import ohio_birth_analysis, ohio_birth_render
+from resources.ohio_birth_data import AGE_PATH, COUNTY_PATH, RACE_PATH
+
+
+# Format of the state directory. Bump when its contents change meaning.
+STATE_VERSION = 1
+
+# Cleaning and cube functions of each dataset.
+DATASETS = {'age': (ohio_birth_analysis.age_data_cleaning,
+                    ohio_birth_analysis.age_cube),
+            'race': (ohio_birth_analysis.race_data_cleaning,
+                     ohio_birth_analysis.race_cube)
+            }
+
+
+def _state_paths(state_dir):
+    """Locations of the persisted cubes and of the manifest."""
+    cube_paths = {dataset: os.path.join(state_dir, dataset + '_cube.npz')
+                  for dataset in DATASETS}
+
+    return cube_paths, os.path.join(state_dir, 'manifest.json')
+
+
+def load_state(state_dir):
+    """Persisted cubes and manifest of state_dir, empty if there is none.
+
+    A manifest of another STATE_VERSION is discarded with its cubes.
+    """
+    cube_paths, manifest_path = _state_paths(state_dir)
+    if not os.path.exists(manifest_path):
+        return {}, {}
+
+    with open(manifest_path) as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get('version') != STATE_VERSION:
+        return {}, {}
+
+    cubes = {dataset: ohio_birth_analysis.BirthCube.load(path)
+             for dataset, path in cube_paths.items()
+             if os.path.exists(path)}
+
+    return cubes, manifest
+
+
+def save_state(state_dir, cubes, manifest):
+    """Write the cubes and the manifest to state_dir."""
+    os.makedirs(state_dir, exist_ok=True)
+    cube_paths, manifest_path = _state_paths(state_dir)
+    for dataset, cube in cubes.items():
+        cube.save(cube_paths[dataset])
+
+    # The manifest goes last, so that it never describes missing cubes.
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w') as manifest_file:
+        json.dump(dict(manifest, version=STATE_VERSION), manifest_file,
+                  indent=1)
+    os.replace(temp_path, manifest_path)
+
+
+def _digest(cube, extra=None):
+    """Digest of a marginal cube's counts and labels."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((cube.dims, [cube.labels[dim].tolist()
+                                    for dim in cube.dims])).encode())
+    digest.update(cube.counts.tobytes())
+    if extra is not None:
+        digest.update(extra)
+
+    return digest.hexdigest()
+
+
+def figure_jobs(cubes, county_df, out_dir, per_county=False):
+    """Every figure to keep up to date, keyed by its output directory and
+    name: the plot function, its arguments and the digest of its input.
+    """
+    # The map also depends on the county table it is drawn from.
+    county_digest = repr((county_df.index.tolist(),
+                          county_df.FIPS.tolist())).encode()
+
+    jobs = {}
+    for name, function_name, dataset, dims in ohio_birth_render.SUITE:
+        marginal = cubes[dataset].sum(dims)
+        args = (marginal,)
+        extra = None
+        if function_name == 'county_breakdown_plot':
+            args += (county_df,)
+            extra = county_digest
+        jobs[(out_dir, name)] = (getattr(ohio_birth_analysis,
+                                         function_name),
+                                 args, _digest(marginal, extra))
+
+    if per_county:
+        for county in county_df.index:
+            county_dir = os.path.join(
+                out_dir, ohio_birth_render.county_directory(county))
+            for name, function_name, dataset, dims \
+                    in ohio_birth_render.COUNTY_SUITE:
+                marginal = cubes[dataset].select('county', county).sum(dims)
+                jobs[(county_dir, name)] = (
+                    getattr(ohio_birth_analysis, function_name),
+                    (marginal,), _digest(marginal))
+
+    return jobs
+
+
+def _is_current(key, digest, formats, manifest):
+    """Whether a figure was rendered from the same input in every format."""
+    out_dir, name = key
+    entry = manifest.get('figures', {}).get(os.path.join(out_dir, name))
+    if entry is None or entry['digest'] != digest:
+        return False
+
+    return all(file_format in entry['formats']
+               and os.path.exists(os.path.join(
+                   out_dir, '{}.{}'.format(name, file_format)))
+               for file_format in formats)
+
+
+def _render_jobs(jobs, formats, processes=None):
+    """Render (key, plot function, arguments) jobs, across a process pool
+    when processes is given. Returns report entries in job order.
+    """
+    if not processes:
+        plt.switch_backend('agg')
+        return [ohio_birth_render.render_figure(
+                    key[1], plot_function, args, key[0], formats)
+                for key, plot_function, args in jobs]
+
+    return ohio_birth_render.render_jobs_parallel(
+        [(key[1], plot_function, args, key[0])
+         for key, plot_function, args in jobs], formats, processes)
+
+
+def refresh(out_dir, state_dir, age_path=None, race_path=None,
+            county_df=None, formats=('png',), per_county=False,
+            processes=None):
+    """Merge update files into the persisted cubes and re-render the
+    figures whose inputs changed.
+
+    age_path and race_path are files holding the years to add or replace;
+    a dataset without a persisted cube must be given its full file. The
+    cubes and a manifest of rendered figures are kept in state_dir.
+    Returns a report of the work done and skipped, with the render report
+    of every figure drawn.
+    """
+    start = time.perf_counter()
+    if county_df is None:
+        county_df = ohio_birth_analysis.county_data_cleaning(COUNTY_PATH)
+    cubes, manifest = load_state(state_dir)
+    rows = {dataset: dict(manifest.get('rows', {}).get(dataset, {}))
+            for dataset in DATASETS}
+
+    # Clean only the update files, then swap in their year slices.
+    years = {}
+    rows_cleaned = 0
+    for dataset, path in [('age', age_path), ('race', race_path)]:
+        if path is None:
+            if dataset not in cubes:
+                raise ValueError('No persisted {} cube in {}; give the full '
+                                 '{} file.'.format(dataset, state_dir,
+                                                   dataset))
+            continue
+
+        cleaning, build_cube = DATASETS[dataset]
+        df = cleaning(path, county_df=county_df)
+        years_rows = df.year.value_counts().sort_index()
+        years[dataset] = [int(year) for year in years_rows.index]
+
+        # The update cube spans every known year; only those in the file
+        # are replaced.
+        update = build_cube(df, county_df)
+        cubes[dataset] = update if dataset not in cubes \
+            else cubes[dataset].replace(update, 'year', years[dataset])
+        rows[dataset].update({str(year): int(count)
+                              for year, count in years_rows.items()})
+        rows_cleaned += len(df)
+
+    # Years kept from the persisted cubes were not read again.
+    rows_skipped = sum(count for dataset in DATASETS
+                       for year, count in rows[dataset].items()
+                       if int(year) not in years.get(dataset, []))
+
+    # Render the figures whose input digest changed.
+    jobs = figure_jobs(cubes, county_df, out_dir, per_county)
+    stale = [(key, plot_function, args)
+             for key, (plot_function, args, digest) in jobs.items()
+             if not _is_current(key, digest, formats, manifest)]
+    report = _render_jobs(stale, formats, processes)
+
+    figures = dict(manifest.get('figures', {}))
+    for key, _, _ in stale:
+        figures[os.path.join(*key)] = {'digest': jobs[key][2],
+                                       'formats': list(formats)}
+    save_state(state_dir, cubes, {'rows': rows, 'figures': figures})
+
+    return {'years': years, 'rows_cleaned': rows_cleaned,
+            'rows_skipped': rows_skipped, 'figures_rendered': len(stale),
+            'figures_skipped': len(jobs) - len(stale),
+            'seconds': time.perf_counter() - start, 'report': report
+            }
+
+
+def print_refresh(result):
+    """Print the years merged and the work done and skipped."""
+    for dataset, years in result['years'].items():
+        print('{:<6}years {}'.format(dataset,
+                                     ', '.join(str(year) for year in years)))
+    rows = result['rows_cleaned'] + result['rows_skipped']
+    figures = result['figures_rendered'] + result['figures_skipped']
+    print('rows cleaned    {:>8} of {:>8}, {:.1%} skipped'
+          .format(result['rows_cleaned'], rows,
+                  result['rows_skipped'] / rows if rows else 0.0))
+    print('figures drawn   {:>8} of {:>8}, {:.1%} skipped'
+          .format(result['figures_rendered'], figures,
+                  result['figures_skipped'] / figures if figures else 0.0))
+    print('wall time       {:>8.3f} s'.format(result['seconds']))
+
+
+def main():
+    """Command line entry point for the annual update job."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('out_dir', help='directory of the rendered figures')
+    parser.add_argument('--state-dir', default=None,
+                        help='directory of the persisted cubes, by default '
+                             '.state in out_dir')
+    parser.add_argument('--age-path', default=None,
+                        help='mother\'s age file of the years to merge')
+    parser.add_argument('--race-path', default=None,
+                        help='race file of the years to merge')
+    parser.add_argument('--county-path',
+                        default=COUNTY_PATH)
+    parser.add_argument('--formats', nargs='+', default=['png'],
+                        choices=ohio_birth_render.FORMATS)
+    parser.add_argument('--processes', type=int, default=0,
+                        help='render across this many processes, 0 for '
+                             'serial rendering')
+    parser.add_argument('--per-county', action='store_true',
+                        help='also keep the county-level figures of every '
+                             'county up to date')
+    args = parser.parse_args()
+
+    state_dir = args.state_dir or os.path.join(args.out_dir, '.state')
+    age_path, race_path = args.age_path, args.race_path
+
+    # Without any state, start from the full shipped files.
+    cubes, _ = load_state(state_dir)
+    if 'age' not in cubes and age_path is None:
+        age_path = AGE_PATH
+    if 'race' not in cubes and race_path is None:
+        race_path = RACE_PATH
+
+    county_df = ohio_birth_analysis.county_data_cleaning(args.county_path)
+    result = refresh(args.out_dir, state_dir, age_path, race_path,
+                     county_df, args.formats, args.per_county,
+                     args.processes or None)
+    print_refresh(result)
+
+
+if __name__ == '__main__':
+    main()
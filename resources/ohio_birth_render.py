@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""Headless batch rendering of the Ohio birth weight figures.
+
+Every plot function in ohio_birth_analysis is called with show=False and
+the returned figure is written to disk instead of being displayed. Matplotlib
+figures are drawn with a non-interactive backend. Plotly figures are
+exported with kaleido.
+
+Render the whole suite from the repository root with:
+    python -m resources.ohio_birth_render reports --formats png svg
+
+Add --per-county to render the county-level figures for every county, each
+county in its own subdirectory.
+"""
+import argparse
+import concurrent.futures
+import os
+import time
+
+import matplotlib.pyplot as plt
+
+from resources import ohio_birth_analysis, ohio_birth_trace
+from resources.ohio_birth_data import AGE_PATH, COUNTY_PATH, RACE_PATH
+
+
+# File formats the renderer can write.
+FORMATS = ('png', 'svg', 'pdf')
+
+
+# Figures of the suite: name, plot function, dataset it plots and the
+# dimensions it aggregates. The slow choropleth goes first so that parallel
+# batches start on it straight away.
+SUITE = [('county_breakdown_plot', 'county_breakdown_plot', 'age',
+          ['county', 'weight_indicator']),
+         ('total_age_bar', 'total_age_bar', 'age',
+          ['age', 'weight_indicator']),
+         ('relative_age_bar', 'relative_age_bar', 'age',
+          ['age', 'weight_indicator']),
+         ('total_race_bar', 'total_race_bar', 'race',
+          ['race', 'weight_indicator']),
+         ('relative_race_bar', 'relative_race_bar', 'race',
+          ['race', 'weight_indicator']),
+         ('ethnicity_pie', 'ethnicity_pie', 'race',
+          ['ethnicity', 'weight_indicator']),
+         ('annual_low_births_line', 'annual_low_births_line', 'age',
+          ['year', 'weight_indicator']),
+         ('high_risk_ages_stacked', 'high_risk_ages_stacked', 'age',
+          ['year', 'age', 'weight_indicator']),
+         ('race_breakdown_plot_stacked', 'race_breakdown_plot_stacked',
+          'race', ['year', 'race', 'weight_indicator'])
+         ]
+
+
+# Figures that make sense for a single county. The map covers every county,
+# and suppressed small counts leave many counties without Hispanic births
+# to draw the ethnicity pie from.
+COUNTY_SUITE = [entry for entry in SUITE
+                if entry[1] not in ('county_breakdown_plot', 'ethnicity_pie')]
+
+
+def suite_calls(age_data, race_data, county_df):
+    """Name, plot function and arguments of every figure in the suite.
+
+    age_data and race_data may be cleaned DataFrames or BirthCubes.
+    """
+    calls = []
+    for name, function_name, dataset, _ in SUITE:
+        args = (age_data,) if dataset == 'age' else (race_data,)
+        if function_name == 'county_breakdown_plot':
+            args += (county_df,)
+        calls.append((name, getattr(ohio_birth_analysis, function_name),
+                      args))
+
+    return calls
+
+
+def save_figure(fig, out_dir, name, formats=('png',)):
+    """Write a matplotlib or plotly figure in every format.
+
+    Matplotlib figures are closed once written. Returns the written paths.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    paths = []
+    for file_format in formats:
+        if file_format not in FORMATS:
+            raise ValueError('Unsupported format: {}'.format(file_format))
+
+        path = os.path.join(out_dir, '{}.{}'.format(name, file_format))
+        with ohio_birth_trace.span('save_figure', figure=name,
+                                   format=file_format):
+            if hasattr(fig, 'savefig'):
+                fig.savefig(path, format=file_format, bbox_inches='tight')
+            else:
+                fig.write_image(path, format=file_format)
+        paths.append(path)
+
+    # Release matplotlib figures so batches do not accumulate them.
+    if hasattr(fig, 'savefig'):
+        plt.close(fig)
+
+    return paths
+
+
+def render_figure(name, plot_function, args, out_dir, formats=('png',)):
+    """Render one figure to disk, timing the plot and the export."""
+    start = time.perf_counter()
+    fig = plot_function(*args, show=False)
+    paths = save_figure(fig, out_dir, name, formats)
+
+    return {'figure': name, 'seconds': time.perf_counter() - start,
+            'files': paths
+            }
+
+
+def render_suite(age_data, race_data, county_df, out_dir,
+                 formats=('png',), backend='agg'):
+    """Render every figure to out_dir without displaying anything.
+
+    Switches pyplot to the non-interactive backend first, which closes any
+    open figures. Returns one report entry per figure with its wall time
+    and written files.
+    """
+    plt.switch_backend(backend)
+
+    return [render_figure(name, plot_function, args, out_dir, formats)
+            for name, plot_function, args
+            in suite_calls(age_data, race_data, county_df)]
+
+
+def _init_worker(backend):
+    """Put a rendering worker on the non-interactive backend."""
+    plt.switch_backend(backend)
+
+
+def render_jobs_parallel(jobs, formats=('png',), processes=None,
+                         backend='agg'):
+    """Render (name, plot function, arguments, out_dir) jobs across a pool
+    of processes. Returns report entries in job order.
+    """
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=processes, initializer=_init_worker,
+            initargs=(backend,)) as executor:
+        futures = [executor.submit(render_figure, name, plot_function, args,
+                                   out_dir, formats)
+                   for name, plot_function, args, out_dir in jobs]
+
+        return [future.result() for future in futures]
+
+
+def render_suite_parallel(age_data, race_data, county_df, out_dir,
+                          formats=('png',), processes=None, backend='agg'):
+    """Render every figure to out_dir across a pool of processes.
+
+    Cleaned DataFrames are reduced to cubes once, and each worker is sent
+    only the marginal cube its figure aggregates, never the full frames.
+    Returns report entries in suite order, as render_suite does.
+    """
+    # Pre-aggregate once in the parent process.
+    cubes = {'age': age_data, 'race': race_data}
+    if not isinstance(age_data, ohio_birth_analysis.BirthCube):
+        cubes['age'] = ohio_birth_analysis.age_cube(age_data, county_df)
+    if not isinstance(race_data, ohio_birth_analysis.BirthCube):
+        cubes['race'] = ohio_birth_analysis.race_cube(race_data, county_df)
+
+    jobs = []
+    for name, function_name, dataset, dims in SUITE:
+        args = (cubes[dataset].sum(dims),)
+        if function_name == 'county_breakdown_plot':
+            args += (county_df,)
+        jobs.append((name, getattr(ohio_birth_analysis, function_name), args,
+                     out_dir))
+
+    return render_jobs_parallel(jobs, formats, processes, backend)
+
+
+def county_directory(county):
+    """File system friendly directory name of a county."""
+    return county.replace(' ', '_')
+
+
+def render_counties_parallel(age_data, race_data, county_df, out_dir,
+                             formats=('png',), processes=None,
+                             backend='agg'):
+    """Render the county-level figures of every county across processes.
+
+    The cleaned DataFrames are grouped by county once, into cubes, and each
+    county's marginals are sliced from them. Every county is written to its
+    own subdirectory of out_dir. Returns the report entries, in county and
+    suite order, and the wall time of the whole job.
+    """
+    start = time.perf_counter()
+
+    # One aggregation pass per dataset, shared by all counties.
+    cubes = {'age': ohio_birth_analysis.age_cube(age_data, county_df),
+             'race': ohio_birth_analysis.race_cube(race_data, county_df)
+             }
+
+    jobs = []
+    for county in county_df.index:
+        county_dir = os.path.join(out_dir, county_directory(county))
+        for name, function_name, dataset, dims in COUNTY_SUITE:
+            marginal = cubes[dataset].select('county', county).sum(dims)
+            jobs.append((name, getattr(ohio_birth_analysis, function_name),
+                         (marginal,), county_dir))
+
+    report = render_jobs_parallel(jobs, formats, processes, backend)
+
+    return report, time.perf_counter() - start
+
+
+def print_report(report):
+    """Print per-figure wall times, slowest first."""
+    total = sum(entry['seconds'] for entry in report)
+    for entry in sorted(report, key=lambda entry: -entry['seconds']):
+        print('{:<30}{:>8.3f} s{:>7.1%}'.format(entry['figure'],
+                                                entry['seconds'],
+                                                entry['seconds'] / total
+                                                ))
+    print('{:<30}{:>8.3f} s'.format('total', total))
+
+
+def print_throughput(report, wall_seconds):
+    """Print the wall time and figure throughput of a batch job."""
+    print('{} figures in {:.3f} s wall time, {:.1f} figures/s'
+          .format(len(report), wall_seconds, len(report) / wall_seconds))
+
+
+def main():
+    """Command line entry point for the nightly report job."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('out_dir', help='directory to write figures to')
+    parser.add_argument('--formats', nargs='+', default=['png'],
+                        choices=FORMATS, help='file formats to write')
+    parser.add_argument('--age-path', default=AGE_PATH)
+    parser.add_argument('--race-path', default=RACE_PATH)
+    parser.add_argument('--county-path', default=COUNTY_PATH)
+    parser.add_argument('--processes', type=int, default=0,
+                        help='render across this many processes, 0 for '
+                             'serial rendering')
+    parser.add_argument('--per-county', action='store_true',
+                        help='render the county-level figures of every '
+                             'county')
+    parser.add_argument('--trace', metavar='PATH',
+                        help='write a Chrome trace of the pipeline stages '
+                             '(serial rendering only)')
+    args = parser.parse_args()
+
+    # Spans of pool workers are not collected, so a pooled trace would
+    # miss every figure.
+    if args.trace and (args.processes or args.per_county):
+        parser.error('--trace needs serial rendering; it cannot be combined '
+                     'with --processes or --per-county')
+
+    if args.trace:
+        ohio_birth_trace.enable()
+
+    county_df = ohio_birth_analysis.county_data_cleaning(args.county_path)
+    age_df = ohio_birth_analysis.age_data_cleaning(args.age_path,
+                                                   county_df=county_df)
+    race_df = ohio_birth_analysis.race_data_cleaning(args.race_path,
+                                                     county_df=county_df)
+
+    if args.per_county:
+        report, wall_seconds = render_counties_parallel(
+            age_df, race_df, county_df, args.out_dir, formats=args.formats,
+            processes=args.processes or None)
+        print_throughput(report, wall_seconds)
+        return
+
+    if args.processes:
+        report = render_suite_parallel(age_df, race_df, county_df,
+                                       args.out_dir, formats=args.formats,
+                                       processes=args.processes
+                                       )
+    else:
+        report = render_suite(age_df, race_df, county_df, args.out_dir,
+                              formats=args.formats)
+    print_report(report)
+
+    if args.trace:
+        print(ohio_birth_trace.write_chrome_trace(args.trace))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""Spatial autocorrelation of county low birth weight rates.
+
+Counties are keyed by the FIPS codes of ohio_county_data.csv. Their
+neighbors (sharing a border or a corner) are recorded in the cached county
+geometry, from which a sparse adjacency matrix is built once per process.
+
+    - morans_i: global Moran's I, whether the rates of neighboring
+      counties are more alike than chance would make them.
+    - local_morans_i: local Moran's I (LISA) of every county, classifying
+      significant counties as hot spots (High-High), cold spots (Low-Low)
+      or outliers (High-Low, Low-High).
+
+Both are tested by permutation. Every permutation is drawn at once as a
+row of one (permutations x counties) array, and the spatial lags of all of
+them are a single sparse matrix product, rather than one loop iteration
+per permutation.
+
+Requires SciPy, for its sparse matrices.
+"""
+import functools
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from resources.ohio_birth_data import aggregate
+from resources.ohio_birth_geometry import GEOMETRY_PATH, load_county_geometry
+from resources.ohio_birth_trace import traced
+
+
+# Permutations drawn for the tests by default.
+PERMUTATIONS = 9999
+
+# LISA quadrants of a county and its spatial lag above (High) or below
+# (Low) the mean, and the label of counties that are not significant.
+QUADRANTS = np.array(['Low-Low', 'Low-High', 'High-Low', 'High-High'])
+NOT_SIGNIFICANT = 'Not significant'
+
+
+@functools.lru_cache(maxsize=None)
+def county_adjacency(geometry_path=GEOMETRY_PATH):
+    """FIPS codes of the cached counties and their sparse binary adjacency
+    matrix, in the same order. Built once per process.
+    """
+    neighbors = load_county_geometry(geometry_path)['neighbors']
+    fips = np.array(sorted(neighbors), dtype='int64')
+
+    rows = np.repeat(np.arange(len(fips)),
+                     [len(neighbors[code]) for code in fips])
+    columns = np.searchsorted(fips, np.concatenate(
+        [neighbors[code] for code in fips]).astype('int64'))
+    adjacency = sparse.csr_matrix((np.ones(len(rows)), (rows, columns)),
+                                  shape=(len(fips), len(fips)))
+
+    return fips, adjacency
+
+
+def county_weights(fips, geometry_path=GEOMETRY_PATH):
+    """Row-standardized spatial weights of the counties fips, in order.
+
+    Each county weighs its neighbors among fips equally, summing to 1;
+    counties without any get a row of zeros.
+    """
+    cached_fips, adjacency = county_adjacency(geometry_path)
+    positions = np.searchsorted(cached_fips, np.asarray(fips, dtype='int64'))
+    adjacency = adjacency[positions][:, positions]
+
+    with np.errstate(divide='ignore'):
+        scale = 1 / np.asarray(adjacency.sum(axis=1)).ravel()
+    scale[~np.isfinite(scale)] = 0
+
+    return sparse.csr_matrix(sparse.diags(scale) @ adjacency)
+
+
+def _deviations(values):
+    """Deviations of values from their mean, refusing missing values."""
+    values = np.asarray(values, dtype='float64')
+    if np.isnan(values).any():
+        raise ValueError('Spatial statistics need a value for every county.')
+
+    return values - values.mean()
+
+
+def _pseudo_p_values(observed, simulated):
+    """Folded one-sided permutation p-values: the share of permutations at
+    least as extreme as observed, in the direction of observed. simulated
+    has one row per permutation.
+    """
+    larger = (simulated >= observed).sum(axis=0)
+    larger = np.minimum(larger, len(simulated) - larger)
+
+    return (larger + 1) / (len(simulated) + 1)
+
+
+def morans_i(values, weights, permutations=PERMUTATIONS, seed=None):
+    """Global Moran's I of values under row-standardized weights.
+
+    Returns a dict of the statistic, its expectation under no spatial
+    autocorrelation, and the z-score and pseudo p-value of the statistic
+    among its permutations.
+    """
+    deviations = _deviations(values)
+    scale = deviations @ deviations
+    statistic = deviations @ (weights @ deviations) / scale
+
+    # Every permutation as a column, lagged by one sparse product.
+    rng = np.random.default_rng(seed)
+    permuted = rng.permuted(np.tile(deviations, (permutations, 1)),
+                            axis=1).T
+    simulated = (permuted * (weights @ permuted)).sum(axis=0) / scale
+
+    return {'I': statistic, 'expected': -1 / (len(deviations) - 1),
+            'z_sim': (statistic - simulated.mean()) / simulated.std(ddof=1),
+            'p_sim': float(_pseudo_p_values(statistic, simulated[:, None])[0])
+            }
+
+
+def local_morans_i(values, weights, permutations=PERMUTATIONS, seed=None):
+    """Local Moran's I (LISA) of every county under row-standardized
+    weights, with conditional permutation p-values.
+
+    Each county keeps its value while the other values are shuffled over
+    its neighbors. One set of random draws is shared by all counties, and
+    the lags of every county under every permutation are gathered into one
+    (counties x permutations) array, a neighbor slot at a time. Returns a
+    dict of arrays: the local statistics, the spatial lags, the pseudo
+    p-values and the quadrant of every county.
+    """
+    deviations = _deviations(values)
+    count = len(deviations)
+    scale = (deviations @ deviations) / count
+    lags = weights @ deviations
+    statistics = deviations * lags / scale
+
+    # Neighbor weights of every county, padded to the largest neighborhood.
+    weights = sparse.csr_matrix(weights)
+    neighbor_counts = np.diff(weights.indptr)
+    most = int(neighbor_counts.max()) if count else 0
+    padded = np.zeros((count, most))
+    padded[np.repeat(np.arange(count), neighbor_counts),
+           np.arange(weights.nnz) - np.repeat(weights.indptr[:-1],
+                                              neighbor_counts)] = weights.data
+
+    # The values of the other counties of every county, as rows.
+    positions = np.arange(count - 1)
+    others = deviations[positions[None, :]
+                        + (positions[None, :] >= np.arange(count)[:, None])]
+
+    # Draw the neighbors of every permutation among the other counties,
+    # and lag them one neighbor slot at a time.
+    rng = np.random.default_rng(seed)
+    draws = rng.random((permutations, count - 1)).argsort(axis=1)[:, :most]
+    simulated_lags = np.zeros((count, permutations))
+    for slot in range(most):
+        simulated_lags += others[:, draws[:, slot]] * padded[:, slot, None]
+    simulated = deviations[:, None] * simulated_lags / scale
+
+    quadrants = 2 * (deviations > 0) + (lags > 0)
+
+    return {'I': statistics, 'lag': lags,
+            'p_sim': _pseudo_p_values(statistics, simulated.T),
+            'quadrant': QUADRANTS[quadrants]
+            }
+
+
+@traced
+def low_rate_clusters(age_df, county_df, permutations=PERMUTATIONS,
+                      significance=0.05, seed=None, rates=None):
+    """Global and local spatial autocorrelation of county low birth weight
+    rates.
+
+    rates, in the order of county_df, replaces the raw rates from age_df
+    (e.g. with smoothed ones). Counties without a rate (no births in
+    age_df) are left out of the tests, as are their weights, and get
+    missing statistics and no cluster. Returns the dict of morans_i and a
+    DataFrame indexed by county with the FIPS code, rate, local statistic,
+    pseudo p-value and quadrant of each county, and its cluster: the
+    quadrant where the p-value is at most significance, 'Not significant'
+    elsewhere.
+    """
+    if rates is None:
+        rates = aggregate(age_df, ['county', 'weight_indicator'],
+                          normalize=True).low.reindex(county_df.index)
+    rates = np.asarray(rates, dtype='float64')
+    fips = county_df.FIPS.to_numpy()
+    tested = np.isfinite(rates)
+    weights = county_weights(fips[tested])
+
+    rng = np.random.default_rng(seed)
+    moran = morans_i(rates[tested], weights, permutations, rng)
+    lisa = local_morans_i(rates[tested], weights, permutations, rng)
+
+    clusters = pd.DataFrame({'FIPS': fips, 'rate': rates},
+                            index=county_df.index)
+    for name in ['I', 'p_sim', 'quadrant']:
+        clusters.loc[tested, name] = lisa[name]
+    clusters['cluster'] = clusters.quadrant.where(
+        clusters.p_sim <= significance, NOT_SIGNIFICANT) \
+        .where(tested, None)
+
+    return moran, clusters
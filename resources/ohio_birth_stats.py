@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+"""Statistics over the aggregated Ohio birth weight counts.
+
+Every function works on whole arrays of strata at once: a marginal or cube
+of birth counts goes in, and one NumPy expression per quantity computes
+the result for every stratum, with no Python loop over cells. Strata
+without births give NaN rather than division warnings.
+
+    - binomial_interval, rate_intervals: Wilson and Clopper-Pearson
+      confidence intervals of rates.
+    - beta_binomial_smoothing, smoothed_low_rates: empirical-Bayes rates
+      shrunk toward a beta prior fitted across counties.
+    - risk_tests, adjust_p_values: risk ratios, odds ratios and chi-square
+      tests of every group against a reference group in every stratum,
+      with multiple-comparison adjustment.
+
+Like ohio_birth_data, this module depends on pandas and NumPy only.
+Clopper-Pearson intervals and chi-square p-values also need SciPy, which
+is imported when they are requested.
+"""
+import statistics
+
+import numpy as np
+import pandas as pd
+
+from resources.ohio_birth_data import (BirthCube, aggregate,
+                                       birth_weight_rates)
+from resources.ohio_birth_trace import traced
+
+
+# Binomial interval methods understood by binomial_interval.
+INTERVAL_METHODS = ('wilson', 'clopper-pearson')
+
+# Multiple-comparison adjustments understood by adjust_p_values.
+ADJUST_METHODS = ('bonferroni', 'holm', 'fdr_bh')
+
+
+def _wilson_interval(successes, trials, confidence):
+    """Wilson score interval bounds."""
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    z2 = z * z
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = successes / trials
+        denominator = 1 + z2 / trials
+        center = (rate + z2 / (2 * trials)) / denominator
+        half_width = z * np.sqrt(rate * (1 - rate) / trials
+                                 + z2 / (4 * trials * trials)) / denominator
+
+    return center - half_width, center + half_width
+
+
+def _clopper_pearson_interval(successes, trials, confidence):
+    """Exact Clopper-Pearson interval bounds, from beta quantiles."""
+    from scipy.special import betaincinv
+
+    alpha = 1 - confidence
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lower = np.where(successes > 0,
+                         betaincinv(successes, trials - successes + 1,
+                                    alpha / 2),
+                         0.0)
+        upper = np.where(successes < trials,
+                         betaincinv(successes + 1, trials - successes,
+                                    1 - alpha / 2),
+                         1.0)
+
+    return lower, upper
+
+
+def binomial_interval(successes, trials, confidence=0.95, method='wilson'):
+    """Lower and upper confidence bounds of binomial proportions.
+
+    successes and trials are arrays (or scalars) of any broadcastable
+    shape, and every element is computed in one vectorized pass. Elements
+    without trials get NaN bounds.
+    """
+    if method not in INTERVAL_METHODS:
+        raise ValueError('Unknown interval method: {}; use one of {}.'
+                         .format(method, ', '.join(INTERVAL_METHODS)))
+
+    successes, trials = np.broadcast_arrays(
+        np.asarray(successes, dtype='float64'),
+        np.asarray(trials, dtype='float64'))
+    if method == 'wilson':
+        lower, upper = _wilson_interval(successes, trials, confidence)
+    else:
+        lower, upper = _clopper_pearson_interval(successes, trials,
+                                                 confidence)
+
+    empty = trials <= 0
+    lower = np.where(empty, np.nan, lower)
+    upper = np.where(empty, np.nan, upper)
+
+    return lower, upper
+
+
+def rate_intervals(marginal, confidence=0.95, method='wilson',
+                   percent=False, column='low'):
+    """Rates of one weight class in a marginal, with binomial intervals.
+
+    marginal holds birth counts with the weight indicator as columns, as
+    aggregate returns. Returns a DataFrame on the same index with the
+    rate, lower and upper bounds (out of 100 with percent) and the births
+    and total births each rate is computed from.
+    """
+    births = marginal[column].to_numpy(dtype='float64')
+    totals = marginal.to_numpy(dtype='float64').sum(axis=1)
+    lower, upper = binomial_interval(births, totals, confidence, method)
+
+    intervals = pd.DataFrame({'rate': birth_weight_rates(marginal)[column]
+                              .to_numpy(),
+                              'lower': lower, 'upper': upper},
+                             index=marginal.index)
+    if percent:
+        intervals *= 100
+    intervals['births'] = births
+    intervals['total_births'] = totals
+
+    return intervals
+
+
+@traced
+def low_rate_intervals(data, dims, confidence=0.95, method='wilson',
+                       percent=False):
+    """Low birth weight rates by dims with their binomial intervals.
+
+    data is a cleaned DataFrame or a BirthCube, aggregated (and memoized)
+    by aggregate. See rate_intervals for the returned columns.
+    """
+    marginal = aggregate(data, list(dims) + ['weight_indicator'])
+
+    return rate_intervals(marginal, confidence, method, percent)
+
+
+def beta_binomial_smoothing(successes, trials, groups=None):
+    """Empirical-Bayes rates shrunk toward a beta prior of their group.
+
+    A beta prior is fitted to the strata of every group by the method of
+    moments (one group by default), and each rate is replaced by its
+    posterior mean: strata with few trials move toward the group's pooled
+    rate, large strata keep their own. groups holds integer group codes,
+    one per stratum. Returns the smoothed rates and, per group, the prior
+    mean and strength (alpha + beta, infinite when the strata vary no more
+    than binomial noise, which pools them completely). Strata without
+    trials get their prior mean.
+    """
+    successes = np.asarray(successes, dtype='float64')
+    trials = np.asarray(trials, dtype='float64')
+    if groups is None:
+        groups = np.zeros(len(trials), dtype='intp')
+    group_count = int(groups.max()) + 1 if len(groups) else 0
+
+    def group_sum(values):
+        """Sum of values over the strata of every group."""
+        return np.bincount(groups, weights=values, minlength=group_count)
+
+    observed = trials > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total_trials = group_sum(trials)
+        prior_mean = group_sum(successes) / total_trials
+        rates = successes / trials
+
+        # Trial-weighted variance of the rates, less the part expected from
+        # binomial noise alone, is the variance of the prior.
+        deviations = np.where(observed,
+                              trials * (rates - prior_mean[groups]) ** 2, 0)
+        variance = group_sum(deviations) / total_trials
+        mean_trials = total_trials / group_sum(observed)
+        binomial = prior_mean * (1 - prior_mean)
+        between = variance - binomial / mean_trials
+        strength = np.where(between > 0,
+                            np.maximum(binomial / between - 1, 0), np.inf)
+
+        # Posterior mean as a weighted average of rate and prior mean.
+        weight = trials / (trials + strength[groups])
+        smoothed = np.where(observed,
+                            weight * rates + (1 - weight) * prior_mean[groups],
+                            prior_mean[groups])
+
+    return smoothed, prior_mean, strength
+
+
+def _group_codes(index, by):
+    """Integer codes of the levels of by in a (Multi)Index."""
+    if isinstance(by, str):
+        by = [by]
+    keys = [index.get_level_values(level) for level in by]
+    if len(keys) == 1:
+        return pd.factorize(keys[0])[0]
+
+    return pd.MultiIndex.from_arrays(keys).factorize()[0]
+
+
+@traced
+def smoothed_low_rates(data, dims, by=None, percent=False):
+    """Empirical-Bayes smoothed low birth weight rates by dims.
+
+    A beta-binomial prior is fitted across the strata of every level of by
+    (a dimension or list of them; one prior over all strata by default),
+    e.g. dims=['year', 'county'] with by='year' smooths every county-year
+    toward its year's statewide rate. Returns a DataFrame on the index of
+    the marginal with the raw and smoothed rates (out of 100 with
+    percent), the prior mean and strength, and the births behind them.
+    """
+    marginal = aggregate(data, list(dims) + ['weight_indicator'])
+    births = marginal.low.to_numpy(dtype='float64')
+    totals = marginal.to_numpy(dtype='float64').sum(axis=1)
+    groups = np.zeros(len(totals), dtype='intp') if by is None \
+        else _group_codes(marginal.index, by)
+
+    smoothed, prior_mean, strength = beta_binomial_smoothing(births, totals,
+                                                             groups)
+    prior_mean, strength = prior_mean[groups], strength[groups]
+
+    rates = pd.DataFrame({'rate': birth_weight_rates(marginal).low
+                          .to_numpy(),
+                          'smoothed': smoothed, 'prior_mean': prior_mean},
+                         index=marginal.index)
+    if percent:
+        rates *= 100
+    rates['prior_strength'] = strength
+    rates['births'] = births
+    rates['total_births'] = totals
+
+    return rates
+
+
+def adjust_p_values(p_values, method='fdr_bh'):
+    """p-values adjusted for the multiple comparisons among them.
+
+    method is 'bonferroni', 'holm' (both bounding the family-wise error
+    rate) or 'fdr_bh' (Benjamini-Hochberg, bounding the false discovery
+    rate). NaN p-values are not counted in the family and stay NaN.
+    """
+    if method not in ADJUST_METHODS:
+        raise ValueError('Unknown adjustment method: {}; use one of {}.'
+                         .format(method, ', '.join(ADJUST_METHODS)))
+
+    p_values = np.asarray(p_values, dtype='float64')
+    flat = p_values.ravel()
+    tested = np.flatnonzero(~np.isnan(flat))
+    count = len(tested)
+    adjusted = np.full(flat.shape, np.nan)
+
+    if method == 'bonferroni':
+        adjusted[tested] = flat[tested] * count
+    else:
+        # Step through the p-values in ascending order.
+        order = tested[np.argsort(flat[tested], kind='stable')]
+        ranks = np.arange(1, count + 1)
+        if method == 'holm':
+            steps = np.maximum.accumulate(flat[order] * (count - ranks + 1))
+        else:
+            steps = np.minimum.accumulate(
+                (flat[order] * count / ranks)[::-1])[::-1]
+        adjusted[order] = steps
+
+    return np.minimum(adjusted, 1).reshape(p_values.shape)
+
+
+@traced
+def risk_tests(data, strata, groups, reference=None, confidence=0.95,
+               correction='fdr_bh'):
+    """Low birth weight risk of every group against a reference group,
+    in every stratum at once.
+
+    data is a BirthCube, or a cleaned DataFrame made into one. strata are
+    the dimensions of the strata, e.g. ['year', 'county'], and groups the
+    dimension (or list of dimensions) compared within each, e.g. 'age' or
+    ['race', 'ethnicity']. reference is the label (or tuple of labels) of
+    the reference group, by default the group with the most births.
+
+    Returns a DataFrame indexed by stratum and group, without the
+    reference group, with the births of both groups, the risk ratio and
+    odds ratio with their confidence intervals, the Pearson chi-square
+    statistic of the 2 x 2 table and its p-value, and the p-value
+    adjusted by correction (see adjust_p_values) across every comparison.
+
+    Tables with a zero cell get the Haldane-Anscombe correction: 0.5 is
+    added to each of their cells before the ratios and intervals are
+    computed, so that these stay finite. The chi-square test uses the
+    uncorrected counts. Comparisons where either group has no births get
+    NaN ratios, and those with an empty row or column NaN chi-square
+    statistics, which are left out of the adjustment.
+    """
+    from scipy import special
+
+    strata = list(strata)
+    groups = [groups] if isinstance(groups, str) else list(groups)
+    dims = strata + groups + ['weight_indicator']
+    cube = data if isinstance(data, BirthCube) \
+        else BirthCube.from_frame(data, dims)
+
+    # Counts as strata x group x weight indicator, the group dimensions
+    # flattened into one axis.
+    group_labels = cube.labels[groups[0]] if len(groups) == 1 \
+        else pd.MultiIndex.from_product([cube.labels[dim] for dim in groups],
+                                        names=groups)
+    counts = cube.sum(dims).counts.astype('float64')
+    counts = counts.reshape(-1, len(group_labels), counts.shape[-1])
+    low = counts[..., cube.labels['weight_indicator'].get_loc('low')]
+    totals = counts.sum(axis=-1)
+
+    if reference is None:
+        reference = group_labels[totals.sum(axis=0).argmax()]
+    position = group_labels.get_loc(reference)
+
+    # The 2 x 2 table of every comparison: low and normal births of the
+    # group (a, b) and of the reference group (c, d).
+    a, b = low, totals - low
+    c, d = a[:, position, None], b[:, position, None]
+    group_totals, reference_totals = a + b, c + d
+
+    # Haldane-Anscombe corrected cells for the ratios; NaN where a group
+    # has no births.
+    zero_cell = (a == 0) | (b == 0) | (c == 0) | (d == 0)
+    corrected = [np.where((group_totals > 0) & (reference_totals > 0),
+                          cell + 0.5 * zero_cell, np.nan)
+                 for cell in np.broadcast_arrays(a, b, c, d)]
+    a_ratio, b_ratio, c_ratio, d_ratio = corrected
+    group_ratio_totals = a_ratio + b_ratio
+    reference_ratio_totals = c_ratio + d_ratio
+
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        risk_ratio = (a_ratio / group_ratio_totals) \
+            / (c_ratio / reference_ratio_totals)
+        risk_se = np.sqrt(1 / a_ratio - 1 / group_ratio_totals
+                          + 1 / c_ratio - 1 / reference_ratio_totals)
+        odds_ratio = a_ratio * d_ratio / (b_ratio * c_ratio)
+        odds_se = np.sqrt(1 / a_ratio + 1 / b_ratio + 1 / c_ratio
+                          + 1 / d_ratio)
+        chi_square = (group_totals + reference_totals) * (a * d - b * c) ** 2 \
+            / (group_totals * reference_totals * (a + c) * (b + d))
+
+        columns = {
+            'births': a, 'total_births': group_totals,
+            'reference_births': np.broadcast_to(c, a.shape),
+            'reference_total_births': np.broadcast_to(reference_totals,
+                                                      a.shape),
+            'risk_ratio': risk_ratio,
+            'risk_ratio_lower': risk_ratio * np.exp(-z * risk_se),
+            'risk_ratio_upper': risk_ratio * np.exp(z * risk_se),
+            'odds_ratio': odds_ratio,
+            'odds_ratio_lower': odds_ratio * np.exp(-z * odds_se),
+            'odds_ratio_upper': odds_ratio * np.exp(z * odds_se),
+            'chi_square': chi_square,
+            'p_value': special.chdtrc(1, chi_square)
+            }
+
+    # Every stratum and group but the reference group.
+    compared = np.arange(len(group_labels)) != position
+    index = pd.MultiIndex.from_product(
+        [cube.labels[dim] for dim in strata + groups], names=strata + groups)
+    index = index[np.tile(compared, len(counts))]
+    tests = pd.DataFrame({name: values[:, compared].ravel()
+                          for name, values in columns.items()},
+                         index=index)
+    tests['p_adjusted'] = adjust_p_values(tests.p_value.to_numpy(),
+                                          correction)
+
+    return tests
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""Synthetic Ohio Department of Health birth files for scale testing.
+
+Writes CSVs of any size in the exact layout of the two shipped files,
+messy values included: '*' suppression, the '2017 **' year, 'Total' rows,
+the NonOH and Unknown counties, the verbose weight and race labels, and
+counts of 1,000 or more exported unquoted so that they spill into the
+next column. Birth counts, low birth weight rates and suppression are
+fitted from the shipped files, and every county beyond the real ones
+re-uses the profile of an Ohio county under a numbered name
+('Adams 2', ...).
+
+Output is deterministic for a given seed and written in batches, so multi-
+GB files never have to fit in memory:
+    python -m resources.ohio_birth_synthetic synthetic_age.csv --rows 1e8
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from resources.ohio_birth_data import AGE_PATH, RACE_PATH
+
+
+# Raw weight indicator labels, in the row order of each cell.
+WEIGHT_LABELS = ['Low birth weight (<2500g)', 'Normal birth weight (2500g+)',
+                 'Total']
+
+# Column layout of each file: header order and the category columns.
+LAYOUTS = {'age': {'path': AGE_PATH,
+                   'columns': ['age group desc', 'birth count',
+                               'birth count_pct', 'county name',
+                               'low birth weight ind desc', 'sort',
+                               'year desc'],
+                   'categories': ['age group desc']
+                   },
+           'race': {'path': RACE_PATH,
+                    'columns': ['birth count', 'birth count_pct',
+                                'county name', 'ethnicity desc',
+                                'low birth weight ind desc',
+                                'race catg desc', 'sort', 'year desc'],
+                    'categories': ['race catg desc', 'ethnicity desc']
+                    }
+           }
+
+# Counties that are not Ohio counties, never replicated.
+NON_COUNTIES = ['NonOH', 'Unknown']
+
+# Prior weight (in births) pulling county low birth weight rates toward the
+# statewide rate of their category.
+PRIOR_BIRTHS = 50
+
+# Births assumed behind a suppressed count when fitting, the middle of the
+# 1-9 range that public health data commonly suppresses.
+SUPPRESSED = 5
+
+# County blocks written per batch.
+BATCH_COUNTIES = 200
+
+
+def _repair_split_counts(raw_df):
+    """Birth counts and percentages with thousands separators undone.
+
+    Counts of 1,000 or more were exported unquoted: the thousands land in
+    'birth count', the rest in 'birth count_pct' and the truncated
+    percentage in 'sort'. Such rows are recognized by a percentage above
+    100, which misses the few whose remainder is 100 or less.
+    """
+    counts = raw_df['birth count'].to_numpy(dtype='float64')
+    pct = raw_df['birth count_pct'].to_numpy(dtype='float64')
+    split = pct > 100
+
+    counts = np.where(split, counts * 1000 + pct, counts)
+    pct = np.where(split, raw_df['sort'].to_numpy(dtype='float64'), pct)
+
+    return counts, pct
+
+
+def fit_birth_model(dataset='age', path=None):
+    """Fit per-county birth counts, rates and suppression to a real file.
+
+    Returns a dictionary with the year and county labels, the category
+    cells, the mean annual births and smoothed low birth weight rate of
+    every county and cell, the relative size of every year and the
+    probabilities of each suppression pattern per county and cell.
+    """
+    layout = LAYOUTS[dataset]
+    raw_df = pd.read_csv(path or layout['path'], na_values='*')
+    raw_df['birth count'], raw_df['birth count_pct'] = \
+        _repair_split_counts(raw_df)
+
+    # Keep the cell rows, dropping the grand totals.
+    dims = ['year desc', 'county name'] + layout['categories']
+    raw_df = raw_df[raw_df['year desc'] != 'Total']
+    cells_df = raw_df.set_index(dims + ['low birth weight ind desc'])
+    cells_df = cells_df['birth count'].unstack() \
+        .reindex(columns=WEIGHT_LABELS)
+    low, normal, total = cells_df.to_numpy().T
+    complete = ~np.isnan(cells_df.to_numpy()).any(axis=1)
+
+    # Births of each cell, with suppressed parts inferred from the total
+    # where it is shown and imputed otherwise.
+    low = np.where(np.isnan(low), total - normal, low)
+    normal = np.where(np.isnan(normal), total - low, normal)
+    births = np.where(np.isnan(total), np.nan_to_num(low, nan=SUPPRESSED)
+                      + np.nan_to_num(normal, nan=SUPPRESSED), total)
+
+    # Dense year x county x cell arrays.
+    years, year_codes = np.unique(cells_df.index.get_level_values(0),
+                                  return_inverse=True)
+    counties, county_codes = np.unique(cells_df.index.get_level_values(1),
+                                       return_inverse=True)
+    cell_codes, cells = pd.factorize(cells_df.index.droplevel([0, 1]),
+                                     sort=True)
+    shape = (len(years), len(counties), len(cells))
+    births_cube = np.zeros(shape)
+    births_cube[year_codes, county_codes, cell_codes] = births
+
+    # Low birth weights and births of the fully shown cells, for rates.
+    low_cube = np.zeros(shape)
+    shown_cube = np.zeros(shape)
+    low_cube[year_codes, county_codes, cell_codes] = np.where(complete, low,
+                                                              0)
+    shown_cube[year_codes, county_codes, cell_codes] = np.where(complete,
+                                                                births, 0)
+
+    # Suppression pattern of each cell (bit 0 low, 1 normal, 2 total),
+    # counted per county and cell over the years.
+    patterns = (np.isnan(cells_df.to_numpy())
+                * np.array([1, 2, 4])).sum(axis=1)
+    pattern_probs = np.zeros((len(counties), len(cells), 8))
+    np.add.at(pattern_probs, (county_codes, cell_codes, patterns), 1)
+    pattern_probs /= np.maximum(pattern_probs.sum(axis=2, keepdims=True), 1)
+
+    # Annual births per county and cell, and the size of each year.
+    county_births = births_cube.sum(axis=0)
+    year_births = births_cube.sum(axis=(1, 2))
+
+    # County rates shrunk toward the statewide rate of the category.
+    cell_rates = low_cube.sum(axis=(0, 1)) \
+        / np.maximum(shown_cube.sum(axis=(0, 1)), 1)
+    low_rates = (low_cube.sum(axis=0) + PRIOR_BIRTHS * cell_rates) \
+        / (shown_cube.sum(axis=0) + PRIOR_BIRTHS)
+
+    return {'dataset': dataset, 'years': list(years),
+            'counties': list(counties), 'cells': list(cells),
+            'mean_births': county_births / len(years),
+            'year_scale': year_births / year_births.mean(),
+            'low_rates': np.clip(low_rates, 0, 1),
+            'pattern_probs': pattern_probs
+            }
+
+
+def _county_names(model, counties):
+    """Names and profile indices of the first counties county blocks.
+
+    The real counties come first, then numbered copies of the Ohio ones.
+    """
+    real = model['counties']
+    ohio = [index for index, name in enumerate(real)
+            if name not in NON_COUNTIES]
+
+    names = list(real[:counties])
+    profiles = list(range(len(names)))
+    for block in range(len(real), counties):
+        copy, position = divmod(block - len(real), len(ohio))
+        profiles.append(ohio[position])
+        names.append('{} {}'.format(real[ohio[position]], copy + 2))
+
+    return names, np.array(profiles, dtype='int64')
+
+
+def _format_rows(counts, totals, suppressed):
+    """Birth count, percentage and sort strings of a batch of rows.
+
+    Counts of 1,000 or more are split the way the real export splits them.
+    """
+    counts = counts.astype('int64')
+    pct = np.divide(100.0 * counts, totals, out=np.zeros(len(counts)),
+                    where=totals > 0)
+
+    count_str = counts.astype(str).astype(object)
+    pct_str = np.char.mod('%.1f', pct).astype(object)
+    sort_str = np.full(len(counts), '', dtype=object)
+
+    split = counts >= 1000
+    count_str[split] = (counts[split] // 1000).astype(str)
+    pct_str[split] = np.char.zfill((counts[split] % 1000).astype(str), 3)
+    sort_str[split] = np.floor(pct[split]).astype('int64').astype(str)
+
+    count_str[suppressed] = '*'
+    pct_str[suppressed] = '*'
+
+    return count_str, pct_str, sort_str, split
+
+
+def _generate_batch(model, rng, names, profiles, first_sort):
+    """DataFrame of every row of a batch of county blocks, shuffled."""
+    layout = LAYOUTS[model['dataset']]
+    cells = model['cells']
+    shape = (len(model['years']), len(profiles), len(cells))
+
+    # Births and low birth weights of every year, county and cell.
+    means = model['year_scale'][:, None, None] \
+        * model['mean_births'][profiles][None, :, :]
+    births = rng.poisson(means)
+    low = rng.binomial(births, model['low_rates'][profiles][None, :, :])
+
+    # Suppression patterns of the county profiles, only for cells with
+    # births.
+    cumulative = np.cumsum(model['pattern_probs'][profiles], axis=2)
+    draws = rng.random(shape)
+    patterns = (draws[..., None] > cumulative[None, :, :, :]).sum(axis=-1)
+    patterns = np.where(births > 0, np.minimum(patterns, 7), 0)
+
+    # Three rows per cell: low, normal and total.
+    counts = np.stack([low, births - low, births], axis=-1).ravel()
+    totals = np.repeat(births.ravel(), 3)
+    suppressed = ((patterns[..., None] >> np.arange(3)) & 1).astype(bool) \
+        .ravel()
+    count_str, pct_str, sort_str, split = _format_rows(counts, totals,
+                                                       suppressed)
+
+    # Label columns broadcast over the same year x county x cell x weight.
+    year_labels = np.array(model['years'], dtype=object)
+    index = np.indices(shape + (3,)).reshape(4, -1)
+    columns = {'year desc': year_labels[index[0]],
+               'county name': np.array(names, dtype=object)[index[1]],
+               'low birth weight ind desc':
+                   np.array(WEIGHT_LABELS, dtype=object)[index[3]]
+               }
+    for position, column in enumerate(layout['categories']):
+        labels = np.array([cell[position] if isinstance(cell, tuple)
+                           else cell for cell in cells], dtype=object)
+        columns[column] = labels[index[2]]
+
+    sort_ids = np.arange(first_sort, first_sort + len(counts)).astype(str) \
+        .astype(object)
+    sort_str[~split] = sort_ids[~split]
+    columns.update({'birth count': count_str, 'birth count_pct': pct_str,
+                    'sort': sort_str})
+
+    batch_df = pd.DataFrame(columns)[layout['columns']]
+
+    return batch_df.iloc[rng.permutation(len(batch_df))]
+
+
+def _grand_total_rows(model, first_sort):
+    """The three suppressed statewide total rows closing each file."""
+    layout = LAYOUTS[model['dataset']]
+    rows = [{column: 'Total' for column in layout['columns']}
+            for _ in WEIGHT_LABELS]
+    for row, weight, sort in zip(rows, WEIGHT_LABELS,
+                                 range(first_sort, first_sort + 3)):
+        row.update({'birth count': '*', 'birth count_pct': '*',
+                    'low birth weight ind desc': weight, 'sort': str(sort)})
+
+    return pd.DataFrame(rows)[layout['columns']]
+
+
+def rows_per_county(model):
+    """Rows written for each county block."""
+    return len(model['years']) * len(model['cells']) * len(WEIGHT_LABELS)
+
+
+def write_birth_file(path, dataset='age', rows=None, counties=None, seed=0,
+                     model=None):
+    """Write a synthetic birth file in the layout of a real one.
+
+    The size is given either as a number of county blocks or as a number
+    of rows, rounded up to whole counties; by default the real number of
+    counties is written. Returns the number of rows written.
+    """
+    if model is None:
+        model = fit_birth_model(dataset)
+    if rows is not None:
+        counties = -(-int(rows) // rows_per_county(model))
+    elif counties is None:
+        counties = len(model['counties'])
+
+    rng = np.random.default_rng(seed)
+    names, profiles = _county_names(model, counties)
+
+    written = 0
+    with open(path, 'w', newline='') as birth_file:
+        birth_file.write(','.join(LAYOUTS[dataset]['columns']) + '\n')
+        for start in range(0, counties, BATCH_COUNTIES):
+            stop = min(start + BATCH_COUNTIES, counties)
+            batch_df = _generate_batch(model, rng, names[start:stop],
+                                       profiles[start:stop], written + 1)
+            batch_df.to_csv(birth_file, header=False, index=False)
+            written += len(batch_df)
+
+        _grand_total_rows(model, written + 1).to_csv(birth_file,
+                                                     header=False,
+                                                     index=False)
+
+    return written + len(WEIGHT_LABELS)
+
+
+def main():
+    """Command line entry point writing one synthetic file."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help='CSV file to write')
+    parser.add_argument('--dataset', choices=list(LAYOUTS), default='age')
+    parser.add_argument('--rows', type=float,
+                        help='approximate number of rows to write')
+    parser.add_argument('--counties', type=int,
+                        help='number of county blocks to write')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(write_birth_file(args.path, args.dataset, rows=args.rows,
+                           counties=args.counties, seed=args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""Opt-in timing spans over the stages of the analysis pipeline.
+
+The public data and plot functions and their hot stages (read_csv,
+replace, filtering, bincount, figure export, ...) are wrapped in
+named spans. Tracing is off by default: a disabled span is a shared no-op
+object and a traced function costs one flag check per call. Once enabled,
+every span records its wall time, the rows going in and out and,
+optionally, the bytes allocated inside it (via tracemalloc), and the
+events can be written as a Chrome trace, viewable in chrome://tracing or
+https://ui.perfetto.dev.
+
+Usage:
+    from resources import ohio_birth_trace
+
+    ohio_birth_trace.enable(memory=True)
+    age_df = ohio_birth_analysis.age_data_cleaning(age_path)
+    ohio_birth_trace.write_chrome_trace('trace.json')
+
+Spans are kept per process; events of pool workers are not collected.
+"""
+import functools
+import json
+import numbers
+import os
+import threading
+import time
+import tracemalloc
+
+
+class _State():
+    """Module-wide tracing switch and the recorded events."""
+
+    enabled = False
+    memory = False
+    # Whether enable() started tracemalloc, and disable() should stop it.
+    started_tracemalloc = False
+    events = []
+    lock = threading.Lock()
+
+
+class _NoSpan():
+    """Span returned while tracing is disabled; does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **args):
+        """Ignore span arguments."""
+
+
+_NO_SPAN = _NoSpan()
+
+
+def _rows(data):
+    """Number of rows of a DataFrame or array, None for anything else."""
+    shape = getattr(data, 'shape', None)
+    if shape:
+        return int(shape[0])
+
+    return None
+
+
+class _Span():
+    """A recorded span: timing, row counts and allocated bytes."""
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def set(self, rows_out=None, **args):
+        """Record rows produced (a count or the result itself) and extra
+        arguments of the span.
+        """
+        if rows_out is not None:
+            self.args['rows_out'] = int(rows_out) \
+                if isinstance(rows_out, numbers.Integral) else _rows(rows_out)
+        self.args.update(args)
+
+    def __enter__(self):
+        if _State.memory:
+            self.memory_start = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter()
+        if _State.memory:
+            self.args['bytes_allocated'] = \
+                tracemalloc.get_traced_memory()[0] - self.memory_start
+
+        event = {'name': self.name, 'ph': 'X', 'pid': os.getpid(),
+                 'tid': threading.get_ident(), 'ts': self.start * 1e6,
+                 'dur': (end - self.start) * 1e6,
+                 'args': {key: value for key, value in self.args.items()
+                          if value is not None}
+                 }
+        with _State.lock:
+            _State.events.append(event)
+
+        return False
+
+
+def span(name, rows_in=None, **args):
+    """Context manager timing one stage while tracing is enabled.
+
+    rows_in may be a row count or the input itself. Call set(rows_out=...)
+    on the returned span to record the rows produced.
+    """
+    if not _State.enabled:
+        return _NO_SPAN
+
+    if isinstance(rows_in, numbers.Integral):
+        rows_in = int(rows_in)
+    elif rows_in is not None:
+        rows_in = _rows(rows_in)
+
+    return _Span(name, dict(args, rows_in=rows_in))
+
+
+def traced(function):
+    """Wrap a function in a span of its name, recording rows in and out."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _State.enabled:
+            return function(*args, **kwargs)
+
+        with span(function.__name__,
+                  rows_in=_rows(args[0]) if args else None) as function_span:
+            result = function(*args, **kwargs)
+            function_span.set(rows_out=_rows(result))
+
+        return result
+
+    return wrapper
+
+
+def enable(memory=False):
+    """Start recording spans, with tracemalloc allocations if memory."""
+    _State.memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _State.started_tracemalloc = True
+    _State.enabled = True
+
+
+def disable():
+    """Stop recording spans. Recorded events are kept.
+
+    tracemalloc is only stopped if enable() started it, not when the
+    caller was already tracing.
+    """
+    _State.enabled = False
+    _State.memory = False
+    if _State.started_tracemalloc:
+        tracemalloc.stop()
+        _State.started_tracemalloc = False
+
+
+def is_enabled():
+    """Whether spans are being recorded."""
+    return _State.enabled
+
+
+def reset():
+    """Discard every recorded event."""
+    with _State.lock:
+        _State.events = []
+
+
+def events():
+    """Copy of the recorded events, in Chrome trace event format."""
+    with _State.lock:
+        return list(_State.events)
+
+
+def summary():
+    """Total time and call count of each span name, slowest first."""
+    totals = {}
+    for event in events():
+        total = totals.setdefault(event['name'], {'name': event['name'],
+                                                  'calls': 0,
+                                                  'seconds': 0.0})
+        total['calls'] += 1
+        total['seconds'] += event['dur'] / 1e6
+
+    return sorted(totals.values(), key=lambda total: -total['seconds'])
+
+
+def write_chrome_trace(path):
+    """Write the recorded events as a Chrome trace JSON file."""
+    with open(path, 'w') as trace_file:
+        json.dump({'traceEvents': events(), 'displayTimeUnit': 'ms'},
+                  trace_file)
+
+    return path
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""Trends of the low birth weight rate over the years, series by series.
+
+Every series (a county, or a county and an age or race stratum) holds the
+low and total births of each year. All series are fitted at once: their
+normal equations are stacked into arrays of 2 x 2 systems and solved by
+one batched np.linalg.solve call, instead of one regression per series.
+
+    - 'wls': weighted least squares of the rate on the year, weighted by
+      the births of each year. The slope is the change of the rate per
+      year, tested with a t test on the residual variance.
+    - 'logistic': binomial regression of the low births on the year with
+      a logit link, fitted by iteratively reweighted least squares. The
+      slope is the change of the log-odds per year, tested with a Wald z
+      test.
+
+Years without births are left out of a series; series with fewer than
+three such years, or without both low and normal births, get NaN
+estimates, as do logistic fits that do not converge (when the low births
+of a series fall in a block of years, its log-odds have no finite trend).
+
+Like the Clopper-Pearson intervals, the p-values need SciPy, which is
+imported when they are computed.
+"""
+import numpy as np
+import pandas as pd
+
+from resources.ohio_birth_data import aggregate
+from resources.ohio_birth_trace import traced
+
+
+# Trend models understood by fit_trends.
+TREND_METHODS = ('wls', 'logistic')
+
+# Iteration limit and slope tolerance of the logistic fits.
+_LOGISTIC_ITERATIONS = 50
+_LOGISTIC_TOLERANCE = 1e-10
+
+
+def _stacked_solve(matrices, vectors, valid):
+    """Solutions of a stack of linear systems, NaN where not valid.
+
+    Systems that are not valid are swapped for the identity first, as one
+    singular matrix would fail the whole batched solve.
+    """
+    matrices = np.where(valid[:, None, None], matrices, np.eye(2))
+    solutions = np.linalg.solve(matrices, vectors[..., None])[..., 0]
+
+    return np.where(valid[:, None], solutions, np.nan), matrices
+
+
+def _wls_trends(successes, trials, design, valid):
+    """Slopes, standard errors and degrees of freedom of WLS fits."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = np.where(trials > 0, successes / trials, 0)
+    normal = np.einsum('st,ti,tj->sij', trials, design, design)
+    moments = np.einsum('st,ti->si', trials * rates, design)
+    coefficients, normal = _stacked_solve(normal, moments, valid)
+
+    residuals = rates - coefficients @ design.T
+    dof = (trials > 0).sum(axis=1) - 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = np.einsum('st,st->s', trials, residuals * residuals) / dof
+    covariance = np.linalg.inv(normal) * scale[:, None, None]
+
+    return coefficients[:, 1], np.sqrt(covariance[:, 1, 1]), dof
+
+
+def _binomial_information(trials, fitted, design):
+    """Stacked Fisher information matrices of logistic fits."""
+    weights = trials * fitted * (1 - fitted)
+
+    return (design.T * weights[:, None, :]) @ design
+
+
+def _logistic_trends(successes, trials, design, valid):
+    """Slopes and standard errors of logistic fits, by stacked Newton
+    (iteratively reweighted least squares) steps. Series that do not
+    converge, having no finite estimate, are marked not valid.
+    """
+    # Start from the pooled log-odds and no trend.
+    coefficients = np.zeros((len(trials), 2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pooled = successes.sum(axis=1) / trials.sum(axis=1)
+        coefficients[:, 0] = np.where(valid, np.log(pooled / (1 - pooled)),
+                                      0)
+
+    # Each step solves only the series still converging.
+    active = np.flatnonzero(valid)
+    for _ in range(_LOGISTIC_ITERATIONS):
+        # The linear predictor is clipped so that no weight underflows.
+        linear = np.clip(coefficients[active] @ design.T, -30, 30)
+        fitted = 1 / (1 + np.exp(-linear))
+        information = _binomial_information(trials[active], fitted, design)
+        score = (successes[active] - trials[active] * fitted) @ design
+        step = np.linalg.solve(information, score[..., None])[..., 0]
+        coefficients[active] += step
+
+        active = active[np.abs(step[:, 1]) > _LOGISTIC_TOLERANCE]
+        if not len(active):
+            break
+    valid = valid.copy()
+    valid[active] = False
+
+    fitted = 1 / (1 + np.exp(-np.clip(coefficients @ design.T, -30, 30)))
+    information = np.where(valid[:, None, None],
+                           _binomial_information(trials, fitted, design),
+                           np.eye(2))
+    standard_errors = np.sqrt(np.linalg.inv(information)[:, 1, 1])
+
+    return coefficients[:, 1], standard_errors, valid
+
+
+def fit_trends(successes, trials, years, method='wls'):
+    """Trends of many binomial series over the years, fitted at once.
+
+    successes and trials are (series, years) arrays of counts and years
+    holds the year of every column. Returns a dict of arrays with one
+    element per series: the slope per year, its standard error, the test
+    statistic (t for 'wls', z for 'logistic'), its two-sided p-value and
+    the number of years with births.
+    """
+    if method not in TREND_METHODS:
+        raise ValueError('Unknown trend method: {}; use one of {}.'
+                         .format(method, ', '.join(TREND_METHODS)))
+    from scipy import special
+
+    successes = np.asarray(successes, dtype='float64')
+    trials = np.asarray(trials, dtype='float64')
+    years = np.asarray(years, dtype='float64')
+
+    # Intercept and centered year, which keeps the systems well conditioned.
+    design = np.column_stack([np.ones(len(years)), years - years.mean()])
+    observed_years = (trials > 0).sum(axis=1)
+    total_successes = successes.sum(axis=1)
+    valid = (observed_years >= 3) & (total_successes > 0) \
+        & (total_successes < trials.sum(axis=1))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if method == 'wls':
+            slopes, standard_errors, dof = _wls_trends(successes, trials,
+                                                       design, valid)
+            statistics = slopes / standard_errors
+            p_values = 2 * special.stdtr(np.maximum(dof, 1),
+                                         -np.abs(statistics))
+        else:
+            slopes, standard_errors, valid = _logistic_trends(
+                successes, trials, design, valid)
+            statistics = slopes / standard_errors
+            p_values = 2 * special.ndtr(-np.abs(statistics))
+
+    trends = {'slope': slopes, 'se': standard_errors,
+              'statistic': statistics, 'p_value': p_values}
+    trends = {name: np.where(valid, values, np.nan)
+              for name, values in trends.items()}
+    trends['years'] = observed_years
+
+    return trends
+
+
+@traced
+def low_rate_trends(data, by, method='wls', percent=False):
+    """Trends of the low birth weight rate of every series over the years.
+
+    data is a cleaned DataFrame or a BirthCube, and by the dimensions
+    identifying a series, e.g. ['county'] or ['county', 'age']. Returns a
+    DataFrame with one row per series, indexed by the levels of by, with
+    the columns of fit_trends and the low and total births of the series.
+    With percent, 'wls' slopes and standard errors are in percentage
+    points per year.
+    """
+    marginal = aggregate(data, list(by) + ['year', 'weight_indicator'])
+    successes = marginal.low.unstack('year', fill_value=0)
+    trials = marginal.sum(axis=1).unstack('year', fill_value=0)
+
+    trends = pd.DataFrame(fit_trends(successes.to_numpy(), trials.to_numpy(),
+                                     successes.columns.to_numpy(), method),
+                          index=successes.index)
+    if percent and method == 'wls':
+        trends[['slope', 'se']] *= 100
+    trends['births'] = successes.sum(axis=1)
+    trends['total_births'] = trials.sum(axis=1)
+
+    return trends